@@ -0,0 +1,122 @@
+"""Genera un inventario sintético y reproducible a través de DatabaseManager.
+
+Crea ``categorias`` categorías, ``articulos`` artículos con su entrada inicial y
+``movimientos`` movimientos por artículo, repartidos en orden cronológico a lo largo de ``dias``
+días. Las salidas nunca dejan un artículo en negativo y usan el costo promedio vigente, como la
+interfaz. Con la misma semilla y los mismos parámetros se obtiene siempre la misma base, así
+los resultados de distintas versiones se pueden comparar.
+
+    python benchmarks/datos_sinteticos.py datos.db --articulos 5000 --movimientos 20
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from database import DatabaseManager  # noqa: E402
+
+INICIO = datetime.datetime(2024, 1, 1, 8, 0, 0)
+NOMBRES = ["Tornillo", "Tuerca", "Arandela", "Clavo", "Bisagra", "Cable", "Tubo", "Codo", "Llave", "Cinta",
+           "Brocha", "Lija", "Pintura", "Silicona", "Manguera", "Enchufe", "Bombillo", "Candado"]
+MATERIALES = ["acero", "bronce", "plástico", "aluminio", "cobre", "galvanizado", "madera", "PVC"]
+PROBABILIDAD_SALIDA = 0.45
+
+
+def articulos_sinteticos(rnd, categorias, articulos, inicio=INICIO):
+    """Devuelve los diccionarios de ``crear_articulos_bulk`` de los artículos a crear."""
+    return [
+        {
+            'nombre': f"{rnd.choice(NOMBRES)} {rnd.choice(MATERIALES)} {i}",
+            'categoria': f"Categoría {i % categorias:03d}",
+            'cantidad': rnd.randint(10, 200),
+            'costo': round(rnd.uniform(1, 100), 2),
+            'bar_code': f"SIN{i:08d}",
+            'fecha_hora': inicio,
+        }
+        for i in range(articulos)
+    ]
+
+
+def movimientos_sinteticos(rnd, existencias, por_articulo, inicio=INICIO, dias=365):
+    """Genera, en orden cronológico, ``por_articulo`` movimientos de cada artículo.
+
+    ``existencias`` es un diccionario ``articulo_id -> (cantidad, costo_promedio)`` con el
+    estado inicial; se actualiza a medida que se generan los movimientos.
+    """
+    turnos = [articulo_id for articulo_id in existencias for _ in range(por_articulo)]
+    rnd.shuffle(turnos)
+    paso = datetime.timedelta(days=dias) / (len(turnos) + 1)
+    for n, articulo_id in enumerate(turnos, 1):
+        cantidad, costo_promedio = existencias[articulo_id]
+        unidad = rnd.randint(1, 10)
+        entrada = cantidad < unidad or rnd.random() >= PROBABILIDAD_SALIDA
+        if entrada:
+            costo = round(costo_promedio * rnd.uniform(0.9, 1.15), 2)
+            costo_promedio = (cantidad * costo_promedio + unidad * costo) / (cantidad + unidad)
+            cantidad += unidad
+        else:
+            costo = round(costo_promedio, 2)
+            cantidad -= unidad
+        existencias[articulo_id] = (cantidad, costo_promedio)
+        yield {
+            'articulo_id': articulo_id,
+            'descripcion': "Compra" if entrada else "Venta",
+            'entrada': entrada,
+            'unidad': unidad,
+            'costo': costo,
+            'fecha_hora': inicio + paso * n,
+        }
+
+
+def generar(db_manager: DatabaseManager, categorias=20, articulos=1000, movimientos=20, dias=365, semilla=1) -> dict:
+    """Llena una base vacía con el inventario sintético; devuelve un resumen de lo creado."""
+    if db_manager.contar_articulos():
+        raise ValueError("La base ya tiene artículos: los datos sintéticos necesitan una base vacía.")
+    rnd = random.Random(semilla)
+    t0 = time.perf_counter()
+    nuevos = articulos_sinteticos(rnd, categorias, articulos)
+    # Las categorías se crean antes y en orden para que sus ids no dependan del azar de los sets
+    for nombre in sorted({a['categoria'] for a in nuevos}):
+        db_manager.crear_categoria(nombre)
+    db_manager.crear_articulos_bulk(nuevos)
+    # En una base vacía los ids se asignan en el orden de creación
+    ids = [fila['id'] for fila in db_manager.obtener_existencias_articulos()]
+    existencias = {i: (a['cantidad'], a['costo']) for i, a in zip(ids, nuevos)}
+    registros = db_manager.registrar_movimientos_bulk(
+        movimientos_sinteticos(rnd, existencias, movimientos, dias=dias))
+    return {
+        'categorias': categorias,
+        'articulos': articulos,
+        'movimientos_por_articulo': movimientos,
+        'dias': dias,
+        'semilla': semilla,
+        'registros': articulos + registros,
+        'fin': (INICIO + datetime.timedelta(days=dias)).isoformat(),
+        'segundos_generacion': round(time.perf_counter() - t0, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ruta", help="archivo SQLite a crear")
+    parser.add_argument("--categorias", type=int, default=20)
+    parser.add_argument("--articulos", type=int, default=1000)
+    parser.add_argument("--movimientos", type=int, default=20, help="movimientos por artículo")
+    parser.add_argument("--dias", type=int, default=365, help="días que abarca el historial")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.ruta):
+        parser.error(f"{args.ruta} ya existe")
+    resumen = generar(DatabaseManager(args.ruta), args.categorias, args.articulos, args.movimientos,
+                      args.dias, args.semilla)
+    for clave, valor in resumen.items():
+        print(f"{clave:>24}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
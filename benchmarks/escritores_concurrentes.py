@@ -0,0 +1,172 @@
+"""Prueba de carga de escritores concurrentes sobre registros.
+
+Varios escritores (hilos y, opcionalmente, procesos, como varias cajas o escáneres) registran
+movimientos a la vez sobre los mismos artículos. Con ``--misma-fecha`` todos usan el mismo
+instante, el caso que antes chocaba con la clave primaria ``fecha_hora``. Al final verifica que
+se guardaron todos los movimientos y que los saldos materializados coinciden con los que se
+recalculan desde el historial.
+
+    python benchmarks/escritores_concurrentes.py --procesos 2 --hilos 4 --movimientos 500
+    python benchmarks/escritores_concurrentes.py --hilos 8 --lote 100 --misma-fecha
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from controller import InventoryController  # noqa: E402
+
+FECHA_FIJA = datetime.datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _escritor(controller, articulo_ids, movimientos, lote, misma_fecha, semilla):
+    """Registra ``movimientos`` movimientos; devuelve los guardados y los errores por tipo."""
+    rnd = random.Random(semilla)
+    guardados = 0
+    errores = {}
+
+    def movimiento():
+        return {
+            'articulo_id': rnd.choice(articulo_ids),
+            'descripcion': "carga concurrente",
+            'entrada': rnd.random() < 0.6,
+            'unidad': rnd.randint(1, 5),
+            'costo': round(rnd.uniform(5, 15), 2),
+            'fecha_hora': FECHA_FIJA if misma_fecha else None,
+        }
+
+    restantes = movimientos
+    while restantes > 0:
+        cantidad = min(lote, restantes)
+        try:
+            if lote == 1:
+                m = movimiento()
+                controller.registrar_movimiento(m['articulo_id'], m['descripcion'], m['entrada'],
+                                                m['unidad'], m['costo'], m['fecha_hora'])
+            else:
+                controller.registrar_movimientos_bulk([movimiento() for _ in range(cantidad)])
+            guardados += cantidad
+        except Exception as e:
+            errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+        restantes -= cantidad
+    return guardados, errores
+
+
+def _proceso(db_path, articulo_ids, hilos, movimientos, lote, misma_fecha, semilla, cola):
+    """Lanza ``hilos`` escritores que comparten el controlador (y el pool) del proceso."""
+    controller = InventoryController(db_path)
+    resultados = [None] * hilos
+
+    def correr(i):
+        resultados[i] = _escritor(controller, articulo_ids, movimientos, lote, misma_fecha, semilla + i)
+
+    hilos_escritores = [threading.Thread(target=correr, args=(i,)) for i in range(hilos)]
+    for hilo in hilos_escritores:
+        hilo.start()
+    for hilo in hilos_escritores:
+        hilo.join()
+    controller.db_manager.engine.dispose()
+
+    guardados = sum(r[0] for r in resultados)
+    errores = {}
+    for _, errores_hilo in resultados:
+        for tipo, cantidad in errores_hilo.items():
+            errores[tipo] = errores.get(tipo, 0) + cantidad
+    if cola is None:
+        return guardados, errores
+    cola.put((guardados, errores))
+
+
+def medir(directorio, procesos, hilos, articulos, movimientos, lote, misma_fecha):
+    db_path = os.path.join(directorio, "escritores.db")
+    controller = InventoryController(db_path)
+    articulo_ids = [
+        controller.crear_articulo(f"Articulo {i}", f"Categoria {i % 10}", 100, 10.0, f"BC{i:06d}",
+                                  FECHA_FIJA - datetime.timedelta(days=1))['id']
+        for i in range(articulos)
+    ]
+    registros_iniciales = articulos
+
+    t0 = time.perf_counter()
+    if procesos == 1:
+        guardados, errores = _proceso(db_path, articulo_ids, hilos, movimientos, lote, misma_fecha, 0, None)
+    else:
+        cola = multiprocessing.Queue()
+        trabajadores = [
+            multiprocessing.Process(target=_proceso, args=(db_path, articulo_ids, hilos, movimientos,
+                                                           lote, misma_fecha, p * 1000, cola))
+            for p in range(procesos)
+        ]
+        for trabajador in trabajadores:
+            trabajador.start()
+        parciales = [cola.get() for _ in trabajadores]
+        for trabajador in trabajadores:
+            trabajador.join()
+        guardados = sum(p[0] for p in parciales)
+        errores = {}
+        for _, errores_proceso in parciales:
+            for tipo, cantidad in errores_proceso.items():
+                errores[tipo] = errores.get(tipo, 0) + cantidad
+    duracion = time.perf_counter() - t0
+
+    # Verificación: cantidad de registros y saldos incrementales contra los recalculados
+    with controller.db_manager.engine.connect() as conn:
+        registros = conn.exec_driver_sql("SELECT COUNT(*) FROM registros").scalar()
+    saldos = {i: controller.obtener_saldo(i) for i in articulo_ids}
+    controller.rebuild_balances()
+    saldos_inconsistentes = sum(
+        1 for i in articulo_ids
+        if saldos[i]['cantidad'] != controller.obtener_saldo(i)['cantidad']
+        or abs(saldos[i]['valor'] - controller.obtener_saldo(i)['valor']) > 1e-6
+    )
+    controller.db_manager.engine.dispose()
+
+    esperados = procesos * hilos * movimientos
+    return {
+        'escritores': procesos * hilos,
+        'movimientos_esperados': esperados,
+        'movimientos_guardados': registros - registros_iniciales,
+        'errores': errores,
+        'saldos_inconsistentes': saldos_inconsistentes,
+        'segundos': round(duracion, 3),
+        'movimientos_por_segundo': round(guardados / duracion, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--hilos", type=int, default=8, help="escritores por proceso")
+    parser.add_argument("--articulos", type=int, default=50)
+    parser.add_argument("--movimientos", type=int, default=500, help="movimientos por escritor")
+    parser.add_argument("--lote", type=int, default=1,
+                        help="movimientos por transacción (1 = registrar_movimiento, como la interfaz)")
+    parser.add_argument("--misma-fecha", action="store_true",
+                        help="todos los movimientos con la misma fecha y hora")
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultado = medir(directorio, args.procesos, args.hilos, args.articulos, args.movimientos,
+                          args.lote, args.misma_fecha)
+    for clave, valor in resultado.items():
+        print(f"{clave:>24}: {valor}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2)
+    if resultado['errores'] or resultado['saldos_inconsistentes'] \
+            or resultado['movimientos_guardados'] != resultado['movimientos_esperados']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Compara el motor de valoración en columnas con el recorrido fila por fila de los movimientos.
+
+Genera un inventario sintético con datos_sinteticos.py y calcula los acumulados (cantidad, valor,
+costo promedio y valor total de cada movimiento) de todos los artículos a la vez y del artículo con
+más movimientos, de tres maneras: el bucle de Python sobre los diccionarios de los registros (como
+lo hacía el reporte), valoracion.py con ``array`` y valoracion.py con NumPy, si está instalado.
+Verifica que los tres den lo mismo y que el saldo final de cada artículo coincida con el saldo
+materializado; si no, termina con error.
+
+    python benchmarks/motor_valoracion.py --articulos 5000 --movimientos 50 --json valoracion.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from controller import InventoryController  # noqa: E402
+from database import Registro  # noqa: E402
+from datos_sinteticos import generar  # noqa: E402
+from rutas_criticas import _version  # noqa: E402
+from valoracion import ColumnasMovimientos, np, valorar  # noqa: E402
+
+# Diferencia máxima aceptada entre dos cálculos del mismo acumulado
+TOLERANCIA = 1e-6
+
+
+def bucle_python(registros):
+    """Los acumulados de cada registro recorriéndolos uno por uno, como el reporte antes del motor."""
+    estados = []
+    anterior = None
+    for registro in registros:
+        if registro['articulo_id'] != anterior:
+            anterior = registro['articulo_id']
+            cantidad_total, valor_acumulado, costo_promedio = 0, 0.0, 0.0
+        costo_total = registro['unidad'] * registro['costo']
+        if registro['entrada_salida']:
+            cantidad_total += registro['unidad']
+            valor_acumulado += costo_total
+        else:
+            cantidad_total -= registro['unidad']
+            valor_acumulado -= costo_total
+        if cantidad_total != 0:
+            costo_promedio = valor_acumulado / cantidad_total
+        estados.append((cantidad_total, valor_acumulado, costo_promedio, cantidad_total * costo_promedio))
+    return estados
+
+
+def _cronometrar(funcion, repeticiones):
+    resultado = funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return resultado, {'ms_mediana': round(statistics.median(tiempos) * 1000, 3),
+                       'ms_min': round(min(tiempos) * 1000, 3)}
+
+
+def _diferencia(estados, otros):
+    """La mayor diferencia entre dos listas de acumulados, o infinito si no tienen el mismo largo."""
+    otros = list(otros)
+    if len(estados) != len(otros):
+        return float('inf')
+    return max((abs(a - b) for estado, otro in zip(estados, otros) for a, b in zip(estado, otro)), default=0.0)
+
+
+def _medir_calculos(registros, columnas, repeticiones):
+    """Cronometra los tres cálculos sobre los mismos movimientos y compara sus resultados."""
+    estados, tiempos = _cronometrar(lambda: bucle_python(registros), repeticiones)
+    medidas = {'bucle_python': tiempos}
+    diferencias = {}
+    motores = {'valoracion_array': False}
+    if np is not None:
+        motores['valoracion_numpy'] = True
+    for nombre, usar_numpy in motores.items():
+        valoracion, medidas[nombre] = _cronometrar(lambda: valorar(columnas, usar_numpy), repeticiones)
+        diferencias[nombre] = _diferencia(estados, valoracion.filas())
+    return medidas, diferencias
+
+
+def medir(directorio, categorias, articulos, movimientos, dias, semilla, repeticiones):
+    controller = InventoryController(os.path.join(directorio, "valoracion.db"))
+    db_manager = controller.db_manager
+    datos = generar(db_manager, categorias, articulos, movimientos, dias, semilla)
+
+    def cargar_registros():
+        with db_manager.Session() as session:
+            consulta = session.query(Registro).order_by(Registro.articulo_id, Registro.fecha_hora, Registro.id)
+            return [registro.to_dict() for registro in consulta]
+
+    registros, carga_registros = _cronometrar(cargar_registros, max(1, repeticiones // 5))
+    columnas, carga_columnas = _cronometrar(db_manager.obtener_columnas_movimientos, max(1, repeticiones // 5))
+
+    todos, diferencias = _medir_calculos(registros, columnas, repeticiones)
+    todos['carga_registros'] = carga_registros
+    todos['carga_columnas'] = carga_columnas
+
+    # El artículo con más movimientos, como en el reporte de la interfaz
+    por_articulo = {}
+    for registro in registros:
+        por_articulo.setdefault(registro['articulo_id'], []).append(registro)
+    articulo_id, registros_articulo = max(por_articulo.items(), key=lambda par: len(par[1]))
+    un_articulo, diferencias_articulo = _medir_calculos(
+        registros_articulo, ColumnasMovimientos.desde_registros(registros_articulo), repeticiones * 10)
+
+    # El saldo final de cada artículo contra el saldo materializado
+    saldos = valorar(columnas).saldos()
+    materializados = {fila['id']: fila for fila in db_manager.obtener_existencias_articulos()}
+    diferencia_saldos = max(
+        max(abs(saldo['cantidad'] - materializados[i]['cantidad']),
+            abs(saldo['costo_promedio'] - materializados[i]['costo']))
+        for i, saldo in saldos.items()
+    )
+    db_manager.engine.dispose()
+    return {
+        'version': _version(),
+        'numpy': np.__version__ if np is not None else None,
+        'datos': datos,
+        'movimientos': len(columnas),
+        'todos_los_articulos': todos,
+        'un_articulo': dict(un_articulo, articulo_id=articulo_id, movimientos=len(registros_articulo)),
+        'diferencias': {
+            'todos_los_articulos': diferencias,
+            'un_articulo': diferencias_articulo,
+            'saldos_materializados': diferencia_saldos,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categorias", type=int, default=20)
+    parser.add_argument("--articulos", type=int, default=2000)
+    parser.add_argument("--movimientos", type=int, default=50, help="movimientos por artículo")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultado = medir(directorio, args.categorias, args.articulos, args.movimientos, args.dias,
+                          args.semilla, args.repeticiones)
+    print(f"{resultado['movimientos']} movimientos de {resultado['datos']['articulos']} artículos "
+          f"(NumPy: {resultado['numpy'] or 'no instalado'})")
+    for grupo in ('todos_los_articulos', 'un_articulo'):
+        print(f"\n{grupo.replace('_', ' ').capitalize()}:")
+        for nombre, medida in resultado[grupo].items():
+            if isinstance(medida, dict):
+                print(f"{nombre:>18}: {medida['ms_mediana']:>10.3f} ms (mín. {medida['ms_min']:.3f})")
+
+    errores = []
+    for grupo in ('todos_los_articulos', 'un_articulo'):
+        for nombre, diferencia in resultado['diferencias'][grupo].items():
+            if diferencia > TOLERANCIA:
+                errores.append(f"{nombre} ({grupo}) difiere del bucle de Python en {diferencia}")
+    if resultado['diferencias']['saldos_materializados'] > TOLERANCIA:
+        errores.append(f"los saldos difieren de los materializados en "
+                       f"{resultado['diferencias']['saldos_materializados']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2)
+
+    for error in errores:
+        print(f"Error: {error}")
+    if errores:
+        sys.exit(1)
+    print("\nLos tres cálculos coinciden entre sí y con los saldos materializados.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compara los perfiles de SQLite de DatabaseManager (ver PERFILES_SQLITE).
+
+Mide, para cada perfil, cuántos movimientos por segundo acepta ``registrar_movimiento``
+(un commit por movimiento, como en la interfaz) y cuántas veces por segundo se pueden
+ejecutar las consultas del listado y del reporte detallado.
+
+    python benchmarks/perfiles_sqlite.py --articulos 200 --movimientos 2000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from controller import InventoryController  # noqa: E402
+from database import PERFILES_SQLITE  # noqa: E402
+
+
+def medir_perfil(perfil, directorio, articulos, movimientos, repeticiones_consulta):
+    controller = InventoryController(os.path.join(directorio, f"bench_{perfil}.db"), perfil)
+    rnd = random.Random(7)
+    inicio = datetime.datetime(2024, 1, 1)
+
+    ids = [
+        controller.crear_articulo(f"Articulo {i}", f"Categoria {i % 10}", 100, 10.0, f"BC{i:06d}",
+                                  inicio + datetime.timedelta(microseconds=i))['id']
+        for i in range(articulos)
+    ]
+
+    t0 = time.perf_counter()
+    for i in range(movimientos):
+        controller.registrar_movimiento(
+            rnd.choice(ids), "bench", rnd.random() < 0.6, rnd.randint(1, 5), rnd.uniform(5, 15),
+            inicio + datetime.timedelta(minutes=i + 1),
+        )
+    t_insercion = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(repeticiones_consulta):
+        controller.obtener_articulos_con_existencias()
+    t_listado = time.perf_counter() - t0
+
+    fin = inicio + datetime.timedelta(minutes=movimientos + 1)
+    t0 = time.perf_counter()
+    for _ in range(repeticiones_consulta):
+        controller.generar_reporte_detallado(inicio, fin)
+    t_reporte = time.perf_counter() - t0
+
+    controller.db_manager.engine.dispose()
+    return {
+        'movimientos_por_segundo': round(movimientos / t_insercion, 1),
+        'listados_por_segundo': round(repeticiones_consulta / t_listado, 1),
+        'reportes_por_segundo': round(repeticiones_consulta / t_reporte, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articulos", type=int, default=200)
+    parser.add_argument("--movimientos", type=int, default=2000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for perfil in PERFILES_SQLITE:
+            resultados[perfil] = medir_perfil(perfil, directorio, args.articulos,
+                                              args.movimientos, args.repeticiones)
+            print(f"{perfil:>10}: " + ", ".join(f"{k}={v}" for k, v in resultados[perfil].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Mide las rutas críticas de la aplicación sobre un inventario sintético reproducible.
+
+Genera la base con datos_sinteticos.py y cronometra, con los métodos reales del controlador, el
+reporte detallado, el listado de la vista principal (página, orden por existencias, búsqueda y
+saldos fila por fila), las tarjetas de categorías, el PDF, la existencia a una fecha pasada desde
+los cierres mensuales y ``registrar_movimiento``. Los resultados se guardan en JSON
+junto con la versión del código y las consultas SQL de cada ruta (ver instrumentacion.py).
+``--comparar`` marca las rutas que se volvieron más lentas o que hacen más consultas que en un
+resultado anterior, y entonces el programa termina con error.
+
+    python benchmarks/rutas_criticas.py --articulos 5000 --json antes.json
+    python benchmarks/rutas_criticas.py --articulos 5000 --json despues.json --comparar antes.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from controller import InventoryController  # noqa: E402
+from datos_sinteticos import INICIO, generar  # noqa: E402
+from instrumentacion import activar, medir as medir_consultas  # noqa: E402
+from pdf_generator import escribir_reporte_detallado  # noqa: E402
+
+TAMANO_PAGINA = 50  # Filas por página, como el Paginador
+
+
+def _cronometrar(funcion, repeticiones):
+    """Ejecuta ``funcion`` una vez, contando sus consultas y calentando cachés, y luego
+    ``repeticiones`` veces más para medir el tiempo."""
+    with medir_consultas(funcion.__name__, manejador=False) as medicion:
+        filas = funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {
+        'ms_mediana': round(statistics.median(tiempos) * 1000, 3),
+        'ms_min': round(min(tiempos) * 1000, 3),
+        'repeticiones': repeticiones,
+        'filas': len(filas) if hasattr(filas, '__len__') else filas,
+        'consultas': medicion.consultas,
+    }
+
+
+def _version():
+    raiz = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=raiz, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def medir(directorio, categorias, articulos, movimientos, dias, semilla, repeticiones, escrituras):
+    activar()
+    controller = InventoryController(os.path.join(directorio, "rutas.db"))
+    datos = generar(controller.db_manager, categorias, articulos, movimientos, dias, semilla)
+    fin = INICIO + datetime.timedelta(days=dias)
+    pagina_ids = [fila['id'] for fila in controller.buscar_articulos(limite=TAMANO_PAGINA)]
+    ruta_pdf = os.path.join(directorio, "reporte.pdf")
+    controller.cerrar_periodos('mensual', fin)
+
+    def listado_pagina():
+        # Lo que hace el Paginador de la vista principal: la página y el total
+        filas = controller.buscar_articulos(limite=TAMANO_PAGINA)
+        controller.contar_articulos()
+        return filas
+
+    def listado_por_existencias():
+        # La página ordenada por existencias, con el filtro de existencia mínima
+        filas = controller.buscar_articulos(cantidad_minima=1, orden='cantidad', descendente=True,
+                                            limite=TAMANO_PAGINA)
+        controller.contar_articulos(cantidad_minima=1)
+        return filas
+
+    def saldos_por_fila():
+        return [(controller.calcular_cantidad_actual(i), controller.calcular_costo_promedio_articulo(i))
+                for i in pagina_ids]
+
+    def busqueda_texto():
+        filas = controller.buscar_articulos("torn acero", limite=TAMANO_PAGINA)
+        controller.contar_articulos(texto="torn acero")
+        return filas
+
+    def reporte_detallado():
+        return controller.generar_reporte_detallado(INICIO, fin)
+
+    def reporte_detallado_mes():
+        return controller.generar_reporte_detallado(fin - datetime.timedelta(days=30), fin)
+
+    def existencias_al():
+        # A mitad del último mes: el cierre anterior más dos semanas de movimientos
+        return controller.valorar_inventario(hasta=fin - datetime.timedelta(days=15))
+
+    def pdf_reporte():
+        filas = controller.iterar_reporte_detallado(INICIO, fin)
+        return escribir_reporte_detallado(ruta_pdf, INICIO, fin, filas, total=controller.contar_articulos())
+
+    rutas = {
+        'reporte_detallado': _cronometrar(reporte_detallado, repeticiones),
+        'reporte_detallado_mes': _cronometrar(reporte_detallado_mes, repeticiones),
+        'listado_pagina': _cronometrar(listado_pagina, repeticiones),
+        'listado_por_existencias': _cronometrar(listado_por_existencias, repeticiones),
+        'listado_saldos_por_fila': _cronometrar(saldos_por_fila, repeticiones),
+        'busqueda_texto': _cronometrar(busqueda_texto, repeticiones),
+        'tarjetas_categorias': _cronometrar(controller.obtener_resumen_categorias, repeticiones),
+        'existencias_al': _cronometrar(existencias_al, repeticiones),
+        'pdf_reporte': _cronometrar(pdf_reporte, max(1, repeticiones // 5)),
+    }
+
+    # Las escrituras van al final porque agregan movimientos a la base
+    tiempos = []
+    for n in range(escrituras):
+        articulo_id = pagina_ids[n % len(pagina_ids)]
+        t0 = time.perf_counter()
+        with medir_consultas("registrar_movimiento", manejador=False) as medicion:
+            controller.registrar_movimiento(articulo_id, "bench", True, 1, 10.0)
+        tiempos.append(time.perf_counter() - t0)
+    rutas['registrar_movimiento'] = {
+        'ms_mediana': round(statistics.median(tiempos) * 1000, 3),
+        'ms_min': round(min(tiempos) * 1000, 3),
+        'repeticiones': escrituras,
+        'filas': 1,
+        'consultas': medicion.consultas,
+    }
+    controller.db_manager.engine.dispose()
+    return {'version': _version(), 'datos': datos, 'rutas': rutas}
+
+
+def _parametros(datos):
+    """Los parámetros del inventario sintético, sin el tiempo que tardó en generarse."""
+    return {clave: valor for clave, valor in datos.items() if clave != 'segundos_generacion'}
+
+
+def comparar(anterior, actual, tolerancia):
+    """Devuelve ``(ruta, ms antes, ms ahora, proporción, consultas antes, consultas ahora)`` de las
+    rutas medidas en ambos resultados, y cuáles superan la tolerancia o hacen más consultas."""
+    filas, regresiones = [], []
+    for ruta, medida in actual['rutas'].items():
+        if ruta not in anterior['rutas']:
+            continue
+        antes = anterior['rutas'][ruta]['ms_mediana']
+        ahora = medida['ms_mediana']
+        proporcion = ahora / antes if antes else float('inf')
+        # Los resultados anteriores a la instrumentación no tienen consultas
+        consultas_antes = anterior['rutas'][ruta].get('consultas', medida['consultas'])
+        filas.append((ruta, antes, ahora, proporcion, consultas_antes, medida['consultas']))
+        if proporcion > 1 + tolerancia or medida['consultas'] > consultas_antes:
+            regresiones.append(ruta)
+    return filas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categorias", type=int, default=20)
+    parser.add_argument("--articulos", type=int, default=2000)
+    parser.add_argument("--movimientos", type=int, default=20, help="movimientos por artículo")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--escrituras", type=int, default=200, help="llamadas a registrar_movimiento")
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    parser.add_argument("--comparar", help="resultado JSON anterior contra el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="cuánto más lenta (0.2 = 20 %%) puede ser una ruta antes de marcarla")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultado = medir(directorio, args.categorias, args.articulos, args.movimientos, args.dias,
+                          args.semilla, args.repeticiones, args.escrituras)
+    print(f"{resultado['datos']['articulos']} artículos, {resultado['datos']['registros']} registros "
+          f"(generados en {resultado['datos']['segundos_generacion']} s)")
+    for ruta, medida in resultado['rutas'].items():
+        print(f"{ruta:>24}: {medida['ms_mediana']:>10.3f} ms (mín. {medida['ms_min']:.3f}, "
+              f"filas {medida['filas']}, consultas {medida['consultas']})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+        if _parametros(anterior['datos']) != _parametros(resultado['datos']):
+            print("Aviso: los datos sintéticos no son los mismos que los del resultado anterior.")
+        filas, regresiones = comparar(anterior, resultado, args.tolerancia)
+        print(f"\nContra {anterior['version'].get('commit')}:")
+        for ruta, antes, ahora, proporcion, consultas_antes, consultas in filas:
+            marca = "  <- regresión" if ruta in regresiones else ""
+            print(f"{ruta:>24}: {antes:>10.3f} -> {ahora:>10.3f} ms (x{proporcion:.2f}), "
+                  f"consultas {consultas_antes} -> {consultas}{marca}")
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Prueba de carga del modo web: varias sesiones simultáneas registran movimientos.
+
+Cada sesión simulada es una pestaña de ``flet run --web``. Como la interfaz, usa la fachada
+asíncrona compartida del proceso y el PubSub de Flet. Muestra una página de artículos y registra
+movimientos. Cuando recibe el aviso de otra sesión, vuelve a consultar las filas visibles que
+cambiaron. Mide los movimientos por segundo, la latencia de las escrituras y de los avisos, y
+cuánto se retrasa el bucle de eventos. Al final verifica los registros y los saldos como
+escritores_concurrentes.py, y que cada aviso llegó a todas las demás sesiones.
+
+    python benchmarks/sesiones_web.py --sesiones 50 --movimientos 100
+    python benchmarks/sesiones_web.py --sesiones 200 --movimientos 20 --pausa 0.05
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from flet.core.pubsub.pubsub_client import PubSubClient  # noqa: E402
+from flet.core.pubsub.pubsub_hub import PubSubHub  # noqa: E402
+from controller import InventoryController  # noqa: E402
+from controller_async import AsyncInventoryController  # noqa: E402
+from notificaciones import TEMA_INVENTARIO, ReceptorCambios, ids_afectados, publicar_cambio  # noqa: E402
+
+FECHA_INICIAL = datetime.datetime(2025, 1, 1, 12, 0, 0)
+
+
+class Metricas:
+    def __init__(self):
+        self.escrituras = []  # segundos por movimiento registrado
+        self.avisos = []  # segundos desde que se publica un aviso hasta que lo recibe cada sesión
+        self.refrescos = []  # segundos para volver a consultar las filas visibles
+        self.retrasos_bucle = []
+        self.errores = {}
+        self.guardados = 0
+        self.filas_refrescadas = 0
+        self.pendientes_max = 0
+        self.enviados = {}  # id(aviso) -> (aviso, instante de publicación)
+
+
+class SesionSimulada:
+    """Una pestaña del navegador: hace las veces de página (``pubsub``) y de vista visible."""
+
+    def __init__(self, numero, hub, controller, metricas, espera_avisos):
+        self.controller = controller
+        self.metricas = metricas
+        self.visibles = set()
+        self.pubsub = PubSubClient(hub, f"sesion-{numero}")
+        self.receptor = ReceptorCambios(lambda: self, espera_avisos)
+        self.pubsub.subscribe_topic(TEMA_INVENTARIO, self.receptor.recibir)
+
+    async def abrir(self, pagina, despues_de_id):
+        filas = await self.controller.obtener_articulos_con_existencias(None, pagina, despues_de_id)
+        self.visibles = {fila["id"] for fila in filas}
+
+    async def al_cambiar_inventario(self, avisos):
+        ahora = time.perf_counter()
+        for aviso in avisos:
+            self.metricas.avisos.append(ahora - self.metricas.enviados[id(aviso)][1])
+        ids = ids_afectados(avisos)
+        cambiados = self.visibles if ids is None else self.visibles & ids
+        if cambiados:
+            t0 = time.perf_counter()
+            await asyncio.gather(*(self.controller.obtener_articulo_con_existencias(i) for i in cambiados))
+            self.metricas.refrescos.append(time.perf_counter() - t0)
+            self.metricas.filas_refrescadas += len(cambiados)
+
+    async def correr(self, articulo_ids, movimientos, pausa, rnd):
+        for _ in range(movimientos):
+            articulo_id = rnd.choice(articulo_ids)
+            t0 = time.perf_counter()
+            try:
+                await self.controller.registrar_movimiento(
+                    articulo_id, "sesión web", rnd.random() < 0.6, rnd.randint(1, 5), round(rnd.uniform(5, 15), 2))
+            except Exception as e:
+                self.metricas.errores[type(e).__name__] = self.metricas.errores.get(type(e).__name__, 0) + 1
+            else:
+                self.metricas.escrituras.append(time.perf_counter() - t0)
+                self.metricas.guardados += 1
+                aviso = publicar_cambio(self, "movimientos", [articulo_id])
+                self.metricas.enviados[id(aviso)] = (aviso, time.perf_counter())
+            if pausa:
+                await asyncio.sleep(rnd.uniform(0, 2 * pausa))
+
+
+async def _vigilar_bucle(controller, metricas, detener, intervalo=0.01):
+    """Mide cuánto tarda el bucle en retomar una espera corta: si algo lo bloquea, se nota aquí."""
+    while not detener.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        metricas.retrasos_bucle.append(time.perf_counter() - t0 - intervalo)
+        metricas.pendientes_max = max(metricas.pendientes_max, controller.escrituras_pendientes)
+
+
+async def _simular(controller, articulo_ids, sesiones, movimientos, pagina, pausa, espera_avisos, semilla):
+    metricas = Metricas()
+    hub = PubSubHub(loop=asyncio.get_running_loop())
+    abiertas = [SesionSimulada(i, hub, controller, metricas, espera_avisos) for i in range(sesiones)]
+    paginas = max(1, len(articulo_ids) // pagina)
+    await asyncio.gather(*(s.abrir(pagina, (i % paginas) * pagina) for i, s in enumerate(abiertas)))
+
+    detener = asyncio.Event()
+    vigilante = asyncio.create_task(_vigilar_bucle(controller, metricas, detener))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        s.correr(articulo_ids, movimientos, pausa, random.Random(semilla + i)) for i, s in enumerate(abiertas)))
+    duracion = time.perf_counter() - t0
+
+    # Espera a que las sesiones terminen de recibir los últimos avisos
+    esperados = metricas.guardados * (sesiones - 1)
+    limite = time.perf_counter() + espera_avisos + 10
+    while len(metricas.avisos) < esperados and time.perf_counter() < limite:
+        await asyncio.sleep(espera_avisos)
+    detener.set()
+    await vigilante
+    for s in abiertas:
+        s.pubsub.unsubscribe_all()
+    return metricas, duracion
+
+
+def _ms(valores, percentil):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(percentil * len(ordenados)))] * 1000, 2)
+
+
+def medir(directorio, sesiones, movimientos, articulos, pagina, pausa, espera_avisos):
+    db_path = os.path.join(directorio, "sesiones.db")
+    sincrono = InventoryController(db_path)
+    sincrono.crear_articulos_bulk(
+        {'nombre': f"Articulo {i}", 'categoria': f"Categoria {i % 10}", 'cantidad': 100, 'costo': 10.0,
+         'bar_code': f"BC{i:06d}", 'fecha_hora': FECHA_INICIAL}
+        for i in range(articulos))
+    articulo_ids = [fila['id'] for fila in sincrono.obtener_articulos_con_existencias()]
+
+    controller = AsyncInventoryController(sincrono)
+    metricas, duracion = asyncio.run(_simular(controller, articulo_ids, sesiones, movimientos, pagina,
+                                              pausa, espera_avisos, 0))
+    controller.cerrar()
+
+    # Verificación: cantidad de registros y saldos incrementales contra los recalculados
+    with sincrono.db_manager.engine.connect() as conn:
+        registros = conn.exec_driver_sql("SELECT COUNT(*) FROM registros").scalar()
+    saldos = {i: sincrono.obtener_saldo(i) for i in articulo_ids}
+    sincrono.rebuild_balances()
+    saldos_inconsistentes = sum(
+        1 for i in articulo_ids
+        if saldos[i]['cantidad'] != sincrono.obtener_saldo(i)['cantidad']
+        or abs(saldos[i]['valor'] - sincrono.obtener_saldo(i)['valor']) > 1e-6
+    )
+    sincrono.db_manager.engine.dispose()
+
+    return {
+        'sesiones': sesiones,
+        'movimientos_esperados': sesiones * movimientos,
+        'movimientos_guardados': registros - articulos,
+        'errores': metricas.errores,
+        'saldos_inconsistentes': saldos_inconsistentes,
+        'avisos_esperados': metricas.guardados * (sesiones - 1),
+        'avisos_recibidos': len(metricas.avisos),
+        'segundos': round(duracion, 3),
+        'movimientos_por_segundo': round(metricas.guardados / duracion, 1),
+        'escritura_ms_p50': _ms(metricas.escrituras, 0.50),
+        'escritura_ms_p95': _ms(metricas.escrituras, 0.95),
+        'escritura_ms_max': _ms(metricas.escrituras, 1.0),
+        'escrituras_en_cola_max': metricas.pendientes_max,
+        'aviso_ms_p50': _ms(metricas.avisos, 0.50),
+        'aviso_ms_p95': _ms(metricas.avisos, 0.95),
+        'refresco_ms_p95': _ms(metricas.refrescos, 0.95),
+        'filas_refrescadas': metricas.filas_refrescadas,
+        'retraso_bucle_ms_p95': _ms(metricas.retrasos_bucle, 0.95),
+        'retraso_bucle_ms_max': _ms(metricas.retrasos_bucle, 1.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=20)
+    parser.add_argument("--movimientos", type=int, default=50, help="movimientos por sesión")
+    parser.add_argument("--articulos", type=int, default=500)
+    parser.add_argument("--pagina", type=int, default=50, help="artículos visibles en cada sesión")
+    parser.add_argument("--pausa", type=float, default=0.0,
+                        help="segundos promedio entre dos movimientos de una misma sesión")
+    parser.add_argument("--espera-avisos", type=float, default=0.2,
+                        help="tiempo en que cada sesión junta los avisos antes de refrescar")
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultado = medir(directorio, args.sesiones, args.movimientos, args.articulos, args.pagina,
+                          args.pausa, args.espera_avisos)
+    for clave, valor in resultado.items():
+        print(f"{clave:>24}: {valor}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2)
+    if resultado['errores'] or resultado['saldos_inconsistentes'] \
+            or resultado['movimientos_guardados'] != resultado['movimientos_esperados'] \
+            or resultado['avisos_recibidos'] != resultado['avisos_esperados']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
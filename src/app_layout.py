@@ -1,9 +1,13 @@
 import flet as ft
+from controller_async import obtener_controlador_async
 from category_article_view import CategoryArticleView
 from main_view import mainView
 from sidebar import Sidebar
 from report_view import ReportView
 from category_view import CategoryView
+from notificaciones import TEMA_INVENTARIO, ReceptorCambios
+from panel_instrumentacion import PanelInstrumentacion
+import instrumentacion
 
 
 class AppLayout(ft.Row):
@@ -11,6 +15,7 @@ class AppLayout(ft.Row):
         super().__init__(spacing=5, *args, **kwargs)
         self.app = app
         self.page = page
+        self.controller = obtener_controlador_async()  # Un solo controlador (y engine) para todas las vistas
         self.toggle_nav_rail_button = ft.IconButton(
             icon=ft.Icons.ARROW_CIRCLE_LEFT,
             icon_color=ft.Colors.BLUE_GREY_400,
@@ -27,6 +32,16 @@ class AppLayout(ft.Row):
         self.main_view_instance = None # Para guardar la instancia de mainView
         self.controls = [self.sidebar, self.toggle_nav_rail_button, self.content_view]
         self.vertical_alignment = ft.CrossAxisAlignment.START
+        # Los cambios que hacen otras sesiones (otros navegadores) llegan a la vista visible
+        self.receptor_cambios = ReceptorCambios(lambda: self.content_view.content)
+        self.page.pubsub.subscribe_topic(TEMA_INVENTARIO, self.receptor_cambios.recibir)
+        # Panel de consultas por manejador, solo con GYESYS_INSTRUMENTACION=1
+        self.panel_instrumentacion = None
+        if instrumentacion.ACTIVA:
+            self.panel_instrumentacion = PanelInstrumentacion(page)
+            self.controls.append(self.panel_instrumentacion)
+        # Cierres de los períodos terminados desde el último inicio (ver cierres.py), en la cola de escritura
+        self.page.run_task(self.controller.cerrar_periodos)
 
     def toggle_nav_rail(self, e):
         self.sidebar.visible = not self.sidebar.visible
@@ -59,17 +74,17 @@ class AppLayout(ft.Row):
     def get_view_for_route(self, route):
         print(f"Route changed to: {route}")
         if route == "/":
-            self.main_view_instance = mainView(self.page, self.toggle_nav_rail)
+            self.main_view_instance = mainView(self.page, self.toggle_nav_rail, controller=self.controller)
             return self.main_view_instance
         elif route == "/categorias":
-            return CategoryView(self.page, self.go_to_main_view_from_categories)
+            return CategoryView(self.page, self.go_to_main_view_from_categories, controller=self.controller)
         elif route.startswith("/categorias/"):
             category_id = route.split("/")[-1]
-            return CategoryArticleView(self.page, category=category_id)
+            return CategoryArticleView(self.page, category=category_id, controller=self.controller)
         elif route.startswith("/report/"):
             try:
                 articulo_id = int(route.split("/")[-1])
-                return ReportView(self.page, self.go_to_main_view, articulo_id)
+                return ReportView(self.page, self.go_to_main_view, articulo_id, controller=self.controller)
             except ValueError:
                 return ft.Text("Error: ID de artículo inválido")
         return ft.Text("Error: Página no encontrada")
\ No newline at end of file
@@ -1,31 +1,34 @@
 import datetime
+import threading
 import flet as ft
 import pytz
-from controller import InventoryController
+from controller_async import obtener_controlador_async
 from flet import FilePickerResultEvent
-from reportlab.pdfgen import canvas
+from importador import IMPORTADORES
+from instrumentacion import medido
+from notificaciones import publicar_cambio
+from pdf_generator import GeneracionCancelada, escribir_reporte_detallado
 
 
 class ButtonGenerator:
-    def __init__(self, page, selected_row, toggle_sidebar_callback, on_refresh_table, origin="principal", table_data=None):
+    def __init__(self, page, selected_row, toggle_sidebar_callback, on_refresh_table, origin="principal", table_data=None, controller=None, category=None, on_row_change=None):
         self.page = page
         self.selected_row = selected_row
-        self.controller = InventoryController()
+        self.selected_ids = set()  # Artículos marcados en la tabla (para borrar varios)
+        self.controller = controller or obtener_controlador_async()
         self.toggle_sidebar_callback = toggle_sidebar_callback
-        self.on_refresh_table = on_refresh_table
+        # Corrutinas de la vista: on_refresh_table() recarga la tabla y
+        # on_row_change(accion, articulo_id, fila) actualiza solo la fila afectada
+        self.on_row_change = on_row_change
         self.origin = origin
         self.table_data = table_data or []
+        self.category = category
         self.start_date = None
         self.end_date = None
 
-        self.categoria_dropdown = ft.Dropdown(
-            label="Categoría",
-            options=[
-                ft.dropdown.Option(cat.nombre_categoria)
-                for cat in self.controller.obtener_categorias()
-            ],
-            width=200,
-        )
+        self.on_refresh_table = on_refresh_table
+        # Las opciones se cargan al abrir el diálogo del artículo
+        self.categoria_dropdown = ft.Dropdown(label="Categoría", options=[], width=200)
 
         # Botón para nueva categoría
         self.nueva_categoria_button = ft.TextButton(
@@ -59,6 +62,52 @@ class ButtonGenerator:
 
         self.selected_file_path = None
 
+        # Importación de CSV
+        self.import_file_picker = ft.FilePicker(on_result=self.on_import_file_selected)
+        self.page.overlay.append(self.import_file_picker)
+        self.import_file_path = None
+        self.import_tipo_selector = ft.RadioGroup(
+            content=ft.Row([
+                ft.Radio(value="articulos", label="Artículos"),
+                ft.Radio(value="movimientos", label="Movimientos"),
+            ]),
+            value="articulos",
+        )
+        self.import_archivo_text = ft.Text("Ningún archivo seleccionado", size=12)
+        self.import_progress_bar = ft.ProgressBar(value=0, width=350, visible=False)
+        self.import_estado_text = ft.Text("", size=12)
+        self.import_aceptar_button = ft.TextButton("Importar", on_click=self.importar_csv)
+        self.import_dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Importar CSV"),
+            content=ft.Column(
+                [
+                    self.import_tipo_selector,
+                    ft.TextButton(
+                        "Seleccionar archivo",
+                        on_click=lambda _: self.import_file_picker.pick_files(
+                            dialog_title="Importar CSV",
+                            allowed_extensions=["csv", "txt"],
+                        ),
+                    ),
+                    self.import_archivo_text,
+                    self.import_progress_bar,
+                    self.import_estado_text,
+                ],
+                tight=True,
+            ),
+            actions=[
+                ft.TextButton("Cerrar", on_click=lambda _: self.page.close(self.import_dialog)),
+                self.import_aceptar_button,
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+
+        self.pdf_progress_bar = ft.ProgressBar(value=0, width=350, visible=False)
+        self.pdf_estado_text = ft.Text("", size=12)
+        self.pdf_aceptar_button = ft.TextButton("Aceptar", on_click=self.generate_pdf)
+        self.pdf_cancelar_event = None  # threading.Event de la generación en curso
+
         self.generate_pdf_dialog = ft.AlertDialog(
             modal=True,
             title=ft.Text("Generar Reporte PDF"),
@@ -76,12 +125,14 @@ class ButtonGenerator:
                             file_name="reporte.pdf"
                         )
                     ),
+                    self.pdf_progress_bar,
+                    self.pdf_estado_text,
                 ],
                 tight=True,
             ),
             actions=[
-                ft.TextButton("Cancelar", on_click=lambda _: self.page.close(self.generate_pdf_dialog)),
-                ft.TextButton("Aceptar", on_click=self.generate_pdf),
+                ft.TextButton("Cancelar", on_click=self.cancelar_pdf),
+                self.pdf_aceptar_button,
             ],
             actions_alignment=ft.MainAxisAlignment.END,
         )
@@ -131,6 +182,16 @@ class ButtonGenerator:
         if self.origin == "articulo":
             return [reporte_detallado_button]
 
+        importar_button = ft.ElevatedButton(
+            "Importar",
+            icon=ft.Icons.UPLOAD_FILE,
+            icon_color=ft.Colors.WHITE,
+            color=ft.Colors.WHITE,
+            width=110,
+            bgcolor={ft.ControlState.DEFAULT: ft.Colors.GREEN_200, ft.ControlState.HOVERED: ft.Colors.GREEN_400},
+            on_click=self.open_import_dialog,
+        )
+
         ver_button = ft.ElevatedButton(
             "Ver",
             icon=ft.Icons.REMOVE_RED_EYE_SHARP,
@@ -181,7 +242,13 @@ class ButtonGenerator:
             borrar_button.disabled = False
             ver_button.disabled = False
 
-        return [reporte_detallado_button, ver_button, crear_button, editar_button, borrar_button]
+        # Con varias filas marcadas solo se puede borrar
+        if len(self.selected_ids) > 1:
+            borrar_button.disabled = False
+            borrar_button.text = f"Borrar ({len(self.selected_ids)})"
+            borrar_button.width = 115
+
+        return [reporte_detallado_button, importar_button, ver_button, crear_button, editar_button, borrar_button]
 
     def ver_articulo_reporte(self, e):
         """Handles the click event for the 'Ver' button to open the report view using routing."""
@@ -198,7 +265,15 @@ class ButtonGenerator:
                 )
             )
     
-    def open_popup(self, e):
+    async def cargar_categorias(self):
+        self.categoria_dropdown.options = [
+            ft.dropdown.Option(cat.nombre_categoria)
+            for cat in await self.controller.obtener_categorias()
+        ]
+
+    @medido
+    async def open_popup(self, e):
+        await self.cargar_categorias()
         if e.control.text == "Editar":
             if self.selected_row:
                 self.model_dlg.title.value = "Editar Articulo"
@@ -208,9 +283,8 @@ class ButtonGenerator:
                             False  # Habilitar todos los campos al principio
                         )
                         if control.data:
-                            control.value = str(
-                                getattr(self.selected_row, control.data)
-                            )
+                            valor = getattr(self.selected_row, control.data)
+                            control.value = str(valor) if valor is not None else ""
                             if control.data in ["cantidad", "costo"]:
                                 control.disabled = (
                                     True  # Deshabilitar Cantidad y Costo para editar
@@ -252,7 +326,8 @@ class ButtonGenerator:
         self.page.close(self.model_dlg)
         self.page.update()
 
-    def save_new_item(self, e):
+    @medido
+    async def save_new_item(self, e):
         nombre = self.model_dlg.content.controls[0].value
         categoria = self.categoria_dropdown.value
         cantidad = (
@@ -282,56 +357,147 @@ class ButtonGenerator:
         else:
             fecha_hora = None  # No se guarda fecha al editar
 
+        try:
+            if self.selected_row:
+                updated_articulo_data = await self.controller.actualizar_articulo(
+                    self.selected_row.id, nombre, categoria, cantidad, costo, bar_code
+                )
+            else:
+                nuevo_articulo_data = await self.controller.crear_articulo(
+                    nombre, categoria, cantidad, costo, bar_code, fecha_hora
+                )
+        except ValueError as error:
+            # Código de barras repetido: el diálogo queda abierto para corregirlo
+            self.page.open(ft.SnackBar(ft.Text(str(error)), open=True))
+            return
+
         if self.selected_row:
-            updated_articulo_data = self.controller.actualizar_articulo(
-                self.selected_row.id, nombre, categoria, cantidad, costo, bar_code
-            )
             print(f"Artículo actualizado: {updated_articulo_data}")
             self.selected_row = None
+            if updated_articulo_data:
+                await self.notificar_cambio("actualizar", updated_articulo_data["id"])
+            else:
+                await self.on_refresh_table()
         else:
-            nuevo_articulo_data = self.controller.crear_articulo(
-                nombre, categoria, cantidad, costo, bar_code, fecha_hora
-            )
             print(f"Artículo guardado: {nuevo_articulo_data}")
+            await self.notificar_cambio("crear", nuevo_articulo_data["id"])
 
-        self.on_refresh_table()  # Llamar a on_refresh_table después de guardar/actualizar
         self.close_popup(e)
 
-    def borrar_articulo(self, e):
+    async def notificar_cambio(self, accion, articulo_id):
+        """Avisa a la vista que un artículo se creó, actualizó o eliminó.
+
+        Si la vista no sabe actualizar una sola fila se recarga la tabla completa.
+        """
+        publicar_cambio(self.page, "articulos", [articulo_id])
+        if self.on_row_change is None:
+            await self.on_refresh_table()
+            return
+        fila = None
+        if accion != "eliminar":
+            fila = await self.controller.obtener_articulo_con_existencias(articulo_id)
+        await self.on_row_change(accion, articulo_id, fila)
+
+    @medido
+    async def borrar_articulo(self, e):
+        articulo_ids = set(self.selected_ids)
         if self.selected_row:
-            delete_register = self.controller.eliminar_todo_registro(
-                self.selected_row.id
-            )
-            deleted = self.controller.eliminar_articulo(self.selected_row.id)
-            if delete_register and deleted:
-                self.selected_row = None
-                self.on_refresh_table()
-                self.page.open(
-                    ft.SnackBar(
-                        ft.Text("Artículo eliminado correctamente."),
-                        open=True,
-                    )
-                )
-            else:
-                self.page.open(
-                    ft.SnackBar(
-                        ft.Text("Error al borrar el artículo."),
-                        open=True,
-                    )
-                )
-        else:
+            articulo_ids.add(self.selected_row.id)
+        if not articulo_ids:
             self.page.open(
                 ft.SnackBar(
                     ft.Text("Por favor, selecciona un artículo para borrar."),
                     open=True,
                 )
             )
+        elif len(articulo_ids) == 1:
+            await self.eliminar_articulos(articulo_ids)
+        else:
+            async def confirmar(_):
+                await self.eliminar_articulos(articulo_ids)
+
+            self.confirmar_borrado_dialog = ft.AlertDialog(
+                modal=True,
+                title=ft.Text("Borrar artículos"),
+                content=ft.Text(f"¿Eliminar {len(articulo_ids)} artículos y todos sus movimientos?"),
+                actions=[
+                    ft.TextButton("Cancelar", on_click=lambda _: self.page.close(self.confirmar_borrado_dialog)),
+                    ft.TextButton("Borrar", on_click=confirmar),
+                ],
+                actions_alignment=ft.MainAxisAlignment.END,
+            )
+            self.page.open(self.confirmar_borrado_dialog)
+
+    @medido
+    async def eliminar_articulos(self, articulo_ids):
+        """Borra los artículos y sus movimientos en una transacción y actualiza la tabla."""
+        if len(articulo_ids) > 1:
+            self.page.close(self.confirmar_borrado_dialog)
+        eliminados = await self.controller.eliminar_articulos(articulo_ids)
+        if eliminados:
+            self.selected_row = None
+            self.selected_ids = set()
+            if len(articulo_ids) == 1:
+                await self.notificar_cambio("eliminar", next(iter(articulo_ids)))
+            else:
+                publicar_cambio(self.page, "articulos", articulo_ids)
+                await self.on_refresh_table()
+            mensaje = ("Artículo eliminado correctamente." if eliminados == 1
+                       else f"{eliminados} artículos eliminados correctamente.")
+        else:
+            mensaje = "Error al borrar el artículo."
+        self.page.open(ft.SnackBar(ft.Text(mensaje), open=True))
 
     def on_file_selected(self, e: FilePickerResultEvent):
         if e.path:
             self.selected_file_path = e.path if e.path.endswith(".pdf") else e.path + ".pdf"
             print("Ruta seleccionada:", self.selected_file_path)
 
+    def open_import_dialog(self, e):
+        self.import_progress_bar.visible = False
+        self.import_progress_bar.value = 0
+        self.import_estado_text.value = ""
+        self.import_aceptar_button.disabled = False
+        self.page.open(self.import_dialog)
+
+    def on_import_file_selected(self, e: FilePickerResultEvent):
+        if e.files:
+            self.import_file_path = e.files[0].path
+            self.import_archivo_text.value = e.files[0].name
+            self.import_archivo_text.update()
+
+    def importar_csv(self, e):
+        if not self.import_file_path:
+            self.page.open(ft.SnackBar(ft.Text("Por favor selecciona un archivo CSV."), open=True))
+            return
+        self.import_aceptar_button.disabled = True
+        self.import_progress_bar.visible = True
+        self.import_estado_text.value = "Importando..."
+        self.import_dialog.update()
+        # La importación puede tardar minutos: se ejecuta fuera del manejador del clic
+        self.page.run_thread(self._ejecutar_importacion, self.import_tipo_selector.value, self.import_file_path)
+
+    def _ejecutar_importacion(self, tipo, ruta):
+        def mostrar_progreso(progreso):
+            self.import_progress_bar.value = progreso.fraccion
+            self.import_estado_text.value = (f"{progreso.importadas} importadas, "
+                                             f"{progreso.rechazadas} rechazadas")
+            self.import_dialog.update()
+
+        try:
+            resumen = IMPORTADORES[tipo](ruta, self.controller.sincrono, al_progresar=mostrar_progreso)
+        except Exception as ex:
+            self.import_estado_text.value = f"Error al importar: {ex}"
+        else:
+            errores = "\n".join(resumen['errores'][:5])
+            self.import_estado_text.value = (f"{resumen['importadas']} filas importadas, "
+                                             f"{resumen['rechazadas']} rechazadas" +
+                                             (f"\n{errores}" if errores else ""))
+            publicar_cambio(self.page, tipo)  # Tipo "articulos" o "movimientos"
+            self.page.run_task(self.on_refresh_table)
+        self.import_aceptar_button.disabled = False
+        self.import_dialog.update()
+
     def generate_pdf(self, e):
         if not self.selected_file_path:
             self.page.open(ft.SnackBar(ft.Text("Por favor selecciona una ubicación para guardar el PDF."), open=True))
@@ -345,44 +511,67 @@ class ButtonGenerator:
             self.page.open(ft.SnackBar(ft.Text("La fecha de inicio debe ser menor o igual a la fecha final."), open=True))
             return
 
-        c = canvas.Canvas(self.selected_file_path)
-        y = 800
-
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, y, f"Reporte Detallado: {self.start_date.strftime('%Y-%m-%d')} al {self.end_date.strftime('%Y-%m-%d')}")
-        y -= 30
-
-        registros = self.controller.generar_reporte_detallado(
-            self.start_date, self.end_date
-        )
-
         # Filtrar los registros solo si estás en la vista de categoría
-        if self.origin == "categoria" and self.table_data:
-            ids_filtrados = {articulo["id"] for articulo in self.table_data}
-            registros = [r for r in registros if r["articulo_id"] in ids_filtrados]
-
+        articulo_ids = None
+        nombre_categoria = None
+        if self.origin == "categoria" and self.category:
+            nombre_categoria = self.category
+        elif self.origin == "categoria" and self.table_data:
+            articulo_ids = [articulo["id"] for articulo in self.table_data]
         elif self.origin == "articulo" and self.selected_row:
-            registros = [r for r in registros if r["articulo_id"] == self.selected_row.id]
-
-        for articulo in registros:
-            c.setFont("Helvetica-Bold", 10)
-            c.drawString(50, y, f"Artículo ID: {articulo['articulo_id']} - {articulo['nombre']} ({articulo['categoria']})")
-            y -= 20
-
-            c.setFont("Helvetica", 9)
-            c.drawString(60, y, f"Entradas: {articulo['entradas']}")
-            c.drawString(180, y, f"Salidas: {articulo['salidas']}")
-            c.drawString(300, y, f"% Salidas: {articulo['porcentaje_salida']}%")
-            c.drawString(440, y, f"Costo Promedio: {articulo['costo_promedio']:.2f}")
-            y -= 30
-
-            if y < 50:
-                c.showPage()
-                y = 800
+            articulo_ids = [self.selected_row.id]
+
+        self.pdf_cancelar_event = threading.Event()
+        self.pdf_aceptar_button.disabled = True
+        self.pdf_progress_bar.value = 0
+        self.pdf_progress_bar.visible = True
+        self.pdf_estado_text.value = "Generando reporte..."
+        self.generate_pdf_dialog.update()
+        # El dibujo del PDF puede tardar con catálogos grandes: no bloquear el manejador del clic
+        self.page.run_thread(
+            self._generar_pdf_en_segundo_plano,
+            self.selected_file_path, self.start_date, self.end_date, articulo_ids, nombre_categoria,
+            self.pdf_cancelar_event,
+        )
 
-        c.save()
-        self.page.close(self.generate_pdf_dialog)
-        self.page.open(ft.SnackBar(ft.Text("Reporte detallado generado exitosamente."), open=True))
+    def _generar_pdf_en_segundo_plano(self, ruta, fecha_inicio, fecha_fin, articulo_ids, nombre_categoria, cancelar):
+        def mostrar_progreso(hechas, total):
+            self.pdf_progress_bar.value = hechas / total if total else None
+            self.pdf_estado_text.value = f"{hechas} de {total} artículos"
+            self.generate_pdf_dialog.update()
+
+        mensaje = None
+        try:
+            # Ya se está en un hilo propio: se usa el controlador síncrono
+            total = self.controller.sincrono.contar_articulos(articulo_ids, nombre_categoria)
+            filas = self.controller.sincrono.iterar_reporte_detallado(
+                fecha_inicio, fecha_fin, articulo_ids, nombre_categoria)
+            escribir_reporte_detallado(ruta, fecha_inicio, fecha_fin, filas, total, mostrar_progreso, cancelar)
+            mensaje = "Reporte detallado generado exitosamente."
+        except GeneracionCancelada:
+            mensaje = "Generación del reporte cancelada."
+        except ValueError as ex:
+            mensaje = str(ex)
+        except Exception as ex:
+            # Archivo bloqueado, carpeta sin permiso o error de la base: el hilo no debe perderlo
+            mensaje = f"Error al generar el reporte: {ex}"
+        finally:
+            self.pdf_cancelar_event = None
+            self.pdf_aceptar_button.disabled = False
+            self.pdf_progress_bar.visible = False
+            self.pdf_estado_text.value = ""
+            self.page.close(self.generate_pdf_dialog)
+            if mensaje:
+                self.page.open(ft.SnackBar(ft.Text(mensaje), open=True))
+
+    def cancelar_pdf(self, e):
+        """Cierra el diálogo o, si hay un reporte generándose, lo detiene."""
+        if self.pdf_cancelar_event is not None:
+            self.pdf_cancelar_event.set()
+            self.pdf_estado_text.value = "Cancelando..."
+            self.generate_pdf_dialog.update()
+        else:
+            self.page.close(self.generate_pdf_dialog)
 
     def crear_categoria_dialog(self):
         # Primero, define el objeto del diálogo
@@ -398,8 +587,8 @@ class ButtonGenerator:
             self.page.update()
 
         # Función auxiliar para guardar los datos Y LUEGO cerrar el diálogo
-        def save_and_close(e):
-            self.guardar_nueva_categoria(nueva_categoria_field.value)
+        async def save_and_close(e):
+            await self.guardar_nueva_categoria(nueva_categoria_field.value)
             close_dialog(e) # Reutiliza la función de cierre
 
         nueva_categoria_field = ft.TextField(label="Nombre de nueva categoría")
@@ -413,13 +602,12 @@ class ButtonGenerator:
         
         return dlg
     
-    def guardar_nueva_categoria(self, nombre):
+    @medido
+    async def guardar_nueva_categoria(self, nombre):
         if nombre.strip():
-            self.controller.crear_categoria(nombre.strip())
+            await self.controller.crear_categoria(nombre.strip())
+            publicar_cambio(self.page, "categorias", [])
             # Recargar opciones del dropdown
-            self.categoria_dropdown.options = [
-                ft.dropdown.Option(cat.nombre_categoria)
-                for cat in self.controller.obtener_categorias()
-            ]
+            await self.cargar_categorias()
             self.categoria_dropdown.value = nombre.strip()  # Seleccionar la nueva
             self.categoria_dropdown.update()
\ No newline at end of file
@@ -1,15 +1,17 @@
 import flet as ft
 from button_generator import ButtonGenerator
-from controller import InventoryController
-from table_generator import TableGenerator
+from controller_async import obtener_controlador_async
+from instrumentacion import medido
+from table_generator import Paginador, TablaArticulos, TableGenerator
 
 
-class CategoryArticleView(ft.Column):
-    def __init__(self, page: ft.Page, category, *args, **kwargs):
+class CategoryArticleView(TablaArticulos, ft.Column):
+    def __init__(self, page: ft.Page, category, controller=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.page = page
-        self.controller = InventoryController()
+        self.controller = controller or obtener_controlador_async()
         self.category = category
+        self.categoria_tabla = category
         self.margin_main_rigth = self.page.width * 0.015
         self.spacing = 10
         self.expand = True
@@ -17,8 +19,10 @@ class CategoryArticleView(ft.Column):
         self.alignment = ft.MainAxisAlignment.CENTER
         self.horizontal_alignment = ft.CrossAxisAlignment.CENTER
         self.table_generator = TableGenerator(self.controller)
+        self.paginador = Paginador(on_change=self.refresh_table)
 
         self.selected_row = None
+        self.selected_ids = set()
         self.button_generator = ButtonGenerator(
             page=self.page,
             selected_row=self.selected_row,
@@ -26,6 +30,9 @@ class CategoryArticleView(ft.Column):
             on_refresh_table=self.refresh_table,
             origin="categoria",
             table_data=self.article_data,
+            controller=self.controller,
+            category=self.category,
+            on_row_change=self.apply_row_change,
         )
 
         self.controls = [
@@ -43,7 +50,7 @@ class CategoryArticleView(ft.Column):
                     content=ft.Column(
                         [
                             ft.Container(
-                                content=self.create_article_table(),
+                                content=ft.DataTable(columns=[ft.DataColumn(label=ft.Text(""))], rows=[]),
                                 expand=True,
                                 padding=ft.padding.all(10),
                             )
@@ -53,37 +60,23 @@ class CategoryArticleView(ft.Column):
                     ),
                     expand=True,
                     alignment=ft.alignment.top_center,
-                    height=self.page.height * 0.82,
+                    height=self.page.height * 0.76,
                     margin=ft.margin.only(right=float(self.margin_main_rigth)),
                     border_radius=ft.border_radius.all(10),
                 ),
             ]),
+            ft.Container(
+                content=self.paginador.create_controls(),
+                margin=ft.margin.only(right=float(self.margin_main_rigth)),
+            ),
         ]
 
-    def get_index(self, e):
-        row_id = int(e.control.cells[0].content.value)
-        container = self.controls[1].controls[0]  # El primer contenedor dentro del Row
-        table = container.content.controls[0].content  # Acceder al contenido de la tabla
-
-        # Deselect all rows
-        for row in table.rows:
-            if row != e.control:
-                row.selected = False
-
-        # Toggle the selection of the current row
-        e.control.selected = not e.control.selected
-
-        if e.control.selected:
-            self.selected_row = self.controller.obtener_articulo(row_id)
-        else:
-            self.selected_row = None
+    def did_mount(self):
+        # Los artículos se consultan ya montada la vista, sin bloquear el cambio de ruta
+        self.page.run_task(self.refresh_table)
 
-        # Actualizamos el estado de selected_row en ButtonGenerator
-        self.button_generator.selected_row = self.selected_row
-
-        # Actualizamos los botones
-        self.refresh_buttons()
-        self.update()
+    def tabla_articulos(self):
+        return self.controls[1].controls[0].content.controls[0].content
 
     def refresh_buttons(self):
         # Actualiza los botones con el estado actual de selected_row
@@ -97,23 +90,13 @@ class CategoryArticleView(ft.Column):
         )
         self.page.update()
 
-    def create_article_table(self):
-        # Obtenemos los artículos de la categoría
-        articles = self.controller.obtener_articulos_por_categoria(self.category)
-        updated_articles = []
-        for article in articles:
-            cantidad_total = self.controller.calcular_cantidad_actual(article["id"])
-            costo_promedio = self.controller.calcular_costo_promedio_articulo(article["id"])
-            updated_articles.append(
-                {
-                    "id": article["id"],
-                    "nombre": article["nombre"],
-                    "categoria": article["categoria"],
-                    "cantidad": cantidad_total,
-                    "costo": costo_promedio,
-                    "bar_code": article["bar_code"],
-                }
-            )
+    async def create_article_table(self):
+        # Obtenemos solo la página visible de los artículos de la categoría
+        updated_articles = await self.paginador.cargar(
+            lambda limite, despues_de_id: self.controller.obtener_articulos_con_existencias(
+                self.category, limite, despues_de_id),
+            lambda: self.controller.contar_articulos(nombre_categoria=self.category),
+        )
         self.article_data = updated_articles
         self.button_generator.table_data = updated_articles
 
@@ -129,8 +112,10 @@ class CategoryArticleView(ft.Column):
         # Volver a la vista de categorías
         self.page.go("/categorias")
 
-    def refresh_table(self):
+    @medido
+    async def refresh_table(self):
         """Método para refrescar la tabla después de una acción (crear, editar, eliminar)"""
         # Re-generar la tabla con los artículos actualizados
-        self.controls[1].controls[0].content = self.create_article_table()
-        self.page.update()
+        self.controls[1].controls[0].content.controls[0].content = await self.create_article_table()
+        self.clear_selection()
+        self.refresh_buttons()
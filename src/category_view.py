@@ -1,12 +1,13 @@
 import flet as ft
-from controller import InventoryController
+from controller_async import obtener_controlador_async
+from instrumentacion import medido
 
 
 class CategoryView(ft.Column):
-    def __init__(self, page: ft.Page, go_to_main_view_from_categories, *args, **kwargs):
+    def __init__(self, page: ft.Page, go_to_main_view_from_categories, controller=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.page = page
-        self.controller = InventoryController()
+        self.controller = controller or obtener_controlador_async()
         self.go_to_main_view_from_categories = go_to_main_view_from_categories
         self.spacing = 10
         self.alignment = ft.MainAxisAlignment.START
@@ -16,22 +17,25 @@ class CategoryView(ft.Column):
             ft.TextButton("Volver", on_click=self.go_to_main_view_from_categories)
         ]
 
-    def update_category_cards(self):
-        categories = self.controller.obtener_categorias()
+    @medido
+    async def update_category_cards(self):
+        # Una sola consulta agrupada para todas las tarjetas
+        resumen = await self.controller.obtener_resumen_categorias()
         category_cards = []
-        for category in categories:
-            articles_in_category = self.controller.obtener_articulos_por_categoria(category.nombre_categoria)
+        for category in resumen:
             card = ft.Card(
                 content=ft.Container(
                     padding=10,
                     content=ft.Column(
                         [
-                            ft.Text(category.nombre_categoria, weight=ft.FontWeight.BOLD),
-                            ft.Text(f"Número de items: {len(articles_in_category)}", size=12),
+                            ft.Text(category["nombre_categoria"], weight=ft.FontWeight.BOLD),
+                            ft.Text(f"Número de items: {category['articulos']}", size=12),
+                            ft.Text(f"Existencias: {category['cantidad_total']}", size=12),
+                            ft.Text(f"Valor: {category['valor_total']:.2f}", size=12),
                         ],
                         horizontal_alignment=ft.CrossAxisAlignment.START,
                     ),
-                    on_click=lambda e, cat=category: self.show_articles_by_category(cat),
+                    on_click=lambda e, cat=category["nombre_categoria"]: self.show_articles_by_category(cat),
                 ),
                 width=200,
                 elevation=2,
@@ -43,8 +47,13 @@ class CategoryView(ft.Column):
         self.controls.insert(0, ft.Row(controls=category_cards, wrap=True)) # Insert the row at the beginning
         self.update()
 
+    @medido
+    async def al_cambiar_inventario(self, avisos):
+        """Cualquier cambio de otra sesión puede alterar los totales: se recalculan las tarjetas."""
+        await self.update_category_cards()
+
     def did_mount(self):
-        self.update_category_cards()
+        self.page.run_task(self.update_category_cards)
         
-    def show_articles_by_category(self, category):
-        self.page.go(f"/categorias/{category.nombre_categoria}")
\ No newline at end of file
+    def show_articles_by_category(self, nombre_categoria):
+        self.page.go(f"/categorias/{nombre_categoria}")
\ No newline at end of file
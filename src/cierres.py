@@ -0,0 +1,76 @@
+"""Cierres periódicos del inventario: el saldo de cada artículo al final de cada día o mes.
+
+Al cerrar un período se guarda en ``saldos_cierre`` la cantidad, el valor y el costo promedio de
+los artículos que tuvieron movimientos en él, con la fecha del último instante del período. La
+existencia de cualquier fecha pasada sale del último cierre de cada artículo anterior a esa fecha
+más los movimientos posteriores (``DatabaseManager.obtener_estado_al``), sin recorrer el historial
+desde el principio.
+
+Si se registra, borra o cambia un movimiento con fecha igual o anterior a un cierre, triggers de
+la base (migración 8) borran los cierres de ese artículo desde esa fecha; la consulta sigue siendo
+exacta porque parte del cierre anterior, y la próxima llamada a
+``InventoryController.cerrar_periodos`` los vuelve a crear. La aplicación la hace al iniciar.
+
+El período se elige con la variable de entorno ``GYESYS_PERIODO_CIERRE``: ``mensual`` (por
+defecto), ``diario`` o ``ninguno`` para no crear cierres. Uso por consola, desde ``src``:
+
+    python cierres.py inventario.db --periodo diario
+    python cierres.py inventario.db --al 2024-06-30
+"""
+import argparse
+import datetime
+import os
+
+PERIODOS = ('diario', 'mensual')
+PERIODO_CIERRE = os.environ.get('GYESYS_PERIODO_CIERRE', 'mensual')
+
+_UN_MICROSEGUNDO = datetime.timedelta(microseconds=1)
+
+
+def inicio_de_periodo(fecha: datetime.datetime, periodo: str) -> datetime.datetime:
+    """Primer instante del período que contiene ``fecha``."""
+    if periodo == 'diario':
+        return datetime.datetime.combine(fecha.date(), datetime.time())
+    if periodo == 'mensual':
+        return datetime.datetime(fecha.year, fecha.month, 1)
+    raise ValueError(f"Período de cierre desconocido: {periodo}")
+
+
+def fin_de_periodo(fecha: datetime.datetime, periodo: str) -> datetime.datetime:
+    """Último instante del período que contiene ``fecha``: la fecha de su cierre."""
+    inicio = inicio_de_periodo(fecha, periodo)
+    if periodo == 'diario':
+        siguiente = inicio + datetime.timedelta(days=1)
+    elif inicio.month == 12:
+        siguiente = datetime.datetime(inicio.year + 1, 1, 1)
+    else:
+        siguiente = datetime.datetime(inicio.year, inicio.month + 1, 1)
+    return siguiente - _UN_MICROSEGUNDO
+
+
+def ultimo_cierre(fecha: datetime.datetime, periodo: str) -> datetime.datetime:
+    """Fecha de cierre del último período terminado antes de ``fecha``."""
+    return inicio_de_periodo(fecha, periodo) - _UN_MICROSEGUNDO
+
+
+if __name__ == "__main__":
+    from controller import InventoryController
+
+    parser = argparse.ArgumentParser(description="Crea los cierres pendientes de inventario.db")
+    parser.add_argument("db", nargs="?", default="inventario.db")
+    parser.add_argument("--periodo", choices=PERIODOS, default=PERIODO_CIERRE if PERIODO_CIERRE in PERIODOS else 'mensual')
+    parser.add_argument("--al", type=datetime.datetime.fromisoformat,
+                        help="en lugar de cerrar, muestra la existencia y el valor a esa fecha (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    controller = InventoryController(args.db)
+    if args.al:
+        # Fin del día indicado, si no trae hora
+        al = fin_de_periodo(args.al, 'diario') if args.al.time() == datetime.time() else args.al
+        estados = controller.valorar_inventario(hasta=al)
+        print(f"Al {al:%Y-%m-%d %H:%M:%S}: {len(estados)} artículos, "
+              f"{sum(e['cantidad'] for e in estados.values())} unidades, "
+              f"valor {sum(e['valor'] for e in estados.values()):.2f}")
+    else:
+        guardados = controller.cerrar_periodos(args.periodo)
+        print(f"Saldos de cierre guardados: {guardados}")
@@ -1,38 +1,108 @@
 import datetime
-import pytz
-from database import DatabaseManager
+import threading
+from cache import CacheLRU
+from cierres import PERIODO_CIERRE, PERIODOS, ultimo_cierre
+from database import DatabaseManager, _sin_zona, date_time
+from instrumentacion import medido_metodo
+from valoracion import costo_promedio_entradas
+
+# Tamaño de las cachés de lectura de cada controlador
+CACHE_ARTICULOS_CAPACIDAD = 2000
+CACHE_CATEGORIAS_CAPACIDAD = 256
+
+_controladores = {}
+_controladores_lock = threading.Lock()
+
+
+def obtener_controlador(db_path='inventario.db', perfil=None) -> "InventoryController":
+    """Devuelve el controlador compartido del proceso para la base indicada."""
+    with _controladores_lock:
+        if db_path not in _controladores:
+            _controladores[db_path] = InventoryController(db_path, perfil)
+        return _controladores[db_path]
+
 
 class InventoryController:
-    def __init__(self, db_path='inventario.db'):
-        self.db_manager = DatabaseManager(db_path)
+    def __init__(self, db_path='inventario.db', perfil=None):
+        self.db_manager = DatabaseManager(db_path, perfil)
+        # Cachés de lectura del proceso; cada método que modifica artículos o categorías
+        # invalida lo que cambió. Las escrituras de otros procesos no se ven hasta invalidar_cache().
+        self.cache_articulos = CacheLRU(CACHE_ARTICULOS_CAPACIDAD)
+        self.cache_categorias = CacheLRU(CACHE_CATEGORIAS_CAPACIDAD)
+        # (período, fecha) del último cierre ya creado, para que cada sesión nueva no lo repita
+        self._ultimo_cierre = None
+
+    def _leer_con_cache(self, cache, clave, cargar):
+        """Devuelve el valor guardado o lo carga de la base y lo guarda (salvo None)."""
+        valor = cache.obtener(clave)
+        if valor is None:
+            valor = cargar()
+            if valor is not None:
+                cache.guardar(clave, valor)
+        return valor
+
+    def invalidar_cache(self):
+        self.cache_articulos.limpiar()
+        self.cache_categorias.limpiar()
+
+    def estadisticas_cache(self) -> dict:
+        return {
+            'articulos': self.cache_articulos.estadisticas(),
+            'categorias': self.cache_categorias.estadisticas(),
+        }
 
     def crear_articulo(self, nombre: str, categoria: str, cantidad: int, costo: float, bar_code: str, fecha_hora: datetime.datetime = None):
-        return self.db_manager.crear_articulo(nombre, categoria, cantidad, costo, bar_code, fecha_hora)
+        articulo = self.db_manager.crear_articulo(nombre, categoria, cantidad, costo, bar_code, fecha_hora)
+        self.cache_categorias.limpiar()  # Pudo crearse la categoría
+        return articulo
 
     def obtener_articulo(self, articulo_id: int):
-        return self.db_manager.obtener_articulo(articulo_id)
+        return self._leer_con_cache(
+            self.cache_articulos, articulo_id, lambda: self.db_manager.obtener_articulo(articulo_id))
 
     def obtener_todos_articulos(self):
         return self.db_manager.obtener_todos_articulos()
 
     def actualizar_articulo(self, articulo_id: int, nombre: str, categoria: str, cantidad: int, costo: float, bar_code: str):
         """Llama al método de la base de datos para actualizar un artículo."""
-        return self.db_manager.actualizar_articulo(articulo_id, nombre, categoria, cantidad, costo, bar_code)
+        try:
+            return self.db_manager.actualizar_articulo(articulo_id, nombre, categoria, cantidad, costo, bar_code)
+        finally:
+            self.cache_articulos.invalidar(articulo_id)
+            self.cache_categorias.limpiar()
 
     def eliminar_articulo(self, articulo_id: int):
-        return self.db_manager.eliminar_articulo(articulo_id)
+        """Elimina un artículo con todos sus registros."""
+        eliminado = self.db_manager.eliminar_articulo(articulo_id)
+        self.cache_articulos.invalidar(articulo_id)
+        return eliminado
+
+    def eliminar_articulos(self, articulo_ids):
+        """Elimina varios artículos con sus registros en una sola transacción; devuelve cuántos."""
+        articulo_ids = list(articulo_ids)
+        eliminados = self.db_manager.eliminar_articulos(articulo_ids)
+        self.cache_articulos.invalidar(*articulo_ids)
+        return eliminados
 
     def crear_categoria(self, nombre_categoria: str):
-        return self.db_manager.crear_categoria(nombre_categoria)
+        categoria = self.db_manager.crear_categoria(nombre_categoria)
+        self.cache_categorias.limpiar()
+        return categoria
 
     def obtener_categoria(self, nombre_categoria: str):
-        return self.db_manager.obtener_categoria(nombre_categoria)
+        return self._leer_con_cache(
+            self.cache_categorias, ('categoria', nombre_categoria),
+            lambda: self.db_manager.obtener_categoria(nombre_categoria))
 
     def obtener_todas_categorias(self):
-        return self.db_manager.obtener_todas_categorias()
+        return list(self._leer_con_cache(
+            self.cache_categorias, 'todas', self.db_manager.obtener_todas_categorias))
 
     def actualizar_categoria(self, nombre_actual: str, nuevo_nombre: str):
-        return self.db_manager.actualizar_categoria(nombre_actual, nuevo_nombre)
+        categoria = self.db_manager.actualizar_categoria(nombre_actual, nuevo_nombre)
+        # Los artículos en caché guardan el nombre de la categoría
+        self.invalidar_cache()
+        return categoria
 
     def eliminar_categoria(self, nombre_categoria: str):
         try:
@@ -40,115 +110,192 @@ class InventoryController:
         except ValueError as e:
             print(e)
             return False
+        finally:
+            self.cache_categorias.limpiar()
 
     def obtener_articulos_por_categoria(self, nombre_categoria: str):
         return self.db_manager.obtener_articulos_por_categoria(nombre_categoria)
 
+    def obtener_resumen_categorias(self):
+        """Artículos, existencias y valor total por categoría, calculados en una sola consulta."""
+        return self.db_manager.obtener_resumen_categorias()
+
+    def buscar_por_codigo_barras(self, bar_code: str):
+        """Devuelve el id y el nombre del artículo con ese código de barras, o None."""
+        return self.db_manager.buscar_por_codigo_barras(bar_code)
+
+    def registrar_escaneo(self, bar_code: str, unidad: int = 1, entrada: bool = True, costo: float = None):
+        """Registra la entrada o salida de un artículo leído con el escáner.
+
+        Sin ``costo`` una salida usa el de su método de costeo y una entrada el costo promedio
+        vigente. Devuelve el artículo (id y nombre) y el registro creado; lanza ValueError si el
+        código no existe.
+        """
+        articulo = self.buscar_por_codigo_barras(bar_code)
+        if articulo is None:
+            raise ValueError(f"Código de barras desconocido: {bar_code}")
+        if unidad <= 0:
+            raise ValueError("La cantidad debe ser mayor que cero.")
+        descripcion = "Entrada por escáner" if entrada else "Salida por escáner"
+        registro = self.registrar_movimiento(articulo['id'], descripcion, entrada, unidad, costo)
+        return articulo, registro
+
+    def resolver_codigos_barras(self, codigos):
+        return self.db_manager.resolver_codigos_barras(codigos)
+
+    def filtrar_articulos_existentes(self, ids):
+        return self.db_manager.filtrar_articulos_existentes(ids)
+
+    def obtener_articulos_con_existencias(self, nombre_categoria: str = None, limite: int = None, despues_de_id: int = None,
+                                          articulo_ids=None):
+        """Obtiene los artículos (o solo los de ``articulo_ids``) con su cantidad actual y costo promedio
+        ponderado en una sola consulta. Con ``limite`` y ``despues_de_id`` devuelve solo una página
+        (paginación por id)."""
+        return self.db_manager.obtener_existencias_articulos(nombre_categoria, limite, despues_de_id, articulo_ids)
+
+    def obtener_articulo_con_existencias(self, articulo_id: int):
+        """Obtiene la fila de un solo artículo con su saldo, en el mismo formato que la tabla."""
+        return self.db_manager.obtener_existencia_articulo(articulo_id)
+
     def calcular_cantidad_actual(self, articulo_id: int) -> int:
-        """Calcula la cantidad actual de un artículo basándose en los registros."""
-        registros = self.db_manager.obtener_registros_por_articulo(articulo_id)
-        cantidad_total = 0
-        for registro in registros:
-            if registro['entrada_salida']:
-                cantidad_total += registro['unidad']
-            else:
-                cantidad_total -= registro['unidad']
-        return cantidad_total
+        """Obtiene la cantidad actual de un artículo desde su saldo materializado."""
+        return self.db_manager.obtener_saldo(articulo_id)['cantidad']
 
     def calcular_costo_promedio(self, articulo_id: int) -> float:
         """Calcula el costo promedio ponderado de un artículo (basado solo en entradas)."""
-        registros = self.obtener_registros_por_articulo(articulo_id)
-        total_valor = 0
-        total_cantidad = 0
-
-        for registro in registros:
-            if registro['entrada_salida']:  # Entrada
-                total_valor += registro['unidad'] * registro['costo']
-                total_cantidad += registro['unidad']
-        if total_cantidad > 0:
-            return total_valor / total_cantidad
-        return 0.0
+        return costo_promedio_entradas(self.db_manager.obtener_columnas_movimientos([articulo_id]))
 
     def calcular_costo_promedio_articulo(self, articulo_id):
-        cantidad_total_acumulada = 0
-        valor_total_acumulado = 0
-        costo_promedio = 0.0
-
-        registros = self.obtener_registros_por_articulo(articulo_id)
-        registros_ordenados = sorted(registros, key=lambda x: x['fecha_hora'])
+        """Obtiene el costo promedio ponderado vigente de un artículo desde su saldo materializado."""
+        return self.db_manager.obtener_saldo(articulo_id)['costo_promedio']
 
-        for registro in registros_ordenados:
-            costo_movimiento = registro['unidad'] * registro['costo']
+    def obtener_saldo(self, articulo_id: int):
+        return self.db_manager.obtener_saldo(articulo_id)
 
-            if registro['entrada_salida']:
-                cantidad_total_acumulada += registro['unidad']
-                valor_total_acumulado += costo_movimiento
-            else:
-                cantidad_total_acumulada -= registro['unidad']
-                valor_total_acumulado -= costo_movimiento
+    def costo_salida(self, articulo_id: int, unidad: int = 1) -> float:
+        """Costo unitario sugerido para una salida de ``unidad`` unidades, según el método de
+        costeo del artículo (promedio ponderado, PEPS o UEPS)."""
+        return self.db_manager.costo_salida(articulo_id, max(unidad, 1))
 
-            if cantidad_total_acumulada != 0:
-                costo_promedio = valor_total_acumulado / cantidad_total_acumulada
-
-        return costo_promedio
+    def establecer_metodo_costo(self, articulo_id: int, metodo: str) -> bool:
+        """Cambia el método de costeo de un artículo (una clave de valoracion.METODOS_COSTO)."""
+        try:
+            return self.db_manager.establecer_metodo_costo(articulo_id, metodo)
+        finally:
+            self.cache_articulos.invalidar(articulo_id)
+
+    def obtener_lotes(self, articulo_id: int):
+        """Lotes abiertos de un artículo costeado por PEPS o UEPS, del más antiguo al más reciente."""
+        return self.db_manager.obtener_lotes(articulo_id)
+
+    def valorar_inventario(self, articulo_ids=None, hasta: datetime.datetime = None) -> dict:
+        """Cantidad, valor y costo promedio de cada artículo con movimientos al momento ``hasta``
+        (por defecto, el actual), desde el último cierre de cada uno y los movimientos posteriores."""
+        return self.db_manager.obtener_estado_al(hasta, articulo_ids)
+
+    def cerrar_periodos(self, periodo: str = PERIODO_CIERRE, hasta: datetime.datetime = None) -> int:
+        """Crea los cierres de ``periodo`` (ver cierres.py) que faltan hasta el último período
+        terminado. Con cualquier otro valor, como ``ninguno``, no hace nada.
+
+        Sin ``hasta``, solo la primera llamada de cada período hace la consulta; los cierres que
+        invaliden movimientos con fecha anterior se vuelven a crear al terminar el siguiente."""
+        if periodo not in PERIODOS:
+            return 0
+        if hasta is not None:
+            return self.db_manager.crear_cierres(periodo, hasta)
+        # La misma hora de Caracas que usa crear_cierres, para que ambos vean el mismo período
+        ahora = _sin_zona(datetime.datetime.now(date_time))
+        cierre = (periodo, ultimo_cierre(ahora, periodo))
+        if cierre == self._ultimo_cierre:
+            return 0
+        guardados = self.db_manager.crear_cierres(periodo, ahora)
+        self._ultimo_cierre = cierre
+        return guardados
+
+    def rebuild_balances(self):
+        """Reconstruye los saldos de todos los artículos desde el historial de registros."""
+        saldos = self.db_manager.rebuild_balances()
+        self.cache_articulos.limpiar()
+        return saldos
 
     # Métodos para la tabla Registro
 
     def registrar_movimiento(self, articulo_id: int, descripcion: str, entrada: bool, unidad: int, costo: float, fecha_hora: datetime.datetime = None):
         """Registra un movimiento de inventario para un artículo."""
-        fecha_registro = fecha_hora if fecha_hora else datetime.datetime.now(pytz.timezone('America/Caracas'))
-        return self.db_manager.registrar_movimiento(articulo_id, descripcion, entrada, unidad, costo, fecha_hora=fecha_registro)
+        # Sin fecha, la base usa la hora en que obtiene el turno de escritura, así los movimientos
+        # concurrentes quedan en orden y el saldo se actualiza sin recalcular el historial
+        registro = self.db_manager.registrar_movimiento(articulo_id, descripcion, entrada, unidad, costo, fecha_hora=fecha_hora)
+        self.cache_articulos.invalidar(articulo_id)  # Cambiaron su cantidad y costo
+        return registro
+
+    def registrar_movimientos_bulk(self, movimientos, tamano_lote: int = 1000):
+        """Registra muchos movimientos (iterable de diccionarios) en una sola transacción."""
+        try:
+            return self.db_manager.registrar_movimientos_bulk(movimientos, tamano_lote)
+        finally:
+            self.cache_articulos.limpiar()
 
-    def obtener_registros_por_articulo(self, articulo_id: int):
-        """Obtiene todos los registros de movimiento para un artículo específico."""
-        return self.db_manager.obtener_registros_por_articulo(articulo_id)
+    def crear_articulos_bulk(self, articulos, tamano_lote: int = 1000):
+        """Crea muchos artículos (iterable de diccionarios) con su entrada inicial en una sola transacción."""
+        try:
+            return self.db_manager.crear_articulos_bulk(articulos, tamano_lote)
+        finally:
+            self.cache_categorias.limpiar()
 
-    def obtener_registro(self, registro_id):
-        """Obtiene un registro de movimiento por su fecha y hora."""
+    def obtener_registros_por_articulo(self, articulo_id: int, desde: datetime.datetime = None):
+        """Obtiene los registros de movimiento de un artículo, todos o los posteriores a ``desde``."""
+        return self.db_manager.obtener_registros_por_articulo(articulo_id, desde)
+
+    def obtener_registro(self, registro_id: int):
+        """Obtiene un registro de movimiento por su ID."""
         return self.db_manager.obtener_registro(registro_id)
 
-    def eliminar_registro(self, registro_fecha_hora: datetime.datetime):
-        """Elimina un registro por su fecha y hora."""
-        return self.db_manager.eliminar_registro(registro_fecha_hora)
+    def eliminar_registro(self, registro_id: int):
+        """Elimina un registro por su ID."""
+        eliminado = self.db_manager.eliminar_registro(registro_id)
+        if eliminado:
+            self.cache_articulos.limpiar()  # No se sabe de qué artículo era sin otra consulta
+        return eliminado
     
     def eliminar_todo_registro(self, articulo_id: int):
-        return self.db_manager.eliminar_todo_registro(articulo_id)
+        eliminado = self.db_manager.eliminar_todo_registro(articulo_id)
+        self.cache_articulos.invalidar(articulo_id)
+        return eliminado
     
     def obtener_registros_por_categoria(self, category_nombre: str):
        return self.db_manager.obtener_registros_por_categoria(category_nombre)
 
     def obtener_categorias(self):
-        return self.db_manager.obtener_categorias()
+        return list(self._leer_con_cache(
+            self.cache_categorias, 'todas', self.db_manager.obtener_categorias))
     
-    def generar_reporte_detallado(self, fecha_inicio: datetime.datetime, fecha_fin: datetime.datetime):
+    def generar_reporte_detallado(self, fecha_inicio: datetime.datetime, fecha_fin: datetime.datetime, articulo_ids=None):
         if fecha_inicio >= fecha_fin:
             raise ValueError("La fecha de inicio debe ser anterior a la fecha de fin.")
 
-        todos_articulos = self.obtener_todos_articulos()
-        reporte = []
+        return self.db_manager.obtener_reporte_detallado(fecha_inicio, fecha_fin, articulo_ids)
 
-        for articulo in todos_articulos:
-            registros = self.db_manager.obtener_registros_por_articulo(articulo['id'])
-            registros_periodo = [
-                r for r in registros if fecha_inicio <= r['fecha_hora'] <= fecha_fin
-            ]
+    def iterar_reporte_detallado(self, fecha_inicio: datetime.datetime, fecha_fin: datetime.datetime, articulo_ids=None, nombre_categoria=None):
+        """Igual que generar_reporte_detallado, pero devuelve un generador que lee la base por lotes."""
+        if fecha_inicio >= fecha_fin:
+            raise ValueError("La fecha de inicio debe ser anterior a la fecha de fin.")
 
-            entradas = sum(r['unidad'] for r in registros_periodo if r['entrada_salida'])
-            salidas = sum(r['unidad'] for r in registros_periodo if not r['entrada_salida'])
+        return self.db_manager.iterar_reporte_detallado(fecha_inicio, fecha_fin, articulo_ids, nombre_categoria)
 
-            total_valor_entradas = sum(r['unidad'] * r['costo'] for r in registros_periodo if r['entrada_salida'])
+    def contar_articulos(self, articulo_ids=None, nombre_categoria=None, texto=None,
+                         cantidad_minima=None, cantidad_maxima=None):
+        return self.db_manager.contar_articulos(articulo_ids, nombre_categoria, texto,
+                                                cantidad_minima, cantidad_maxima)
 
-            costo_promedio = (total_valor_entradas / entradas) if entradas > 0 else 0
-            porcentaje_salida = (salidas / entradas * 100) if entradas > 0 else 0
+    def buscar_articulos(self, texto=None, nombre_categoria=None, cantidad_minima=None, cantidad_maxima=None,
+                         orden="id", descendente=False, limite=None, despues_de=None):
+        """Busca artículos por nombre o código de barras, con filtros de categoría y existencias,
+        ordenados por id, nombre, cantidad o costo. Todo se resuelve en SQL, página por página."""
+        return self.db_manager.buscar_articulos(texto, nombre_categoria, cantidad_minima, cantidad_maxima,
+                                                orden, descendente, limite, despues_de)
 
-            reporte.append({
-                'articulo_id': articulo['id'],
-                'nombre': articulo['nombre'],
-                'categoria': articulo['categoria'],
-                'entradas': entradas,
-                'salidas': salidas,
-                'porcentaje_salida': round(porcentaje_salida, 2),
-                'costo_promedio': round(costo_promedio, 2)
-            })
 
-        return reporte
\ No newline at end of file
+# Con la instrumentación activa, cada método público cuenta sus consultas y las filas que devuelve
+for _nombre, _metodo in list(vars(InventoryController).items()):
+    if callable(_metodo) and not _nombre.startswith('_'):
+        setattr(InventoryController, _nombre, medido_metodo(_metodo))
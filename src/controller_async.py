@@ -0,0 +1,103 @@
+"""Fachada asíncrona de InventoryController para los manejadores de Flet.
+
+Cada método público del controlador tiene aquí su versión ``async``, que ejecuta la llamada
+en un pool de hilos propio y acotado. Así una consulta lenta no ocupa el bucle de eventos ni
+los hilos con que Flet atiende los eventos de todas las sesiones, y la base nunca recibe más
+trabajos simultáneos que conexiones tiene el pool de SQLAlchemy.
+
+    controller = obtener_controlador_async()
+    filas = await controller.buscar_articulos("tornillo", limite=50)
+
+Las escrituras no van al pool: esperan su turno en una cola atendida por un solo hilo, en orden
+de llegada. Con muchas sesiones web registrando movimientos, los hilos de lectura no quedan
+bloqueados esperando el candado de escritura de SQLite.
+
+Los trabajos largos que ya corren en su propio hilo (importar CSV, generar el PDF) usan el
+controlador síncrono, disponible en ``controller.sincrono``.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from controller import InventoryController, obtener_controlador
+from database import POOL_MAX_OVERFLOW, POOL_SIZE
+
+# Hilos de lectura por controlador: las conexiones del pool menos la que usa la cola de escritura
+HILOS_BASE_DATOS = POOL_SIZE + POOL_MAX_OVERFLOW - 1
+
+# Métodos que modifican la base; se ejecutan de a uno en la cola de escritura
+ESCRITURAS = {
+    'crear_articulo', 'actualizar_articulo', 'eliminar_articulo', 'eliminar_articulos',
+    'crear_categoria', 'actualizar_categoria', 'eliminar_categoria',
+    'registrar_escaneo', 'registrar_movimiento', 'registrar_movimientos_bulk', 'crear_articulos_bulk',
+    'eliminar_registro', 'eliminar_todo_registro', 'rebuild_balances', 'establecer_metodo_costo',
+    'cerrar_periodos',
+}
+
+_controladores_async = {}
+_controladores_async_lock = threading.Lock()
+
+
+def obtener_controlador_async(db_path='inventario.db', perfil=None) -> "AsyncInventoryController":
+    """Devuelve la fachada asíncrona compartida del proceso para la base indicada."""
+    with _controladores_async_lock:
+        if db_path not in _controladores_async:
+            _controladores_async[db_path] = AsyncInventoryController(obtener_controlador(db_path, perfil))
+        return _controladores_async[db_path]
+
+
+class AsyncInventoryController:
+    def __init__(self, controller: InventoryController, max_hilos: int = HILOS_BASE_DATOS):
+        self.sincrono = controller
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="inventario-db")
+        self._cola_escritura = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inventario-escritura")
+        self._pendientes_lock = threading.Lock()
+        self.escrituras_pendientes = 0
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        """Ejecuta ``funcion`` en el pool de la base y espera su resultado sin bloquear el bucle."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _en_contexto(funcion, *args, **kwargs))
+
+    async def escribir(self, funcion, *args, **kwargs):
+        """Encola ``funcion`` detrás de las escrituras anteriores y espera su resultado."""
+        with self._pendientes_lock:
+            self.escrituras_pendientes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._cola_escritura, _en_contexto(funcion, *args, **kwargs))
+        finally:
+            with self._pendientes_lock:
+                self.escrituras_pendientes -= 1
+
+    def cerrar(self):
+        self._cola_escritura.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+
+
+def _en_contexto(funcion, *args, **kwargs):
+    """La llamada lleva el contexto de quien la pidió (por ejemplo, la medición de instrumentacion)."""
+    return functools.partial(contextvars.copy_context().run, funcion, *args, **kwargs)
+
+
+def _en_pool(nombre):
+    metodo = getattr(InventoryController, nombre)
+
+    if nombre in ESCRITURAS:
+        @functools.wraps(metodo)
+        async def en_pool(self, *args, **kwargs):
+            return await self.escribir(getattr(self.sincrono, nombre), *args, **kwargs)
+    else:
+        @functools.wraps(metodo)
+        async def en_pool(self, *args, **kwargs):
+            return await self.ejecutar(getattr(self.sincrono, nombre), *args, **kwargs)
+
+    return en_pool
+
+
+# Versión async de cada método público, en el pool o en la cola de escritura. iterar_reporte_detallado devuelve un generador que lee
+# la base a medida que se consume, así que solo tiene sentido en un hilo: usar sincrono.
+for _nombre, _metodo in list(vars(InventoryController).items()):
+    if callable(_metodo) and not _nombre.startswith('_') and _nombre != 'iterar_reporte_detallado':
+        setattr(AsyncInventoryController, _nombre, _en_pool(_nombre))
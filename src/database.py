@@ -1,32 +1,129 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from typing import List, Optional
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, select, case, func, and_, or_, cast, delete, insert, update, bindparam, tuple_, table, column, text, literal
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, column_property
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import QueuePool
+from typing import Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+from itertools import groupby, islice
+from cache import CacheLRU
+from cierres import fin_de_periodo, ultimo_cierre
+from instrumentacion import instrumentar_engine
+from migrations import aplicar_migraciones, tiene_busqueda_texto
+from valoracion import (ColumnasMovimientos, ColaLotes, ESTADO_INICIAL, METODO_POR_DEFECTO, METODOS_COSTO,
+                        METODOS_LOTES, acumular, costo_unitario_salida, tomar_de_lotes, valorar)
 import datetime
+import operator
+import os
+import re
+import threading
 import pytz
 
 Base = declarative_base()
 date_time = pytz.timezone('America/Caracas')
 
+# Pool de conexiones compartido por todas las vistas del proceso
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30
+
+# Perfiles de SQLite que se aplican a cada conexión nueva. Se elige con el parámetro
+# ``perfil`` de DatabaseManager o con la variable de entorno GYESYS_PERFIL_DB.
+PERFILES_SQLITE = {
+    # Valores por defecto de SQLite (diario de reversión); para carpetas de red donde WAL no funciona
+    'compatible': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+    },
+    # Cada commit llega al disco antes de confirmarse; para equipos con cortes de luz frecuentes
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,      # KiB (negativo), ~16 MB
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,      # ms
+    },
+    # Con WAL, NORMAL solo arriesga los últimos commits ante un corte de energía, nunca la integridad
+    'rapido': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,      # ~64 MB
+        'mmap_size': 268435456,    # 256 MB
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+    },
+}
+PERFIL_POR_DEFECTO = 'rapido'
+
+
+def _configurar_conexion(engine, pragmas: dict):
+    """Registra los PRAGMA del perfil para que se apliquen a cada conexión del pool."""
+    @event.listens_for(engine, "connect")
+    def aplicar_pragmas(dbapi_connection, connection_record):
+        # Las transacciones las abre iniciar_transaccion, no el driver
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def iniciar_transaccion(conn):
+        # Con WAL, una transacción que lee y después escribe falla de inmediato con SQLITE_BUSY si
+        # otro escritor confirmó en el medio (busy_timeout no la espera). Las sesiones de escritura
+        # piden el bloqueo con BEGIN IMMEDIATE, así los escritores concurrentes esperan su turno.
+        if conn.get_execution_options().get('escritura'):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.exec_driver_sql("BEGIN")
+
 # Modelo de Categoría
 class Categoria(Base):
     __tablename__ = 'categorias'
 
-    nombre_categoria = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    nombre_categoria = Column(String, nullable=False, unique=True)
     articulos = relationship("Articulo", back_populates="categoria_rel")
 
     def __repr__(self):
         return f"Categoria(nombre_categoria='{self.nombre_categoria}')"
 
+
+def _id_categoria(nombre_categoria: str):
+    """Subconsulta con el id de la categoría, para filtrar artículos por el índice de categoria_id."""
+    return select(Categoria.id).where(Categoria.nombre_categoria == nombre_categoria).scalar_subquery()
+
+
 # Modelo de Artículo
 class Articulo(Base):
     __tablename__ = 'articulos'
+    __table_args__ = (
+        Index('ix_articulos_categoria', 'categoria_id'),
+        Index('ix_articulos_nombre', 'nombre'),
+        Index('ix_articulos_cantidad', 'cantidad'),
+        Index('ix_articulos_costo', 'costo'),
+        Index('ux_articulos_bar_code', 'bar_code', unique=True, sqlite_where=text('bar_code IS NOT NULL')),
+    )
 
     id = Column(Integer, primary_key=True)
     nombre = Column(String)
-    categoria = Column(String, ForeignKey('categorias.nombre_categoria'))
+    categoria_id = Column(Integer, ForeignKey('categorias.id'))
+    # Nombre de la categoría, leído junto con el artículo (solo lectura: se asigna categoria_rel)
+    categoria = column_property(
+        select(Categoria.nombre_categoria).where(Categoria.id == categoria_id).scalar_subquery()
+    )
+    # Copia del saldo (cantidad y costo promedio), escrita en la misma transacción que él, para
+    # ordenar y filtrar las búsquedas por índice sin unir la tabla de saldos
     cantidad = Column(Integer)
     costo = Column(Float)
     bar_code = Column(String)
+    # Cómo se costean las salidas: una clave de valoracion.METODOS_COSTO
+    metodo_costo = Column(String, nullable=False, default=METODO_POR_DEFECTO, server_default=METODO_POR_DEFECTO)
 
     categoria_rel = relationship("Categoria", back_populates="articulos")
     registros = relationship("Registro", back_populates="articulo_rel")
@@ -43,14 +140,22 @@ class Articulo(Base):
             'categoria': self.categoria,
             'cantidad': self.cantidad,
             'costo': self.costo,
-            'bar_code': self.bar_code
+            'bar_code': self.bar_code,
+            'metodo_costo': self.metodo_costo,
         }
 
 # Modelo de Registro
 class Registro(Base):
     __tablename__ = 'registros'
+    __table_args__ = (
+        Index('ix_registros_articulo_fecha', 'articulo_id', 'fecha_hora'),
+        Index('ix_registros_fecha', 'fecha_hora'),
+        # AUTOINCREMENT: SQLite no reutiliza el id de un registro borrado, que los lotes usan de clave
+        {'sqlite_autoincrement': True},
+    )
 
-    fecha_hora = Column(DateTime, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    fecha_hora = Column(DateTime, nullable=False)
     descripcion = Column(String)
     entrada_salida = Column(Boolean)  # True para entrada, False para salida
     unidad = Column(Integer)
@@ -60,13 +165,14 @@ class Registro(Base):
     articulo_rel = relationship("Articulo", back_populates="registros")
 
     def __repr__(self):
-        return (f"Registro(fecha_hora='{self.fecha_hora}', descripcion='{self.descripcion}', "
+        return (f"Registro(id={self.id}, fecha_hora='{self.fecha_hora}', descripcion='{self.descripcion}', "
                 f"entrada_salida={self.entrada_salida}, unidad={self.unidad}, "
                 f"costo={self.costo}, articulo_id={self.articulo_id})")
     
     def to_dict(self):
         """Convierte el objeto Registro en un diccionario."""
         return {
+            'id': self.id,
             'fecha_hora': self.fecha_hora,
             'descripcion': self.descripcion,
             'entrada_salida': self.entrada_salida,
@@ -75,18 +181,212 @@ class Registro(Base):
             'articulo_id': self.articulo_id
         }
 
+# Modelo de Saldo (existencias materializadas por artículo)
+class SaldoArticulo(Base):
+    __tablename__ = 'saldos'
+
+    articulo_id = Column(Integer, ForeignKey('articulos.id'), primary_key=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+    valor = Column(Float, nullable=False, default=0.0)
+    costo_promedio = Column(Float, nullable=False, default=0.0)
+    ultima_fecha = Column(DateTime)  # Fecha del movimiento más reciente aplicado al saldo
+
+    def __repr__(self):
+        return (f"SaldoArticulo(articulo_id={self.articulo_id}, cantidad={self.cantidad}, "
+                f"valor={self.valor}, costo_promedio={self.costo_promedio}, "
+                f"ultima_fecha='{self.ultima_fecha}')")
+
+    def to_dict(self):
+        return {
+            'articulo_id': self.articulo_id,
+            'cantidad': self.cantidad,
+            'valor': self.valor,
+            'costo_promedio': self.costo_promedio,
+            'ultima_fecha': self.ultima_fecha
+        }
+
+# Existencias y costo vigentes de un artículo según su saldo; sin saldo (sin movimientos), cero
+_CANTIDAD_SALDO = func.coalesce(SaldoArticulo.cantidad, 0)
+_COSTO_SALDO = func.coalesce(SaldoArticulo.costo_promedio, 0.0)
+
+# Modelo de Lote (unidades aún no consumidas de una entrada, en artículos costeados por PEPS o UEPS)
+class Lote(Base):
+    __tablename__ = 'lotes'
+    __table_args__ = (
+        Index('ix_lotes_articulo_fecha', 'articulo_id', 'fecha_hora', 'registro_id'),
+    )
+
+    # La entrada que abrió el lote. Sin clave foránea: los lotes se derivan de los registros y se
+    # reconstruyen cuando se borra alguno
+    registro_id = Column(Integer, primary_key=True)
+    articulo_id = Column(Integer, ForeignKey('articulos.id'), nullable=False)
+    fecha_hora = Column(DateTime, nullable=False)
+    restante = Column(Integer, nullable=False)
+    costo = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return (f"Lote(registro_id={self.registro_id}, articulo_id={self.articulo_id}, "
+                f"fecha_hora='{self.fecha_hora}', restante={self.restante}, costo={self.costo})")
+
+    def to_dict(self):
+        return {
+            'registro_id': self.registro_id,
+            'articulo_id': self.articulo_id,
+            'fecha_hora': self.fecha_hora,
+            'restante': self.restante,
+            'costo': self.costo,
+        }
+
+# Modelo de Saldo de cierre (estado de un artículo al final de un período en que tuvo movimientos)
+class SaldoCierre(Base):
+    __tablename__ = 'saldos_cierre'
+
+    # La clave (articulo_id, fecha) es el índice con el que se busca el último cierre de cada
+    # artículo anterior a una fecha. Los triggers de la migración 8 borran los cierres que deja
+    # desactualizados un movimiento con fecha anterior
+    articulo_id = Column(Integer, ForeignKey('articulos.id'), primary_key=True)
+    fecha = Column(DateTime, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+    valor = Column(Float, nullable=False)
+    costo_promedio = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return (f"SaldoCierre(articulo_id={self.articulo_id}, fecha='{self.fecha}', cantidad={self.cantidad}, "
+                f"valor={self.valor}, costo_promedio={self.costo_promedio})")
+
+    def to_dict(self):
+        return {
+            'articulo_id': self.articulo_id,
+            'fecha': self.fecha,
+            'cantidad': self.cantidad,
+            'valor': self.valor,
+            'costo_promedio': self.costo_promedio,
+        }
+
+
+def _orden_consumo(metodo):
+    """Orden en que ``metodo`` consume los lotes: PEPS desde el más antiguo, UEPS desde el más reciente."""
+    if metodo == 'lifo':
+        return (Lote.fecha_hora.desc(), Lote.registro_id.desc())
+    return (Lote.fecha_hora, Lote.registro_id)
+
+def _sin_zona(fecha_hora: datetime.datetime) -> datetime.datetime:
+    """SQLite guarda las fechas sin zona horaria; normaliza para poder compararlas."""
+    if fecha_hora is not None and fecha_hora.tzinfo is not None:
+        return fecha_hora.replace(tzinfo=None)
+    return fecha_hora
+
+def _codigo_barras(bar_code: Optional[str]) -> Optional[str]:
+    """Normaliza un código de barras; los vacíos se guardan como NULL para el índice único."""
+    if bar_code is None:
+        return None
+    return str(bar_code).strip() or None
+
+
+def _codigo_repetido(error: IntegrityError) -> bool:
+    """Indica si ``error`` es la violación del índice único de códigos de barras y no otra
+    restricción (NOT NULL, clave foránea)."""
+    mensaje = str(error.orig)
+    return 'articulos.bar_code' in mensaje or 'ux_articulos_bar_code' in mensaje
+
+
+def _en_lotes(iterable: Iterable, tamano: int) -> Iterator[list]:
+    """Divide un iterable en listas de ``tamano`` elementos sin cargarlo completo en memoria."""
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+def _acumular_movimientos(saldo: dict, movimientos: List[dict]) -> bool:
+    """Acumula movimientos nuevos sobre un saldo (diccionario con las claves de SaldoArticulo).
+
+    Si todos son posteriores al último movimiento aplicado se acumulan en orden, en O(1) por
+    movimiento, y devuelve True. Si alguno tiene fecha anterior el costo promedio depende del
+    orden, así que no modifica el saldo y devuelve False para que se recalcule el artículo.
+    """
+    movimientos = sorted(movimientos, key=lambda m: _sin_zona(m['fecha_hora']))
+    if saldo['ultima_fecha'] is not None and _sin_zona(movimientos[0]['fecha_hora']) < saldo['ultima_fecha']:
+        return False
+
+    for movimiento in movimientos:
+        _sumar_movimiento(saldo, movimiento)
+    saldo['ultima_fecha'] = _sin_zona(movimientos[-1]['fecha_hora'])
+    return True
+
+def _sumar_movimiento(saldo: dict, movimiento: dict):
+    """Suma un movimiento a la cantidad, el valor y el costo promedio de ``saldo``."""
+    if movimiento['entrada_salida']:
+        saldo['cantidad'] += movimiento['unidad']
+        saldo['valor'] += movimiento['unidad'] * movimiento['costo']
+    else:
+        saldo['cantidad'] -= movimiento['unidad']
+        saldo['valor'] -= movimiento['unidad'] * movimiento['costo']
+    if saldo['cantidad'] != 0:
+        saldo['costo_promedio'] = saldo['valor'] / saldo['cantidad']
+
+_conexiones = {}
+_conexiones_lock = threading.Lock()
+
+# Índice FTS5 de artículos creado por la migración 3 (solo si SQLite trae FTS5)
+_articulos_fts = table('articulos_fts', column('rowid'), column('articulos_fts'))
+
+# Códigos de barras recientes (código -> id y nombre) que se guardan en memoria por base
+CACHE_CODIGOS_CAPACIDAD = 50000
+
+# Lotes que se leen por vez al tomar unidades para una salida (casi siempre alcanza con el primero)
+LOTES_POR_LECTURA = 16
+
+# Columnas por las que se pueden ordenar las búsquedas de artículos
+ORDENES_ARTICULOS = ('id', 'nombre', 'cantidad', 'costo')
+
+def _fabrica_sesiones_escritura(engine):
+    """Sesiones para los métodos que escriben. Dentro del proceso entran de a una, en cola (el
+    reintento de busy_timeout no respeta el orden de llegada y un escritor podía agotar su espera
+    detrás de otros); entre procesos, BEGIN IMMEDIATE toma el bloqueo de SQLite al empezar."""
+    Session = sessionmaker(bind=engine.execution_options(escritura=True))
+    lock = threading.RLock()
+
+    @contextmanager
+    def sesion_escritura():
+        with lock, Session() as session:
+            yield session
+
+    return sesion_escritura
+
+
 # Clase para manejar la base de datos
 class DatabaseManager:
-    def __init__(self, db_name: str = 'inventario.db'):
-        self.engine = create_engine(f'sqlite:///{db_name}')
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+    def __init__(self, db_name: str = 'inventario.db', perfil: Optional[str] = None):
+        """Usa el engine del proceso para ``db_name``; el esquema, las migraciones y el perfil
+        de SQLite (ver PERFILES_SQLITE) se preparan solo la primera vez que se abre cada base."""
+        with _conexiones_lock:
+            if db_name not in _conexiones:
+                perfil = perfil or os.environ.get('GYESYS_PERFIL_DB', PERFIL_POR_DEFECTO)
+                if perfil not in PERFILES_SQLITE:
+                    raise ValueError(f"Perfil de base de datos desconocido: {perfil}")
+                self.engine = create_engine(
+                    f'sqlite:///{db_name}',
+                    poolclass=QueuePool,
+                    pool_size=POOL_SIZE,
+                    max_overflow=POOL_MAX_OVERFLOW,
+                    pool_timeout=POOL_TIMEOUT,
+                    connect_args={'check_same_thread': False},
+                )
+                _configurar_conexion(self.engine, PERFILES_SQLITE[perfil])
+                instrumentar_engine(self.engine)
+                Base.metadata.create_all(self.engine)
+                self.Session = sessionmaker(bind=self.engine)
+                self.SessionEscritura = _fabrica_sesiones_escritura(self.engine)
+                aplicar_migraciones(self)
+                _conexiones[db_name] = (self.engine, self.Session, self.SessionEscritura,
+                                        tiene_busqueda_texto(self.engine), CacheLRU(CACHE_CODIGOS_CAPACIDAD))
+            (self.engine, self.Session, self.SessionEscritura,
+             self.busqueda_texto, self.cache_codigos) = _conexiones[db_name]
 
     # Métodos CRUD para Artículos
 
     def crear_articulo(self, nombre: str, categoria: str, cantidad: int, costo: float, bar_code: str, fecha_hora: datetime.datetime = None) -> dict:
         """Crea un nuevo artículo en la base de datos y registra la entrada inicial."""
-        with self.Session() as session:
+        with self.SessionEscritura() as session:
             # Verificar si la categoría existe
             cat = session.query(Categoria).filter_by(nombre_categoria=categoria).first()
             if not cat:
@@ -95,16 +395,22 @@ class DatabaseManager:
 
             articulo = Articulo(
                 nombre=nombre,
-                categoria=categoria,
+                categoria_rel=cat,
                 cantidad=cantidad,
                 costo=costo,
-                bar_code=bar_code
+                bar_code=_codigo_barras(bar_code)
             )
             session.add(articulo)
-            session.flush()  # Flush para obtener el ID del artículo
+            try:
+                session.flush()  # Flush para obtener el ID del artículo
+            except IntegrityError as e:
+                session.rollback()
+                if not _codigo_repetido(e):
+                    raise
+                raise ValueError(f"Ya existe un artículo con el código de barras {bar_code}") from e
 
             # Registrar la entrada inicial
-            registro_fecha_hora = fecha_hora if fecha_hora else datetime.now(date_time) # Usar la fecha y hora proporcionada o la actual
+            registro_fecha_hora = fecha_hora if fecha_hora else datetime.datetime.now(date_time) # Usar la fecha y hora proporcionada o la actual
 
             registro = Registro(
                 articulo_id=articulo.id,
@@ -115,6 +421,7 @@ class DatabaseManager:
                 fecha_hora=registro_fecha_hora
             )
             session.add(registro)
+            self._aplicar_movimiento_a_saldo(session, registro)
 
             session.commit()
             return articulo.to_dict()
@@ -131,47 +438,76 @@ class DatabaseManager:
             return [articulo.to_dict() for articulo in articulos]
 
     def actualizar_articulo(self, articulo_id: int, nombre: str, categoria: str, cantidad: int, costo: float, bar_code: str) -> Optional[dict]:
-        """Actualiza un artículo en la base de datos."""
-        with self.Session() as session:
+        """Actualiza el nombre, la categoría y el código de barras de un artículo.
+
+        ``cantidad`` y ``costo`` se ignoran: salen del saldo materializado, que solo cambian los
+        movimientos, y el formulario de edición puede traerlos desactualizados.
+        """
+        with self.SessionEscritura() as session:
             try:
                 articulo = session.query(Articulo).filter_by(id=articulo_id).first()
                 if articulo:
+                    codigo_anterior = articulo.bar_code
                     articulo.nombre = nombre
-                    articulo.cantidad = cantidad
-                    articulo.costo = costo
-                    articulo.bar_code = bar_code
+                    articulo.bar_code = _codigo_barras(bar_code)
 
                     # Verificar y actualizar la categoría
                     cat = session.query(Categoria).filter_by(nombre_categoria=categoria).first()
                     if not cat:
                         cat = Categoria(nombre_categoria=categoria)
                         session.add(cat)
-                    articulo.categoria = categoria  # Asignar el nombre de la categoría
+                    articulo.categoria_rel = cat
 
                     session.commit()
+                    self.cache_codigos.invalidar(codigo_anterior)
                     session.refresh(articulo)
                     return articulo.to_dict()
                 return None  # Retorna None si el artículo no fue encontrado
+            except IntegrityError as e:
+                session.rollback()
+                if not _codigo_repetido(e):
+                    raise
+                raise ValueError(f"Ya existe un artículo con el código de barras {bar_code}") from e
             except Exception as e:
                 session.rollback()  # En caso de error, revierte la transacción
                 print(f"Error al actualizar el artículo con ID {articulo_id}: {e}")
                 return None
 
     def eliminar_articulo(self, articulo_id: int) -> bool:
-        """Elimina un artículo por su ID"""
-        with self.Session() as session:
-            articulo = session.query(Articulo).filter_by(id=articulo_id).first()
-            if articulo:
-                session.delete(articulo)
+        """Elimina un artículo por su ID, junto con sus registros y su saldo."""
+        return self.eliminar_articulos([articulo_id]) == 1
+
+    def eliminar_articulos(self, articulo_ids: Iterable[int], tamano_lote: int = 500) -> int:
+        """Elimina varios artículos con sus registros y saldos en una sola transacción.
+
+        Usa sentencias DELETE por lotes de ids en lugar de cargar los registros en la sesión,
+        así que borrar un artículo con cientos de miles de movimientos no recorre objetos.
+        Devuelve la cantidad de artículos eliminados.
+        """
+        eliminados = 0
+        codigos = []
+        with self.SessionEscritura() as session:
+            try:
+                for lote in _en_lotes(set(articulo_ids), tamano_lote):
+                    codigos.extend(session.scalars(
+                        select(Articulo.bar_code).where(Articulo.id.in_(lote), Articulo.bar_code.is_not(None))))
+                    session.execute(delete(Registro).where(Registro.articulo_id.in_(lote)))
+                    session.execute(delete(SaldoArticulo).where(SaldoArticulo.articulo_id.in_(lote)))
+                    session.execute(delete(Lote).where(Lote.articulo_id.in_(lote)))
+                    session.execute(delete(SaldoCierre).where(SaldoCierre.articulo_id.in_(lote)))
+                    eliminados += session.execute(delete(Articulo).where(Articulo.id.in_(lote))).rowcount
                 session.commit()
-                return True
-            return False
+            except Exception:
+                session.rollback()
+                raise
+        self.cache_codigos.invalidar(*codigos)
+        return eliminados
 
     # Métodos CRUD para Categorías
 
     def crear_categoria(self, nombre_categoria: str) -> Categoria:
         """Crea una nueva categoría"""
-        with self.Session() as session:
+        with self.SessionEscritura() as session:
             categoria = Categoria(nombre_categoria=nombre_categoria)
             session.add(categoria)
             session.commit()
@@ -188,27 +524,33 @@ class DatabaseManager:
             return session.query(Categoria).all()
 
     def actualizar_categoria(self, nombre_actual: str, nuevo_nombre: str) -> Optional[Categoria]:
-        """Actualiza el nombre de una categoría"""
-        with self.Session() as session:
-            categoria = session.query(Categoria).filter_by(nombre_categoria=nombre_actual).first()
-            if categoria:
-                # Actualizar también los artículos asociados
-                articulos = session.query(Articulo).filter_by(categoria=nombre_actual).all()
-                for articulo in articulos:
-                    articulo.categoria = nuevo_nombre
+        """Actualiza el nombre de una categoría.
 
-                categoria.nombre_categoria = nuevo_nombre
+        Los artículos guardan el id de la categoría, así que renombrarla es una sola sentencia
+        sin importar cuántos artículos tenga.
+        """
+        with self.SessionEscritura() as session:
+            try:
+                renombradas = session.execute(
+                    update(Categoria)
+                    .where(Categoria.nombre_categoria == nombre_actual)
+                    .values(nombre_categoria=nuevo_nombre)
+                ).rowcount
                 session.commit()
-                return categoria
+            except IntegrityError:
+                session.rollback()
+                raise ValueError(f"Ya existe la categoría {nuevo_nombre}")
+            if renombradas:
+                return session.query(Categoria).filter_by(nombre_categoria=nuevo_nombre).first()
             return None
 
     def eliminar_categoria(self, nombre_categoria: str) -> bool:
         """Elimina una categoría (solo si no tiene artículos asociados)"""
-        with self.Session() as session:
+        with self.SessionEscritura() as session:
             categoria = session.query(Categoria).filter_by(nombre_categoria=nombre_categoria).first()
             if categoria:
                 # Verificar si hay artículos asociados
-                articulos = session.query(Articulo).filter_by(categoria=nombre_categoria).count()
+                articulos = session.query(Articulo).filter_by(categoria_id=categoria.id).count()
                 if articulos > 0:
                     raise ValueError("No se puede eliminar la categoría porque tiene artículos asociados")
 
@@ -217,17 +559,607 @@ class DatabaseManager:
                 return True
             return False
 
+    def buscar_por_codigo_barras(self, bar_code: str) -> Optional[dict]:
+        """Devuelve el id y el nombre del artículo con ese código de barras, o None.
+
+        Usa el índice único de ``bar_code`` y guarda los códigos encontrados en una caché LRU
+        del proceso, que se invalida al editar o borrar el artículo.
+        """
+        bar_code = _codigo_barras(bar_code)
+        if bar_code is None:
+            return None
+        articulo = self.cache_codigos.obtener(bar_code)
+        if articulo is None:
+            with self.Session() as session:
+                fila = session.execute(
+                    select(Articulo.id, Articulo.nombre).where(Articulo.bar_code == bar_code).limit(1)
+                ).first()
+            if fila is None:
+                return None
+            articulo = {'id': fila.id, 'nombre': fila.nombre}
+            self.cache_codigos.guardar(bar_code, articulo)
+        return dict(articulo)
+
+    def resolver_codigos_barras(self, codigos: Iterable[str]) -> dict:
+        """Devuelve un diccionario código de barras -> id de artículo para los códigos existentes."""
+        codigos = set(codigos)
+        if not codigos:
+            return {}
+        with self.Session() as session:
+            return dict(session.execute(
+                select(Articulo.bar_code, Articulo.id).where(Articulo.bar_code.in_(codigos))).all())
+
+    def filtrar_articulos_existentes(self, ids: Iterable[int]) -> set:
+        """Devuelve el subconjunto de ``ids`` que corresponde a artículos existentes."""
+        ids = set(ids)
+        if not ids:
+            return set()
+        with self.Session() as session:
+            return set(session.scalars(select(Articulo.id).where(Articulo.id.in_(ids))))
+
     def obtener_articulos_por_categoria(self, nombre_categoria: str) -> List[dict]:
         """Obtiene todos los artículos de una categoría específica y los devuelve como diccionarios."""
         with self.Session() as session:
-            articulos = session.query(Articulo).filter_by(categoria=nombre_categoria).all()
+            articulos = session.query(Articulo).filter(Articulo.categoria_id == _id_categoria(nombre_categoria)).all()
             return [articulo.to_dict() for articulo in articulos]
 
-    # Métodos para la tabla Registro
+    def obtener_resumen_categorias(self) -> List[dict]:
+        """Resume cada categoría (también las vacías) con una sola consulta agrupada: cantidad de
+        artículos, existencias totales y valor del inventario según los saldos."""
+        consulta = (
+            select(
+                Categoria.nombre_categoria,
+                func.count(Articulo.id).label('articulos'),
+                func.coalesce(func.sum(SaldoArticulo.cantidad), 0).label('cantidad_total'),
+                func.coalesce(func.sum(SaldoArticulo.valor), 0.0).label('valor_total'),
+            )
+            .select_from(Categoria)
+            .outerjoin(Articulo, Articulo.categoria_id == Categoria.id)
+            .outerjoin(SaldoArticulo, SaldoArticulo.articulo_id == Articulo.id)
+            .group_by(Categoria.id)
+            .order_by(Categoria.nombre_categoria)
+        )
+        with self.Session() as session:
+            return [dict(fila._mapping) for fila in session.execute(consulta)]
+
+    @staticmethod
+    def _consulta_existencias():
+        """Consulta base de artículos unidos a su saldo, en el formato de las tablas de artículos."""
+        return select(
+            Articulo.id,
+            Articulo.nombre,
+            Categoria.nombre_categoria.label('categoria'),
+            Articulo.bar_code,
+            _CANTIDAD_SALDO.label('cantidad'),
+            _COSTO_SALDO.label('costo'),
+        ).outerjoin(SaldoArticulo, SaldoArticulo.articulo_id == Articulo.id).outerjoin(
+            Categoria, Categoria.id == Articulo.categoria_id)
+
+    @staticmethod
+    def _fila_existencia(fila) -> dict:
+        return {
+            'id': fila.id,
+            'nombre': fila.nombre,
+            'categoria': fila.categoria,
+            'cantidad': fila.cantidad,
+            'costo': fila.costo,
+            'bar_code': fila.bar_code,
+        }
+
+    def obtener_existencias_articulos(self, nombre_categoria: Optional[str] = None, limite: Optional[int] = None,
+                                      despues_de_id: Optional[int] = None,
+                                      articulo_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        """Obtiene todos los artículos (o los de una categoría, o los de ``articulo_ids``) con su
+        cantidad actual y su costo promedio ponderado, leídos de la tabla de saldos en una sola consulta.
+
+        Con ``limite`` devuelve una sola página ordenada por id; la siguiente página se pide con
+        ``despues_de_id`` igual al último id recibido (paginación por clave, sin OFFSET).
+        """
+        consulta = self._consulta_existencias().order_by(Articulo.id)
+
+        if articulo_ids is not None:
+            consulta = consulta.where(Articulo.id.in_(list(articulo_ids)))
+        if nombre_categoria is not None:
+            consulta = consulta.where(Articulo.categoria_id == _id_categoria(nombre_categoria))
+        if despues_de_id is not None:
+            consulta = consulta.where(Articulo.id > despues_de_id)
+        if limite is not None:
+            consulta = consulta.limit(limite)
+
+        with self.Session() as session:
+            return [self._fila_existencia(fila) for fila in session.execute(consulta)]
+
+    def obtener_existencia_articulo(self, articulo_id: int) -> Optional[dict]:
+        """Obtiene una sola fila de artículo con su saldo, para actualizar una tabla sin recargarla."""
+        consulta = self._consulta_existencias().where(Articulo.id == articulo_id)
+        with self.Session() as session:
+            fila = session.execute(consulta).first()
+        return self._fila_existencia(fila) if fila else None
+
+    def obtener_reporte_detallado(self, fecha_inicio: datetime.datetime, fecha_fin: datetime.datetime,
+                                  articulo_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        """Resume por artículo las entradas, salidas y el costo promedio de las entradas del período."""
+        return list(self.iterar_reporte_detallado(fecha_inicio, fecha_fin, articulo_ids))
+
+    def iterar_reporte_detallado(self, fecha_inicio: datetime.datetime, fecha_fin: datetime.datetime,
+                                 articulo_ids: Optional[Iterable[int]] = None,
+                                 nombre_categoria: Optional[str] = None,
+                                 tamano_lote: int = 500) -> Iterator[dict]:
+        """Genera el reporte detallado fila por fila, leyendo de la base en lotes de ``tamano_lote``.
+
+        Los registros del rango se agregan en una sola consulta que recorre el índice de fechas,
+        y luego se unen a todos los artículos (o a ``articulo_ids``) para conservar los que no
+        tuvieron movimientos.
+        """
+        entrada = Registro.entrada_salida.is_(True)
+        movimientos = select(
+            Registro.articulo_id,
+            func.sum(case((entrada, Registro.unidad), else_=0)).label('entradas'),
+            func.sum(case((entrada, 0), else_=Registro.unidad)).label('salidas'),
+            func.sum(case((entrada, Registro.unidad * Registro.costo), else_=0.0)).label('valor_entradas'),
+        ).where(
+            Registro.fecha_hora >= _sin_zona(fecha_inicio),
+            Registro.fecha_hora <= _sin_zona(fecha_fin),
+        ).group_by(Registro.articulo_id).subquery()
+
+        consulta = select(
+            Articulo.id,
+            Articulo.nombre,
+            Categoria.nombre_categoria.label('categoria'),
+            func.coalesce(movimientos.c.entradas, 0).label('entradas'),
+            func.coalesce(movimientos.c.salidas, 0).label('salidas'),
+            func.coalesce(movimientos.c.valor_entradas, 0.0).label('valor_entradas'),
+        ).outerjoin(movimientos, movimientos.c.articulo_id == Articulo.id).outerjoin(
+            Categoria, Categoria.id == Articulo.categoria_id).order_by(Articulo.id)
+        if articulo_ids is not None:
+            consulta = consulta.where(Articulo.id.in_(list(articulo_ids)))
+        if nombre_categoria is not None:
+            consulta = consulta.where(Articulo.categoria_id == _id_categoria(nombre_categoria))
+
+        with self.Session() as session:
+            for fila in session.execute(consulta.execution_options(yield_per=tamano_lote)):
+                costo_promedio = (fila.valor_entradas / fila.entradas) if fila.entradas > 0 else 0
+                porcentaje_salida = (fila.salidas / fila.entradas * 100) if fila.entradas > 0 else 0
+                yield {
+                    'articulo_id': fila.id,
+                    'nombre': fila.nombre,
+                    'categoria': fila.categoria,
+                    'entradas': fila.entradas,
+                    'salidas': fila.salidas,
+                    'porcentaje_salida': round(porcentaje_salida, 2),
+                    'costo_promedio': round(costo_promedio, 2)
+                }
+
+    def _filtro_texto(self, texto: str):
+        """Condición de búsqueda por nombre o código de barras: FTS5 por prefijo de palabras si
+        está disponible, si no LIKE sobre la tabla de artículos."""
+        terminos = re.findall(r'\w+', texto)
+        if self.busqueda_texto and terminos:
+            consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+            return Articulo.id.in_(
+                select(_articulos_fts.c.rowid).where(_articulos_fts.c.articulos_fts.op('MATCH')(consulta))
+            )
+        patron = '%' + re.sub(r'([\\%_])', r'\\\1', texto) + '%'
+        return or_(Articulo.nombre.like(patron, escape='\\'), Articulo.bar_code.like(patron, escape='\\'))
+
+    def _filtros_articulos(self, articulo_ids=None, nombre_categoria=None, texto=None,
+                           cantidad_minima=None, cantidad_maxima=None) -> list:
+        filtros = []
+        if articulo_ids is not None:
+            filtros.append(Articulo.id.in_(list(articulo_ids)))
+        if nombre_categoria is not None:
+            filtros.append(Articulo.categoria_id == _id_categoria(nombre_categoria))
+        if cantidad_minima is not None:
+            filtros.append(Articulo.cantidad >= cantidad_minima)
+        if cantidad_maxima is not None:
+            filtros.append(Articulo.cantidad <= cantidad_maxima)
+        if texto and texto.strip():
+            filtros.append(self._filtro_texto(texto.strip()))
+        return filtros
+
+    def buscar_articulos(self, texto: Optional[str] = None, nombre_categoria: Optional[str] = None,
+                         cantidad_minima: Optional[int] = None, cantidad_maxima: Optional[int] = None,
+                         orden: str = 'id', descendente: bool = False, limite: Optional[int] = None,
+                         despues_de: Optional[tuple] = None) -> List[dict]:
+        """Busca artículos filtrando y ordenando en SQL, en el formato de las tablas de artículos.
+
+        ``texto`` busca en nombre y código de barras; ``orden`` es una de ORDENES_ARTICULOS.
+        La página siguiente se pide con ``despues_de=(valor de la columna de orden, id)`` de la
+        última fila recibida. Las existencias y el costo salen de la tabla de saldos, igual que en
+        ``obtener_existencias_articulos``; el orden y los filtros de existencias usan su copia
+        indexada en ``articulos.cantidad``/``costo``, que se escribe en la misma transacción.
+        """
+        if orden not in ORDENES_ARTICULOS:
+            raise ValueError(f"Orden desconocido: {orden}")
+        columna = getattr(Articulo, orden)
+        consulta = self._consulta_existencias().where(
+            *self._filtros_articulos(None, nombre_categoria, texto, cantidad_minima, cantidad_maxima))
+
+        comparar = operator.lt if descendente else operator.gt
+        claves = [Articulo.id] if orden == 'id' else [columna, Articulo.id]
+        if despues_de is not None:
+            valor, ultimo_id = despues_de
+            if orden == 'id':
+                consulta = consulta.where(comparar(Articulo.id, ultimo_id))
+            else:
+                consulta = consulta.where(comparar(tuple_(columna, Articulo.id), tuple_(valor, ultimo_id)))
+        consulta = consulta.order_by(*(clave.desc() if descendente else clave for clave in claves))
+        if limite is not None:
+            consulta = consulta.limit(limite)
+
+        with self.Session() as session:
+            return [self._fila_existencia(fila) for fila in session.execute(consulta)]
+
+    def contar_articulos(self, articulo_ids: Optional[Iterable[int]] = None,
+                         nombre_categoria: Optional[str] = None, texto: Optional[str] = None,
+                         cantidad_minima: Optional[int] = None, cantidad_maxima: Optional[int] = None) -> int:
+        """Cuenta los artículos que cumplen los filtros (los mismos de ``buscar_articulos``)."""
+        consulta = select(func.count(Articulo.id)).where(
+            *self._filtros_articulos(articulo_ids, nombre_categoria, texto, cantidad_minima, cantidad_maxima)
+        )
+        with self.Session() as session:
+            return session.scalar(consulta)
+
+    # Métodos para los saldos materializados
+
+    def obtener_saldo(self, articulo_id: int) -> dict:
+        """Obtiene la cantidad, el valor y el costo promedio actuales de un artículo."""
+        with self.Session() as session:
+            saldo = session.get(SaldoArticulo, articulo_id)
+            if saldo:
+                return saldo.to_dict()
+            return {'articulo_id': articulo_id, 'cantidad': 0, 'valor': 0.0,
+                    'costo_promedio': 0.0, 'ultima_fecha': None}
+
+    def _consulta_saldos(self, articulo_id: Optional[int] = None):
+        """Consulta que recalcula los saldos desde el historial de registros con funciones de ventana."""
+        unidad_con_signo = case((Registro.entrada_salida, Registro.unidad), else_=-Registro.unidad)
+        valor_con_signo = unidad_con_signo * Registro.costo
+        # Los movimientos con la misma fecha se aplican en el orden en que se registraron
+        ventana = dict(partition_by=Registro.articulo_id, order_by=(Registro.fecha_hora, Registro.id), rows=(None, 0))
+
+        # Solo se consideran movimientos de artículos existentes
+        filtro = Registro.articulo_id.in_(select(Articulo.id))
+        if articulo_id is not None:
+            filtro = Registro.articulo_id == articulo_id
+        acumulados = select(
+            Registro.articulo_id,
+            Registro.fecha_hora,
+            Registro.id,
+            func.sum(unidad_con_signo).over(**ventana).label('cantidad'),
+            func.sum(valor_con_signo).over(**ventana).label('valor'),
+        ).where(filtro).subquery()
+
+        # Posición de cada movimiento contando desde el último, entre todos y entre los que dejaron
+        # existencias distintas de cero: el costo promedio vigente es el del último de estos
+        con_existencias = acumulados.c.cantidad != 0
+        del_ultimo_al_primero = (acumulados.c.fecha_hora.desc(), acumulados.c.id.desc())
+        ordenados = select(
+            acumulados,
+            func.row_number().over(
+                partition_by=acumulados.c.articulo_id, order_by=del_ultimo_al_primero,
+            ).label('posicion'),
+            func.row_number().over(
+                partition_by=(acumulados.c.articulo_id, con_existencias), order_by=del_ultimo_al_primero,
+            ).label('posicion_con_existencias'),
+        ).subquery()
+
+        # Un solo recorrido agrupado, sin uniones entre subconsultas (que SQLite resolvería
+        # comparando cada artículo con todos los demás)
+        ultimo = ordenados.c.posicion == 1
+        ultimo_con_existencias = and_(ordenados.c.cantidad != 0, ordenados.c.posicion_con_existencias == 1)
+        return select(
+            ordenados.c.articulo_id,
+            func.max(case((ultimo, ordenados.c.cantidad))).label('cantidad'),
+            func.coalesce(func.max(case((ultimo, ordenados.c.valor))), 0.0).label('valor'),
+            func.coalesce(
+                func.max(case((ultimo_con_existencias, cast(ordenados.c.valor, Float) / ordenados.c.cantidad))),
+                0.0,
+            ).label('costo_promedio'),
+            func.max(ordenados.c.fecha_hora).label('ultima_fecha'),
+        ).group_by(ordenados.c.articulo_id)
+
+    def _recalcular_saldo(self, session, articulo_id: int):
+        """Recalcula desde el historial el saldo de un artículo dentro de la transacción actual."""
+        session.flush()
+        fila = session.execute(self._consulta_saldos(articulo_id)).first()
+        saldo = session.get(SaldoArticulo, articulo_id)
+        if fila is None:
+            if saldo:
+                session.delete(saldo)
+            session.query(Articulo).filter_by(id=articulo_id).update({'cantidad': 0, 'costo': 0.0})
+        else:
+            if saldo is None:
+                saldo = SaldoArticulo(articulo_id=articulo_id)
+                session.add(saldo)
+            saldo.cantidad = fila.cantidad
+            saldo.valor = fila.valor
+            saldo.costo_promedio = fila.costo_promedio
+            saldo.ultima_fecha = fila.ultima_fecha
+            session.query(Articulo).filter_by(id=articulo_id).update(
+                {'cantidad': saldo.cantidad, 'costo': saldo.costo_promedio})
+        # También sin historial: borra los lotes que quedaran de los registros eliminados
+        self._recalcular_lotes(session, [articulo_id])
+
+    def _aplicar_movimiento_a_saldo(self, session, registro: Registro):
+        """Actualiza el saldo del artículo con un nuevo movimiento dentro de la transacción actual,
+        y sus lotes si se costea por PEPS o UEPS."""
+        articulo_id = registro.articulo_id
+        saldo = session.get(SaldoArticulo, articulo_id)
+        if saldo is None:
+            saldo = SaldoArticulo(articulo_id=articulo_id, cantidad=0, valor=0.0, costo_promedio=0.0)
+            session.add(saldo)
+        datos = saldo.to_dict()
+        if not _acumular_movimientos(datos, [registro.to_dict()]):
+            self._recalcular_saldo(session, articulo_id)
+            return
+
+        saldo.cantidad = datos['cantidad']
+        saldo.valor = datos['valor']
+        saldo.costo_promedio = datos['costo_promedio']
+        saldo.ultima_fecha = datos['ultima_fecha']
+        # El método de costeo sale de la misma sentencia, sin otra consulta
+        metodo = session.execute(
+            update(Articulo).where(Articulo.id == articulo_id)
+            .values(cantidad=saldo.cantidad, costo=saldo.costo_promedio)
+            .returning(Articulo.metodo_costo)
+        ).scalar()
+        if metodo in METODOS_LOTES:
+            self._aplicar_movimiento_a_lotes(session, registro, metodo)
+
+    def rebuild_balances(self, lotes: bool = True) -> int:
+        """Reconstruye todos los saldos, y los lotes si ``lotes``, a partir del historial de registros.
+
+        Sirve como verificación de consistencia: descarta la tabla de saldos y la vuelve a
+        calcular en una sola transacción. Devuelve la cantidad de artículos con saldo.
+        """
+        consulta = self._consulta_saldos().subquery()
+        with self.SessionEscritura() as session:
+            session.execute(delete(SaldoArticulo))
+            resultado = session.execute(
+                insert(SaldoArticulo).from_select(
+                    ['articulo_id', 'cantidad', 'valor', 'costo_promedio', 'ultima_fecha'],
+                    select(consulta.c.articulo_id, consulta.c.cantidad, consulta.c.valor,
+                           consulta.c.costo_promedio, consulta.c.ultima_fecha),
+                )
+            )
+            # Sincroniza las columnas de Articulo, que antes quedaban desactualizadas
+            saldo = select(SaldoArticulo).where(SaldoArticulo.articulo_id == Articulo.id)
+            session.execute(
+                update(Articulo).values(
+                    cantidad=func.coalesce(saldo.with_only_columns(SaldoArticulo.cantidad).scalar_subquery(), 0),
+                    costo=func.coalesce(saldo.with_only_columns(SaldoArticulo.costo_promedio).scalar_subquery(), 0.0),
+                ).execution_options(synchronize_session=False)
+            )
+            if lotes:
+                self._recalcular_lotes(session)
+            session.commit()
+            return resultado.rowcount
+
+    # Métodos para los lotes de costeo PEPS/UEPS
+
+    def _tomar_lotes(self, session, articulo_id: int, metodo: str, unidad: int):
+        """Lee los lotes abiertos del artículo en el orden en que ``metodo`` los consume, solo hasta
+        cubrir ``unidad`` unidades; devuelve lo mismo que valoracion.tomar_de_lotes."""
+        resultado = session.execute(
+            select(Lote.registro_id, Lote.fecha_hora, Lote.restante, Lote.costo)
+            .where(Lote.articulo_id == articulo_id)
+            .order_by(*_orden_consumo(metodo))
+            .execution_options(yield_per=LOTES_POR_LECTURA)
+        )
+        try:
+            return tomar_de_lotes((list(fila) for fila in resultado), unidad)
+        finally:
+            resultado.close()
+
+    def _costo_salida(self, session, articulo_id: int, metodo: Optional[str], unidad: int) -> float:
+        saldo = session.get(SaldoArticulo, articulo_id)
+        costo_promedio = saldo.costo_promedio if saldo else 0.0
+        if metodo not in METODOS_LOTES:
+            return costo_promedio
+        # Las unidades sin lote que las cubra salen al costo promedio vigente
+        return costo_unitario_salida(*self._tomar_lotes(session, articulo_id, metodo, unidad), costo_promedio)
+
+    def _aplicar_movimiento_a_lotes(self, session, registro: Registro, metodo: str):
+        """Sigue la cola de lotes con un movimiento posterior a los demás del artículo: una entrada
+        abre un lote y una salida borra los que agota y descuenta del último que toca."""
+        if registro.entrada_salida:
+            if registro.unidad > 0:
+                session.flush()  # Asigna el id del registro, que identifica al lote
+                session.add(Lote(registro_id=registro.id, articulo_id=registro.articulo_id,
+                                 fecha_hora=_sin_zona(registro.fecha_hora), restante=registro.unidad,
+                                 costo=registro.costo))
+            return
+        tomados, _ = self._tomar_lotes(session, registro.articulo_id, metodo, registro.unidad)
+        agotados = [lote[0] for lote, tomadas in tomados if tomadas == lote[2]]
+        if agotados:
+            session.execute(delete(Lote).where(Lote.registro_id.in_(agotados)))
+        for lote, tomadas in tomados:
+            if tomadas < lote[2]:
+                session.execute(update(Lote).where(Lote.registro_id == lote[0]).values(restante=lote[2] - tomadas))
+
+    def _recalcular_lotes(self, session, articulo_ids: Optional[Iterable[int]] = None, tamano_lote: int = 500):
+        """Reconstruye desde el historial, dentro de la transacción actual, los lotes abiertos de
+        ``articulo_ids`` (o de todos los artículos) costeados por PEPS o UEPS.
+
+        Recorre todos sus movimientos, así que se usa solo cuando la cola no se puede seguir:
+        movimientos con fecha anterior, registros borrados, cambios de método y cargas masivas.
+        """
+        session.flush()
+        if articulo_ids is None:
+            session.execute(delete(Lote))
+            lotes_ids = [None]
+        else:
+            lotes_ids = list(_en_lotes(set(articulo_ids), tamano_lote))
+        for ids in lotes_ids:
+            consulta = select(Articulo.id, Articulo.metodo_costo).where(Articulo.metodo_costo.in_(METODOS_LOTES))
+            if ids is not None:
+                session.execute(delete(Lote).where(Lote.articulo_id.in_(ids)))
+                consulta = consulta.where(Articulo.id.in_(ids))
+            metodos = dict(session.execute(consulta).all())
+            if not metodos:
+                continue
+            movimientos = session.execute(
+                select(Registro.articulo_id, Registro.id, Registro.fecha_hora, Registro.entrada_salida,
+                       Registro.unidad, Registro.costo)
+                .where(Registro.articulo_id.in_(list(metodos)))
+                .order_by(Registro.articulo_id, Registro.fecha_hora, Registro.id)
+            )
+            nuevos = []
+            for articulo_id, filas in groupby(movimientos, key=operator.itemgetter(0)):
+                cola = ColaLotes.desde_movimientos(metodos[articulo_id], (fila[1:] for fila in filas))
+                nuevos.extend(
+                    {'registro_id': registro_id, 'articulo_id': articulo_id, 'fecha_hora': _sin_zona(fecha_hora),
+                     'restante': restante, 'costo': costo}
+                    for registro_id, fecha_hora, restante, costo in cola.lotes
+                )
+            if nuevos:
+                session.execute(insert(Lote), nuevos)
+
+    def costo_salida(self, articulo_id: int, unidad: int = 1) -> float:
+        """Costo unitario que tendría ahora una salida de ``unidad`` unidades según el método de
+        costeo del artículo: el promedio vigente o el de los lotes que consumiría."""
+        with self.Session() as session:
+            metodo = session.scalar(select(Articulo.metodo_costo).where(Articulo.id == articulo_id))
+            return self._costo_salida(session, articulo_id, metodo, unidad)
 
-    def registrar_movimiento(self, articulo_id: int, descripcion: str, entrada: bool, unidad: int, costo: float, fecha_hora: datetime.datetime = None):
-        """Registra un movimiento de inventario para un artículo."""
+    def establecer_metodo_costo(self, articulo_id: int, metodo: str) -> bool:
+        """Cambia el método de costeo de un artículo y reconstruye sus lotes con el nuevo método.
+        Devuelve False si el artículo no existe."""
+        if metodo not in METODOS_COSTO:
+            raise ValueError(f"Método de costeo desconocido: {metodo}")
+        with self.SessionEscritura() as session:
+            actualizados = session.execute(
+                update(Articulo).where(Articulo.id == articulo_id).values(metodo_costo=metodo)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not actualizados:
+                return False
+            self._recalcular_lotes(session, [articulo_id])
+            session.commit()
+            return True
+
+    def obtener_lotes(self, articulo_id: int) -> List[dict]:
+        """Lotes abiertos de un artículo, del más antiguo al más reciente."""
         with self.Session() as session:
+            lotes = session.scalars(
+                select(Lote).where(Lote.articulo_id == articulo_id).order_by(*_orden_consumo('fifo'))).all()
+            return [lote.to_dict() for lote in lotes]
+
+    # Métodos para los cierres periódicos (ver cierres.py)
+
+    @staticmethod
+    def _fecha_ultimo_cierre(hasta: Optional[datetime.datetime]):
+        """Subconsulta correlacionada con Articulo: fecha de su último cierre igual o anterior a
+        ``hasta`` (o el último, si es None)."""
+        consulta = select(func.max(SaldoCierre.fecha)).where(SaldoCierre.articulo_id == Articulo.id)
+        if hasta is not None:
+            consulta = consulta.where(SaldoCierre.fecha <= hasta)
+        return consulta.correlate(Articulo).scalar_subquery()
+
+    def _inicio_desde_cierre(self, hasta: Optional[datetime.datetime], articulo_ids: Optional[Iterable[int]]):
+        """CTE con la fecha del último cierre igual o anterior a ``hasta`` de cada artículo (o de
+        ``articulo_ids``), o la fecha mínima si no tiene. MATERIALIZED: así las consultas recorren
+        los artículos y buscan por índice en ``saldos_cierre`` y ``registros``; si no, SQLite
+        recorre esas tablas completas y evalúa la subconsulta en cada fila."""
+        consulta = select(
+            Articulo.id.label('articulo_id'),
+            func.coalesce(self._fecha_ultimo_cierre(hasta), literal(datetime.datetime.min, DateTime)).label('desde'),
+        )
+        if articulo_ids is not None:
+            consulta = consulta.where(Articulo.id.in_(list(articulo_ids)))
+        return consulta.cte('inicio').prefix_with('MATERIALIZED')
+
+    def _estados_en_cierre(self, session, hasta: Optional[datetime.datetime],
+                           articulo_ids: Optional[Iterable[int]] = None) -> dict:
+        """Estado ``(cantidad, valor, costo promedio)`` de cada artículo en su último cierre igual o
+        anterior a ``hasta``; los artículos sin cierre no aparecen."""
+        inicio = self._inicio_desde_cierre(hasta, articulo_ids)
+        consulta = select(SaldoCierre.articulo_id, SaldoCierre.cantidad, SaldoCierre.valor,
+                          SaldoCierre.costo_promedio).select_from(inicio).join(
+            SaldoCierre, and_(SaldoCierre.articulo_id == inicio.c.articulo_id, SaldoCierre.fecha == inicio.c.desde))
+        return {articulo_id: (cantidad, valor, costo_promedio)
+                for articulo_id, cantidad, valor, costo_promedio in session.execute(consulta)}
+
+    def _movimientos_desde_cierre(self, hasta: Optional[datetime.datetime], articulo_ids: Optional[Iterable[int]],
+                                  *columnas):
+        """Consulta de ``columnas`` de los movimientos de cada artículo posteriores a su último
+        cierre y hasta ``hasta`` (o todos), ordenados por artículo, fecha e id: por cada artículo
+        lee solo el tramo de ix_registros_articulo_fecha que sigue a su cierre."""
+        inicio = self._inicio_desde_cierre(hasta, articulo_ids)
+        condicion = and_(Registro.articulo_id == inicio.c.articulo_id, Registro.fecha_hora > inicio.c.desde)
+        if hasta is not None:
+            condicion = and_(condicion, Registro.fecha_hora <= hasta)
+        return select(*columnas).select_from(inicio).join(Registro, condicion).order_by(
+            Registro.articulo_id, Registro.fecha_hora, Registro.id)
+
+    def crear_cierres(self, periodo: str, hasta: Optional[datetime.datetime] = None) -> int:
+        """Guarda los cierres de ``periodo`` que faltan, hasta el último período terminado antes de
+        ``hasta`` (por defecto, ahora).
+
+        Por cada artículo lee solo los movimientos posteriores a su último cierre y guarda su
+        estado al final de cada período en que tuvo alguno, en una sola transacción. Devuelve la
+        cantidad de saldos de cierre guardados.
+        """
+        limite = ultimo_cierre(_sin_zona(hasta or datetime.datetime.now(date_time)), periodo)
+        consulta = self._movimientos_desde_cierre(
+            limite, None, Registro.articulo_id, Registro.fecha_hora, Registro.entrada_salida,
+            Registro.unidad, Registro.costo)
+        with self.SessionEscritura() as session:
+            estados = self._estados_en_cierre(session, limite)
+            nuevos = []
+            anterior = fin = None
+            estado = ESTADO_INICIAL
+            for articulo_id, fecha_hora, entrada, unidad, costo in session.execute(consulta):
+                if articulo_id != anterior or fecha_hora > fin:
+                    # Terminó el período (o el artículo) anterior: su estado es el del cierre
+                    if anterior is not None:
+                        nuevos.append((anterior, fin, *estado))
+                    if articulo_id != anterior:
+                        anterior = articulo_id
+                        estado = estados.get(articulo_id, ESTADO_INICIAL)
+                    fin = fin_de_periodo(fecha_hora, periodo)
+                estado = acumular(estado, entrada, unidad, costo)
+            if anterior is not None:
+                nuevos.append((anterior, fin, *estado))
+            claves = ('articulo_id', 'fecha', 'cantidad', 'valor', 'costo_promedio')
+            for lote in _en_lotes(nuevos, 1000):
+                session.execute(insert(SaldoCierre), [dict(zip(claves, fila)) for fila in lote])
+            session.commit()
+        return len(nuevos)
+
+    def obtener_estado_al(self, hasta: Optional[datetime.datetime],
+                          articulo_ids: Optional[Iterable[int]] = None) -> dict:
+        """Cantidad, valor y costo promedio de cada artículo (o de ``articulo_ids``) al momento
+        ``hasta`` (o después de todos sus movimientos): su último cierre anterior más los
+        movimientos desde ese cierre, valorados con valoracion.py. Los artículos sin movimientos
+        hasta esa fecha no aparecen."""
+        hasta = _sin_zona(hasta)
+        if articulo_ids is not None:
+            articulo_ids = list(articulo_ids)
+        consulta = self._movimientos_desde_cierre(
+            hasta, articulo_ids, Registro.articulo_id, Registro.entrada_salida, Registro.unidad, Registro.costo)
+        with self.Session() as session:
+            iniciales = self._estados_en_cierre(session, hasta, articulo_ids)
+            columnas = ColumnasMovimientos.desde_filas(session.execute(consulta).tuples())
+        estados = {articulo_id: dict(zip(('cantidad', 'valor', 'costo_promedio'), estado))
+                   for articulo_id, estado in iniciales.items()}
+        estados.update(valorar(columnas, iniciales=iniciales).saldos())
+        return estados
+
+    # Métodos para la tabla Registro
+
+    def registrar_movimiento(self, articulo_id: int, descripcion: str, entrada: bool, unidad: int, costo: Optional[float], fecha_hora: datetime.datetime = None) -> dict:
+        """Registra un movimiento de inventario para un artículo y lo devuelve como diccionario.
+
+        Sin ``costo``, una salida toma el de su método de costeo (ver costo_salida) y una entrada
+        el costo promedio vigente.
+        """
+        with self.SessionEscritura() as session:
+            if costo is None:
+                metodo = None if entrada else session.scalar(
+                    select(Articulo.metodo_costo).where(Articulo.id == articulo_id))
+                costo = self._costo_salida(session, articulo_id, metodo, unidad)
             registro = Registro(
                 articulo_id=articulo_id,
                 descripcion=descripcion,
@@ -237,37 +1169,269 @@ class DatabaseManager:
                 fecha_hora=fecha_hora if fecha_hora else datetime.datetime.now(date_time)
             )
             session.add(registro)
+            self._aplicar_movimiento_a_saldo(session, registro)
+            session.flush()
+            # Antes del commit, que expira el objeto y obligaría a releerlo; la fecha queda como
+            # la devuelve SQLite, sin zona horaria
+            datos = dict(registro.to_dict(), fecha_hora=_sin_zona(registro.fecha_hora))
             session.commit()
+            return datos
+
+    def registrar_movimientos_bulk(self, movimientos: Iterable[dict], tamano_lote: int = 1000) -> int:
+        """Registra muchos movimientos en una sola transacción.
+
+        ``movimientos`` puede ser cualquier iterable (por ejemplo un generador) de diccionarios con
+        las claves ``articulo_id``, ``descripcion``, ``entrada``, ``unidad``, ``costo`` y
+        opcionalmente ``fecha_hora``. Un ``costo`` None se resuelve como en ``registrar_movimiento``,
+        igual que si los movimientos se registraran de a uno en el orden recibido. Se procesan en lotes de ``tamano_lote``: cada lote valida sus
+        artículos con una sola consulta, se inserta con executemany y actualiza los saldos, así
+        que la memoria usada depende del tamaño del lote y no del total de movimientos. Los lotes
+        de los artículos costeados por PEPS o UEPS se reconstruyen al final desde su historial.
+        Si un artículo no existe se lanza ValueError y no se guarda ningún movimiento.
+        Devuelve la cantidad de movimientos registrados.
+        """
+        total = 0
+        afectados = set()
+        estados = {}  # Saldo y lotes de los artículos con costos por resolver (ver _resolver_costos)
+        with self.SessionEscritura() as session:
+            try:
+                for lote in _en_lotes(movimientos, tamano_lote):
+                    ahora = datetime.datetime.now(date_time)
+                    filas = [
+                        {
+                            'articulo_id': m['articulo_id'],
+                            'descripcion': m.get('descripcion'),
+                            'entrada_salida': bool(m['entrada']),
+                            'unidad': m['unidad'],
+                            'costo': m.get('costo'),
+                            'fecha_hora': m.get('fecha_hora') or ahora,
+                        }
+                        for m in lote
+                    ]
+                    ids = {fila['articulo_id'] for fila in filas}
+                    existentes = set(session.scalars(select(Articulo.id).where(Articulo.id.in_(ids))))
+                    if ids - existentes:
+                        raise ValueError(f"Artículos inexistentes: {sorted(ids - existentes, key=str)}")
+
+                    self._resolver_costos(session, filas, estados, afectados)
+                    self._insertar_lote_movimientos(session, filas)
+                    afectados |= ids
+                    total += len(filas)
 
-    def obtener_registros_por_articulo(self, articulo_id: int) -> List[dict]:
-        """Obtiene todos los registros de movimiento para un artículo específico como diccionarios."""
+                # Los lotes de los artículos con PEPS o UEPS se reconstruyen una sola vez, al final
+                self._recalcular_lotes(session, afectados)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        return total
+
+    def _resolver_costos(self, session, filas: List[dict], estados: dict, afectados: set):
+        """Completa el costo de las filas que no lo traen con el de ``_costo_salida``: el promedio
+        vigente para las entradas y el del método de costeo del artículo para las salidas.
+
+        Los saldos y los lotes de la base no incluyen aún las filas anteriores de la carga (los lotes
+        se reconstruyen al final), así que ``estados`` sigue en memoria, desde la primera fila que
+        necesitó un costo, el saldo y la cola de lotes de cada artículo con todas sus filas.
+        """
+        nuevos = {fila['articulo_id'] for fila in filas if fila['costo'] is None} - estados.keys()
+        if nuevos:
+            # Lotes al día con los movimientos de lotes anteriores de esta carga
+            self._recalcular_lotes(session, nuevos & afectados)
+            tabla_saldos = SaldoArticulo.__table__
+            saldos = {
+                fila['articulo_id']: fila for fila in session.execute(
+                    select(tabla_saldos.c.articulo_id, tabla_saldos.c.cantidad, tabla_saldos.c.valor,
+                           tabla_saldos.c.costo_promedio)
+                    .where(tabla_saldos.c.articulo_id.in_(nuevos))
+                ).mappings()
+            }
+            metodos = dict(session.execute(
+                select(Articulo.id, Articulo.metodo_costo).where(Articulo.id.in_(nuevos))).all())
+            colas = {articulo_id: ColaLotes(metodo) for articulo_id, metodo in metodos.items()
+                     if metodo in METODOS_LOTES}
+            if colas:
+                lotes = session.execute(
+                    select(Lote.articulo_id, Lote.registro_id, Lote.fecha_hora, Lote.restante, Lote.costo)
+                    .where(Lote.articulo_id.in_(list(colas)))
+                    .order_by(Lote.articulo_id, *_orden_consumo('fifo'))
+                )
+                for articulo_id, registro_id, fecha_hora, restante, costo in lotes:
+                    colas[articulo_id].entrar(registro_id, fecha_hora, restante, costo)
+            for articulo_id in nuevos:
+                saldo = saldos.get(articulo_id, {'cantidad': 0, 'valor': 0.0, 'costo_promedio': 0.0})
+                estados[articulo_id] = (dict(saldo), colas.get(articulo_id))
+
+        for fila in filas:
+            estado = estados.get(fila['articulo_id'])
+            if estado is None:
+                continue
+            saldo, cola = estado
+            if fila['entrada_salida']:
+                if fila['costo'] is None:
+                    fila['costo'] = saldo['costo_promedio']
+                if cola is not None:
+                    cola.entrar(None, fila['fecha_hora'], fila['unidad'], fila['costo'])
+            else:
+                # Como en _aplicar_movimiento_a_lotes, la salida consume lotes aunque traiga costo
+                costo = cola.salir(fila['unidad'], saldo['costo_promedio']) if cola else saldo['costo_promedio']
+                if fila['costo'] is None:
+                    fila['costo'] = costo
+            _sumar_movimiento(saldo, fila)
+
+    def crear_articulos_bulk(self, articulos: Iterable[dict], tamano_lote: int = 1000) -> int:
+        """Crea muchos artículos, con su entrada inicial, en una sola transacción.
+
+        ``articulos`` es un iterable de diccionarios con las claves de ``crear_articulo``
+        (``nombre``, ``categoria``, ``cantidad``, ``costo``, ``bar_code`` y opcionalmente
+        ``fecha_hora``). Las categorías que no existan se crean. Devuelve la cantidad creada.
+        """
+        total = 0
+        categorias = {}  # nombre -> id de las categorías ya resueltas en esta transacción
+        with self.SessionEscritura() as session:
+            try:
+                for lote in _en_lotes(articulos, tamano_lote):
+                    nuevas = {a['categoria'] for a in lote} - categorias.keys()
+                    if nuevas:
+                        categorias.update(session.execute(
+                            select(Categoria.nombre_categoria, Categoria.id)
+                            .where(Categoria.nombre_categoria.in_(nuevas))).all())
+                        faltantes = nuevas - categorias.keys()
+                        if faltantes:
+                            categorias.update(session.execute(
+                                insert(Categoria).returning(Categoria.nombre_categoria, Categoria.id),
+                                [{'nombre_categoria': c} for c in faltantes]).all())
+
+                    ids = session.scalars(
+                        insert(Articulo).returning(Articulo.id, sort_by_parameter_order=True),
+                        [
+                            {
+                                'nombre': a['nombre'],
+                                'categoria_id': categorias[a['categoria']],
+                                'cantidad': a['cantidad'],
+                                'costo': a['costo'],
+                                'bar_code': _codigo_barras(a.get('bar_code')),
+                            }
+                            for a in lote
+                        ],
+                    ).all()
+
+                    ahora = datetime.datetime.now(date_time)
+                    filas = [
+                        {
+                            'articulo_id': articulo_id,
+                            'descripcion': "Creación inicial del artículo",
+                            'entrada_salida': True,
+                            'unidad': a['cantidad'],
+                            'costo': a['costo'],
+                            'fecha_hora': a.get('fecha_hora') or ahora,
+                        }
+                        for articulo_id, a in zip(ids, lote)
+                    ]
+                    self._insertar_lote_movimientos(session, filas)
+                    total += len(filas)
+
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        return total
+
+    def _insertar_lote_movimientos(self, session, filas: List[dict]):
+        """Inserta un lote de registros y actualiza los saldos y artículos afectados.
+
+        Todo se escribe con executemany sin crear objetos del ORM, así que la memoria usada
+        depende del tamaño del lote y no de la cantidad de lotes de la transacción.
+        """
+        session.execute(insert(Registro), filas)
+
+        por_articulo = {}
+        for fila in filas:
+            por_articulo.setdefault(fila['articulo_id'], []).append(fila)
+        tabla_saldos = SaldoArticulo.__table__
+        saldos = {
+            fila['articulo_id']: dict(fila) for fila in session.execute(
+                select(tabla_saldos).where(tabla_saldos.c.articulo_id.in_(por_articulo.keys()))
+            ).mappings()
+        }
+
+        recalcular = []
+        for articulo_id, movimientos_articulo in por_articulo.items():
+            datos = saldos.setdefault(articulo_id, {'articulo_id': articulo_id, 'cantidad': 0, 'valor': 0.0,
+                                                    'costo_promedio': 0.0, 'ultima_fecha': None})
+            if not _acumular_movimientos(datos, movimientos_articulo):
+                recalcular.append(articulo_id)
+                del saldos[articulo_id]
+
+        if saldos:
+            upsert = sqlite_insert(tabla_saldos)
+            session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[tabla_saldos.c.articulo_id],
+                    set_={columna: upsert.excluded[columna]
+                          for columna in ('cantidad', 'valor', 'costo_promedio', 'ultima_fecha')},
+                ),
+                list(saldos.values()),
+            )
+            tabla_articulos = Articulo.__table__
+            session.execute(
+                update(tabla_articulos)
+                .where(tabla_articulos.c.id == bindparam('b_id'))
+                .values(cantidad=bindparam('b_cantidad'), costo=bindparam('b_costo')),
+                [{'b_id': d['articulo_id'], 'b_cantidad': d['cantidad'], 'b_costo': d['costo_promedio']}
+                 for d in saldos.values()],
+            )
+        for articulo_id in recalcular:
+            self._recalcular_saldo(session, articulo_id)
+
+    def obtener_registros_por_articulo(self, articulo_id: int,
+                                       desde: Optional[datetime.datetime] = None) -> List[dict]:
+        """Obtiene los registros de movimiento de un artículo como diccionarios: todos, o los
+        posteriores a ``desde``."""
         with self.Session() as session:
-            registros = session.query(Registro).filter_by(articulo_id=articulo_id).all()
+            consulta = session.query(Registro).filter_by(articulo_id=articulo_id)
+            if desde is not None:
+                consulta = consulta.filter(Registro.fecha_hora > _sin_zona(desde))
+            registros = consulta.order_by(Registro.fecha_hora, Registro.id).all()
         return [registro.to_dict() for registro in registros]
 
-    def obtener_registro(self, registro_id: datetime.datetime) -> Optional[Registro]:
-        """Obtiene un registro de movimiento por su fecha y hora."""
+    def obtener_columnas_movimientos(self, articulo_ids: Optional[Iterable[int]] = None,
+                                     hasta: Optional[datetime.datetime] = None) -> ColumnasMovimientos:
+        """Carga en columnas los movimientos de ``articulo_ids`` (o de todos los artículos) hasta
+        la fecha ``hasta``, ordenados por artículo, fecha e id, para valorarlos con valoracion.py."""
+        consulta = select(Registro.articulo_id, Registro.entrada_salida, Registro.unidad, Registro.costo).where(
+            Registro.articulo_id.in_(select(Articulo.id))).order_by(
+            Registro.articulo_id, Registro.fecha_hora, Registro.id)
+        if articulo_ids is not None:
+            consulta = consulta.where(Registro.articulo_id.in_(list(articulo_ids)))
+        if hasta is not None:
+            consulta = consulta.where(Registro.fecha_hora <= _sin_zona(hasta))
         with self.Session() as session:
-            return session.query(Registro).filter_by(fecha_hora=registro_id).first()
+            return ColumnasMovimientos.desde_filas(session.execute(consulta).tuples())
 
-    def eliminar_registro(self, registro_fecha_hora: datetime.datetime) -> bool:
-        """Elimina un registro por su fecha y hora."""
+    def obtener_registro(self, registro_id: int) -> Optional[Registro]:
+        """Obtiene un registro de movimiento por su ID."""
         with self.Session() as session:
-            registro = session.query(Registro).filter_by(fecha_hora=registro_fecha_hora).first()
+            return session.get(Registro, registro_id)
+
+    def eliminar_registro(self, registro_id: int) -> bool:
+        """Elimina un registro por su ID."""
+        with self.SessionEscritura() as session:
+            registro = session.get(Registro, registro_id)
             if registro:
+                articulo_id = registro.articulo_id
                 session.delete(registro)
+                self._recalcular_saldo(session, articulo_id)
                 session.commit()
                 return True
             return False
         
     def eliminar_todo_registro(self, articulo_id: int) -> bool:
         """Elimina todos los registros asociados a un artículo específico."""
-        with self.Session() as session:
-            registros = session.query(Registro).filter_by(
-                articulo_id=articulo_id).all()
-            if registros:
-                for registro in registros:
-                    session.delete(registro)
+        with self.SessionEscritura() as session:
+            eliminados = session.execute(delete(Registro).where(Registro.articulo_id == articulo_id)).rowcount
+            if eliminados:
+                self._recalcular_saldo(session, articulo_id)
                 session.commit()
                 return True
             return False
@@ -275,7 +1439,7 @@ class DatabaseManager:
     def obtener_registros_por_categoria(self, category_nombre: str) -> List[Articulo]:
         """Obtiene todos los registros de artículos que pertenecen a la categoría especificada por nombre."""
         with self.Session() as session:
-            return session.query(Articulo).filter(Articulo.categoria == category_nombre).all()
+            return session.query(Articulo).filter(Articulo.categoria_id == _id_categoria(category_nombre)).all()
 
     def obtener_categorias(self) -> List[Categoria]:
         """Obtiene todas las categorías."""
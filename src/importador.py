@@ -0,0 +1,245 @@
+"""Importación de artículos y movimientos desde archivos CSV.
+
+Cada importación es una cadena de generadores (leer -> validar -> resolver -> insertar por
+lotes), así que la memoria usada no depende del tamaño del archivo. Acepta archivos separados
+por coma o por punto y coma (como los que exporta Excel) y con o sin BOM.
+
+Columnas de artículos:   nombre, categoria, cantidad, costo, bar_code[, fecha_hora]
+Columnas de movimientos: articulo_id o bar_code, tipo (entrada/salida), unidad, costo
+                         [, descripcion, fecha_hora]
+
+Un artículo sin costo entra con costo cero. Un movimiento sin costo toma el que le daría
+``registrar_movimiento``: el costo promedio vigente si es una entrada y el de su método de
+costeo si es una salida.
+
+Uso por consola:
+
+    python importador.py articulos archivo.csv [--db inventario.db] [--lote 1000]
+    python importador.py movimientos archivo.csv
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+from itertools import islice
+
+MAX_ERRORES_GUARDADOS = 100
+VALORES_ENTRADA = {'entrada', 'e', 'true', '1', 'si', 'sí'}
+VALORES_SALIDA = {'salida', 's', 'false', '0', 'no'}
+
+
+class ProgresoImportacion:
+    """Lleva la cuenta de filas y bytes procesados y la informa a una función opcional."""
+
+    def __init__(self, total_bytes: int, callback=None):
+        self.total_bytes = total_bytes
+        self.bytes_leidos = 0
+        self.filas = 0
+        self.importadas = 0
+        self.rechazadas = 0
+        self.errores = []  # Solo se guardan los primeros MAX_ERRORES_GUARDADOS
+        self.callback = callback
+
+    @property
+    def fraccion(self) -> float:
+        return min(self.bytes_leidos / self.total_bytes, 1.0) if self.total_bytes else 1.0
+
+    def rechazar(self, linea: int, motivo: str):
+        self.rechazadas += 1
+        if len(self.errores) < MAX_ERRORES_GUARDADOS:
+            self.errores.append(f"Línea {linea}: {motivo}")
+
+    def notificar(self):
+        if self.callback:
+            self.callback(self)
+
+    def to_dict(self):
+        return {
+            'filas': self.filas,
+            'importadas': self.importadas,
+            'rechazadas': self.rechazadas,
+            'errores': list(self.errores),
+        }
+
+
+def _lineas_con_progreso(archivo, progreso: ProgresoImportacion):
+    for linea in archivo:
+        progreso.bytes_leidos += len(linea.encode('utf-8'))
+        yield linea
+
+
+def leer_csv(archivo, progreso: ProgresoImportacion):
+    """Genera (número de línea, fila como diccionario) detectando el separador."""
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(_lineas_con_progreso(archivo, progreso), dialect=dialecto)
+    lector.fieldnames = [campo.strip().lower() for campo in (lector.fieldnames or [])]
+    for fila in lector:
+        progreso.filas += 1
+        yield lector.line_num, {clave: (valor or '').strip() for clave, valor in fila.items() if clave}
+
+
+def _fecha(valor: str):
+    return datetime.datetime.fromisoformat(valor) if valor else None
+
+
+def _numero(valor: str, tipo):
+    # Excel en español exporta los decimales con coma
+    return tipo(valor.replace(',', '.')) if tipo is float else tipo(valor)
+
+
+def validar_articulos(filas, progreso: ProgresoImportacion):
+    """Convierte las filas en (línea, diccionario para ``crear_articulos_bulk``) y descarta las inválidas."""
+    for linea, fila in filas:
+        try:
+            if not fila.get('nombre') or not fila.get('categoria'):
+                raise ValueError("nombre y categoria son obligatorios")
+            cantidad = _numero(fila.get('cantidad') or '0', int)
+            # Sin costo, las existencias iniciales quedan valoradas en cero
+            costo = _numero(fila.get('costo') or '0', float)
+            if cantidad < 0 or costo < 0:
+                raise ValueError("cantidad y costo no pueden ser negativos")
+            yield linea, {
+                'nombre': fila['nombre'],
+                'categoria': fila['categoria'],
+                'cantidad': cantidad,
+                'costo': costo,
+                'bar_code': fila.get('bar_code') or None,
+                'fecha_hora': _fecha(fila.get('fecha_hora')),
+            }
+        except ValueError as e:
+            progreso.rechazar(linea, str(e))
+
+
+def descartar_codigos_repetidos(articulos, controller, progreso: ProgresoImportacion, tamano_lote: int):
+    """Rechaza los artículos cuyo código de barras ya existe en la base o más arriba en el archivo."""
+    vistos = set()
+    articulos = iter(articulos)
+    while lote := list(islice(articulos, tamano_lote)):
+        existentes = controller.resolver_codigos_barras(
+            a['bar_code'] for _, a in lote if a['bar_code'])
+        for linea, articulo in lote:
+            codigo = articulo['bar_code']
+            if codigo:
+                if codigo in existentes or codigo in vistos:
+                    progreso.rechazar(linea, f"código de barras repetido: {codigo}")
+                    continue
+                vistos.add(codigo)
+            yield articulo
+
+
+def validar_movimientos(filas, progreso: ProgresoImportacion):
+    """Convierte las filas en movimientos; conserva la línea para informar errores posteriores."""
+    for linea, fila in filas:
+        try:
+            tipo = (fila.get('tipo') or fila.get('entrada_salida') or '').lower()
+            if tipo in VALORES_ENTRADA:
+                entrada = True
+            elif tipo in VALORES_SALIDA:
+                entrada = False
+            else:
+                raise ValueError(f"tipo de movimiento inválido: '{tipo}'")
+            articulo_id = int(fila['articulo_id']) if fila.get('articulo_id') else None
+            if articulo_id is None and not fila.get('bar_code'):
+                raise ValueError("se necesita articulo_id o bar_code")
+            unidad = _numero(fila.get('unidad') or fila.get('cantidad') or '', int)
+            if unidad <= 0:
+                raise ValueError("la unidad debe ser mayor que cero")
+            # Sin costo lo resuelve registrar_movimientos_bulk, como registrar_movimiento
+            costo = _numero(fila['costo'], float) if fila.get('costo') else None
+            if costo is not None and costo < 0:
+                raise ValueError("el costo no puede ser negativo")
+            yield linea, {
+                'articulo_id': articulo_id,
+                'bar_code': fila.get('bar_code'),
+                'descripcion': fila.get('descripcion') or "Importación",
+                'entrada': entrada,
+                'unidad': unidad,
+                'costo': costo,
+                'fecha_hora': _fecha(fila.get('fecha_hora')),
+            }
+        except ValueError as e:
+            progreso.rechazar(linea, str(e))
+
+
+def resolver_articulos(movimientos, controller, progreso: ProgresoImportacion, tamano_lote: int):
+    """Resuelve ``bar_code`` y verifica ``articulo_id`` con una consulta por lote."""
+    movimientos = iter(movimientos)
+    while lote := list(islice(movimientos, tamano_lote)):
+        por_codigo = controller.resolver_codigos_barras(
+            m['bar_code'] for _, m in lote if m['articulo_id'] is None)
+        ids = {m['articulo_id'] for _, m in lote if m['articulo_id'] is not None}
+        existentes = controller.filtrar_articulos_existentes(ids)
+        for linea, movimiento in lote:
+            if movimiento['articulo_id'] is None:
+                movimiento['articulo_id'] = por_codigo.get(movimiento['bar_code'])
+                if movimiento['articulo_id'] is None:
+                    progreso.rechazar(linea, f"código de barras desconocido: {movimiento['bar_code']}")
+                    continue
+            elif movimiento['articulo_id'] not in existentes:
+                progreso.rechazar(linea, f"artículo inexistente: {movimiento['articulo_id']}")
+                continue
+            yield movimiento
+
+
+def _contar_importados(elementos, progreso: ProgresoImportacion, cada: int):
+    for elemento in elementos:
+        progreso.importadas += 1
+        if progreso.importadas % cada == 0:
+            progreso.notificar()
+        yield elemento
+
+
+def importar_articulos(ruta: str, controller, tamano_lote: int = 1000, al_progresar=None) -> dict:
+    """Importa un CSV de artículos y devuelve el resumen de la importación."""
+    progreso = ProgresoImportacion(os.path.getsize(ruta), al_progresar)
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        articulos = validar_articulos(leer_csv(archivo, progreso), progreso)
+        articulos = descartar_codigos_repetidos(articulos, controller, progreso, tamano_lote)
+        controller.crear_articulos_bulk(_contar_importados(articulos, progreso, tamano_lote), tamano_lote)
+    progreso.notificar()
+    return progreso.to_dict()
+
+
+def importar_movimientos(ruta: str, controller, tamano_lote: int = 1000, al_progresar=None) -> dict:
+    """Importa un CSV de movimientos y devuelve el resumen de la importación."""
+    progreso = ProgresoImportacion(os.path.getsize(ruta), al_progresar)
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        movimientos = validar_movimientos(leer_csv(archivo, progreso), progreso)
+        movimientos = resolver_articulos(movimientos, controller, progreso, tamano_lote)
+        controller.registrar_movimientos_bulk(_contar_importados(movimientos, progreso, tamano_lote), tamano_lote)
+    progreso.notificar()
+    return progreso.to_dict()
+
+
+IMPORTADORES = {
+    'articulos': importar_articulos,
+    'movimientos': importar_movimientos,
+}
+
+
+if __name__ == "__main__":
+    from controller import InventoryController
+
+    parser = argparse.ArgumentParser(description="Importa artículos o movimientos desde un CSV")
+    parser.add_argument("tipo", choices=IMPORTADORES.keys())
+    parser.add_argument("archivo")
+    parser.add_argument("--db", default="inventario.db")
+    parser.add_argument("--lote", type=int, default=1000, help="filas por lote de inserción")
+    args = parser.parse_args()
+
+    def mostrar_progreso(progreso):
+        print(f"\r{progreso.fraccion:6.1%}  {progreso.importadas} importadas, "
+              f"{progreso.rechazadas} rechazadas", end="", file=sys.stderr)
+
+    resumen = IMPORTADORES[args.tipo](args.archivo, InventoryController(args.db), args.lote, mostrar_progreso)
+    print(file=sys.stderr)
+    for error in resumen['errores']:
+        print(error, file=sys.stderr)
+    print(f"{resumen['importadas']} filas importadas, {resumen['rechazadas']} rechazadas")
+    sys.exit(1 if resumen['rechazadas'] else 0)
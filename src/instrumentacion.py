@@ -0,0 +1,247 @@
+"""Medición de las consultas SQL que provoca cada pantalla, manejador y método del controlador.
+
+Se activa con la variable de entorno ``GYESYS_INSTRUMENTACION=1`` (o llamando a ``activar()``).
+Cada manejador decorado con ``@medido`` y cada método de InventoryController abre una medición.
+Mientras está abierta, los eventos del engine de SQLAlchemy le suman cada sentencia ejecutada y
+su tiempo. Las mediciones se anidan: una consulta cuenta para el método y para el manejador que
+lo llamó. Al cerrarse, la medición de un manejador se acumula en ``registro`` por ruta y nombre,
+se escribe como una línea JSON en el logger ``gyesys.instrumentacion`` y se avisa al panel de
+desarrollo de AppLayout. Si una misma sentencia se repite ``UMBRAL_REPETICIONES`` veces o más
+dentro de una medición, se marca como posible N+1.
+
+El tiempo de SQL es el de ``cursor.execute``. En SQLite buena parte de una consulta grande se
+ejecuta al leer sus filas, y ese tiempo queda del lado de Python.
+
+    with medir("importacion") as medicion:
+        ...
+    print(medicion.consultas, medicion.segundos_sql)
+"""
+import asyncio
+import collections
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from sqlalchemy import event
+
+ACTIVA = os.environ.get('GYESYS_INSTRUMENTACION', '') not in ('', '0')
+
+# Veces que puede repetirse la misma sentencia en una medición antes de marcarla como posible N+1
+UMBRAL_REPETICIONES = 10
+# Mediciones de manejadores que se guardan para el panel de desarrollo
+ULTIMAS_MEDICIONES = 50
+
+logger = logging.getLogger("gyesys.instrumentacion")
+
+# Mediciones abiertas en el contexto actual (tarea de asyncio o hilo), de la más externa a la más interna
+_abiertas = contextvars.ContextVar("mediciones_abiertas", default=())
+
+
+def activar(activa: bool = True):
+    global ACTIVA
+    ACTIVA = activa
+
+
+class Medicion:
+    def __init__(self, nombre, ruta=None, sesion=None, manejador=True):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.sesion = sesion
+        self.manejador = manejador
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.segundos_total = 0.0
+        self.filas = 0
+        self.sentencias = collections.Counter()
+        self._inicio = time.perf_counter()
+        self._lock = threading.Lock()  # Un manejador puede consultar desde varios hilos a la vez
+
+    def registrar_consulta(self, sentencia, segundos):
+        with self._lock:
+            self.consultas += 1
+            self.segundos_sql += segundos
+            self.sentencias[sentencia] += 1
+
+    def registrar_filas(self, filas):
+        with self._lock:
+            self.filas += filas
+
+    def terminar(self):
+        self.segundos_total = time.perf_counter() - self._inicio
+
+    @property
+    def repeticion_max(self):
+        return max(self.sentencias.values(), default=0)
+
+    @property
+    def posible_n_mas_1(self):
+        return self.repeticion_max >= UMBRAL_REPETICIONES
+
+    def resumen(self) -> dict:
+        return {
+            'nombre': self.nombre,
+            'ruta': self.ruta,
+            'consultas': self.consultas,
+            'ms_sql': round(self.segundos_sql * 1000, 3),
+            'ms_python': round(max(self.segundos_total - self.segundos_sql, 0) * 1000, 3),
+            'filas': self.filas,
+            'repeticion_max': self.repeticion_max,
+            'posible_n_mas_1': self.posible_n_mas_1,
+        }
+
+
+class RegistroMediciones:
+    """Acumula las mediciones del proceso por (ruta, nombre) y guarda las últimas de los manejadores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totales = {}
+        self._ultimas = collections.deque(maxlen=ULTIMAS_MEDICIONES)
+        self._oyentes = []
+
+    def agregar(self, medicion: Medicion):
+        manejador = medicion.manejador
+        resumen = medicion.resumen()
+        with self._lock:
+            total = self._totales.setdefault((medicion.ruta, medicion.nombre), {
+                'ruta': medicion.ruta, 'nombre': medicion.nombre, 'llamadas': 0, 'consultas': 0,
+                'ms_sql': 0.0, 'ms_python': 0.0, 'filas': 0, 'consultas_max': 0, 'posibles_n_mas_1': 0,
+            })
+            total['llamadas'] += 1
+            total['consultas'] += resumen['consultas']
+            total['ms_sql'] += resumen['ms_sql']
+            total['ms_python'] += resumen['ms_python']
+            total['filas'] += resumen['filas']
+            total['consultas_max'] = max(total['consultas_max'], resumen['consultas'])
+            total['posibles_n_mas_1'] += resumen['posible_n_mas_1']
+            if manejador:
+                self._ultimas.append((medicion.sesion, resumen))
+            oyentes = [oyente() for oyente in self._oyentes] if manejador else []
+        for oyente in oyentes:
+            if oyente is not None:
+                oyente(medicion.sesion, resumen)
+
+    def totales(self):
+        """Totales por ruta y nombre, de la que más tiempo pasó en SQL a la que menos."""
+        with self._lock:
+            totales = [dict(total, ms_sql=round(total['ms_sql'], 3), ms_python=round(total['ms_python'], 3))
+                       for total in self._totales.values()]
+        return sorted(totales, key=lambda total: total['ms_sql'], reverse=True)
+
+    def ultimas(self, sesion=None):
+        with self._lock:
+            return [resumen for origen, resumen in self._ultimas if sesion is None or origen == sesion]
+
+    def suscribir(self, oyente):
+        """``oyente(sesion, resumen)`` se llama al terminar cada manejador; se guarda como referencia
+        débil para que las sesiones cerradas no queden vivas."""
+        with self._lock:
+            self._oyentes = [o for o in self._oyentes if o() is not None]
+            self._oyentes.append(weakref.WeakMethod(oyente) if hasattr(oyente, '__self__') else weakref.ref(oyente))
+
+    def limpiar(self):
+        with self._lock:
+            self._totales.clear()
+            self._ultimas.clear()
+
+
+registro = RegistroMediciones()
+
+
+@contextmanager
+def medir(nombre, ruta=None, sesion=None, manejador=True):
+    """Abre una medición dentro de las que ya estén abiertas en este contexto."""
+    abiertas = _abiertas.get()
+    if abiertas:
+        ruta = ruta or abiertas[-1].ruta
+        sesion = sesion or abiertas[-1].sesion
+    medicion = Medicion(nombre, ruta, sesion, manejador)
+    token = _abiertas.set(abiertas + (medicion,))
+    try:
+        yield medicion
+    finally:
+        _abiertas.reset(token)
+        medicion.terminar()
+        registro.agregar(medicion)
+        if manejador:
+            if medicion.posible_n_mas_1:
+                logger.warning(json.dumps(medicion.resumen(), ensure_ascii=False))
+            else:
+                logger.info(json.dumps(medicion.resumen(), ensure_ascii=False))
+
+
+def medido(funcion):
+    """Decorador para los manejadores de las vistas (síncronos o ``async``).
+
+    La medición toma su nombre de la clase y el método, y la ruta y la sesión de ``self.page``.
+    """
+    def abrir(self):
+        page = getattr(self, 'page', None)
+        return medir(f"{type(self).__name__}.{funcion.__name__}", getattr(page, 'route', None),
+                     getattr(page, 'session_id', None))
+
+    if asyncio.iscoroutinefunction(funcion):
+        @functools.wraps(funcion)
+        async def manejador_async(self, *args, **kwargs):
+            if not ACTIVA:
+                return await funcion(self, *args, **kwargs)
+            with abrir(self):
+                return await funcion(self, *args, **kwargs)
+        return manejador_async
+
+    @functools.wraps(funcion)
+    def manejador(self, *args, **kwargs):
+        if not ACTIVA:
+            return funcion(self, *args, **kwargs)
+        with abrir(self):
+            return funcion(self, *args, **kwargs)
+    return manejador
+
+
+def medido_metodo(metodo):
+    """Decorador para los métodos del controlador: cuenta sus consultas y las filas que devuelven."""
+    nombre = f"InventoryController.{metodo.__name__}"
+
+    @functools.wraps(metodo)
+    def envoltura(*args, **kwargs):
+        if not ACTIVA:
+            return metodo(*args, **kwargs)
+        with medir(nombre, manejador=False):
+            resultado = metodo(*args, **kwargs)
+            if isinstance(resultado, (list, tuple)):
+                filas = len(resultado)
+            else:
+                filas = 0 if resultado is None or isinstance(resultado, bool) else 1
+            *externas, propia = _abiertas.get()
+            propia.registrar_filas(filas)
+            # Las filas se cuentan una vez: en el método más externo y en los manejadores que lo llamaron
+            if all(medicion.manejador for medicion in externas):
+                for medicion in externas:
+                    medicion.registrar_filas(filas)
+            return resultado
+    return envoltura
+
+
+def instrumentar_engine(engine):
+    """Suma cada sentencia del engine, con su tiempo, a las mediciones abiertas en el contexto."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        if _abiertas.get():
+            conn.info.setdefault('inicio_sentencias', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        abiertas = _abiertas.get()
+        inicios = conn.info.get('inicio_sentencias')
+        if not abiertas or not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        if statement.startswith('BEGIN'):
+            return  # Lo emite el evento "begin" de database.py en cada transacción: no es una consulta
+        for medicion in abiertas:
+            medicion.registrar_consulta(statement, segundos)
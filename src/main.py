@@ -1,4 +1,6 @@
+import logging
 import flet as ft
+import instrumentacion
 from app_layout import AppLayout
  
 class TrelloApp(AppLayout):
@@ -47,4 +49,7 @@ if __name__ == "__main__":
         page.add(app)
         page.update()
  
+    if instrumentacion.ACTIVA:
+        # Una línea JSON por manejador medido (ver instrumentacion.py)
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
     ft.app(main, assets_dir="assets")
\ No newline at end of file
@@ -1,22 +1,132 @@
+import asyncio
 import flet as ft
-from controller import InventoryController
-from table_generator import TableGenerator
+from controller_async import obtener_controlador_async
+from table_generator import Paginador, TablaArticulos, TableGenerator
 from button_generator import ButtonGenerator
+from notificaciones import publicar_cambio
+from instrumentacion import medido
 
 
-class mainView(ft.Column):
+class mainView(TablaArticulos, ft.Column):
+    # Segundos sin escribir antes de lanzar la búsqueda
+    ESPERA_BUSQUEDA = 0.3
+
+    # Filtro de existencias: (cantidad_minima, cantidad_maxima)
+    FILTROS_EXISTENCIA = {
+        "todas": (None, None),
+        "con": (1, None),
+        "sin": (None, 0),
+    }
+
     def __init__(
-        self, page: ft.Page, toggle_sidebar_callback, category_id=None, *args, **kwargs
+        self, page: ft.Page, toggle_sidebar_callback, category_id=None, controller=None, *args, **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.page = page
-        self.controller = InventoryController()
+        self.controller = controller or obtener_controlador_async()
         self.table_generator = TableGenerator(self.controller)
         self.selected_row = None
-        self.article_data = self.get_all_articles()
+        self.selected_ids = set()
+        self.article_data = []
+        self.paginador = Paginador(
+            on_change=self.refresh_table,
+            clave=lambda fila: (fila[self.orden], fila["id"]),
+        )
         self.margin_main_rigth = self.page.width * 0.015
         self.toggle_sidebar_callback = toggle_sidebar_callback
         self.category_id = category_id
+        self.categoria_tabla = category_id
+
+        # Búsqueda, filtros y orden; se resuelven en SQL con controller.buscar_articulos
+        self.texto_busqueda = ""
+        self.orden = "id"
+        self.descendente = False
+        self.filtro_existencia = "todas"
+        self._busqueda_generacion = 0
+
+        self.search_field = ft.TextField(
+            hint_text="Buscar nombre o código",
+            autofocus=False,
+            content_padding=ft.padding.only(left=10),
+            width=200,
+            height=40,
+            text_size=12,
+            border_color=ft.Colors.BLACK26,
+            focused_border_color=ft.Colors.BLUE_ACCENT,
+            suffix_icon=ft.Icons.SEARCH,
+            on_change=self.on_search_change,
+        )
+        self.orden_dropdown = ft.Dropdown(
+            options=[
+                ft.dropdown.Option("id", "ID"),
+                ft.dropdown.Option("nombre", "Nombre"),
+                ft.dropdown.Option("cantidad", "Cantidad"),
+                ft.dropdown.Option("costo", "Costo"),
+            ],
+            value=self.orden,
+            width=120,
+            dense=True,
+            on_change=self.on_orden_change,
+        )
+        self.direccion_button = ft.IconButton(
+            icon=ft.Icons.ARROW_UPWARD,
+            tooltip="Ascendente",
+            on_click=self.on_direccion_click,
+        )
+        self.existencia_dropdown = ft.Dropdown(
+            options=[
+                ft.dropdown.Option("todas", "Todas"),
+                ft.dropdown.Option("con", "Con existencia"),
+                ft.dropdown.Option("sin", "Sin existencia"),
+            ],
+            value=self.filtro_existencia,
+            width=150,
+            dense=True,
+            on_change=self.on_existencia_change,
+        )
+
+        # Modo escáner: código + Enter registra el movimiento sin abrir diálogos
+        self.escaner_button = ft.IconButton(
+            icon=ft.Icons.QR_CODE_SCANNER,
+            tooltip="Modo escáner",
+            on_click=self.toggle_escaner,
+        )
+        self.scan_field = ft.TextField(
+            label="Código de barras",
+            width=220,
+            text_size=12,
+            dense=True,
+            on_submit=self.on_scan,
+        )
+        self.scan_cantidad_field = ft.TextField(
+            label="Cantidad",
+            value="1",
+            width=90,
+            text_size=12,
+            dense=True,
+            keyboard_type=ft.KeyboardType.NUMBER,
+        )
+        self.scan_tipo_selector = ft.RadioGroup(
+            content=ft.Row([
+                ft.Radio(value="entrada", label="Entrada"),
+                ft.Radio(value="salida", label="Salida"),
+            ]),
+            value="entrada",
+        )
+        self.scan_estado_text = ft.Text("", size=12)
+        self.scanner_container = ft.Container(
+            content=ft.Row(
+                controls=[
+                    self.scan_field,
+                    self.scan_cantidad_field,
+                    self.scan_tipo_selector,
+                    self.scan_estado_text,
+                ],
+                spacing=10,
+            ),
+            visible=False,
+            margin=ft.margin.only(right=float(self.margin_main_rigth)),
+        )
 
         self.inventory_table_container = ft.Container(
             bgcolor='#FFE1E6',
@@ -38,7 +148,7 @@ class mainView(ft.Column):
             ),
             expand=True,
             alignment=ft.alignment.top_center,
-            height=self.page.height * 0.82,
+            height=self.page.height * 0.76,
             margin=ft.margin.only(right=float(self.margin_main_rigth)),
             border_radius=ft.border_radius.all(10),
         )
@@ -57,6 +167,8 @@ class mainView(ft.Column):
             self.refresh_table,
             origin="principal",
             table_data=self.article_data,
+            controller=self.controller,
+            on_row_change=self.apply_row_change,
         )
         action_buttons = self.button_generator.generate_buttons()
 
@@ -64,16 +176,15 @@ class mainView(ft.Column):
             ft.Row(
                 controls=[
                     ft.Container(
-                        content=ft.TextField(
-                            hint_text="Search all boards",
-                            autofocus=False,
-                            content_padding=ft.padding.only(left=10),
-                            width=200,
-                            height=40,
-                            text_size=12,
-                            border_color=ft.Colors.BLACK26,
-                            focused_border_color=ft.Colors.BLUE_ACCENT,
-                            suffix_icon=ft.Icons.SEARCH,
+                        content=ft.Row(
+                            controls=[
+                                self.search_field,
+                                self.orden_dropdown,
+                                self.direccion_button,
+                                self.existencia_dropdown,
+                                self.escaner_button,
+                            ],
+                            spacing=5,
                         ),
                         margin=ft.margin.only(top=5),
                     ),
@@ -88,57 +199,96 @@ class mainView(ft.Column):
                 ],
                 alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
             ),
+            self.scanner_container,
             self.list_view_container,
+            ft.Container(
+                content=self.paginador.create_controls(),
+                margin=ft.margin.only(right=float(self.margin_main_rigth)),
+            ),
         ]
         self.expand = True
         self.alignment = ft.MainAxisAlignment.CENTER
         self.horizontal_alignment = ft.CrossAxisAlignment.CENTER
         self._first_build = True
-        if self.category_id:
-            self.refresh_table(self.category_id)
-        else:
-            self.refresh_table()
-
-    def get_all_articles(self):
-        articles = self.controller.obtener_todos_articulos()
-        updated_articles = []
-        for article in articles:
-            cantidad_total = self.controller.calcular_cantidad_actual(article["id"])
-            costo_promedio = self.controller.calcular_costo_promedio_articulo(
-                article["id"]
-            )  # Usar la nueva función
-            updated_articles.append(
-                {
-                    "id": article["id"],
-                    "nombre": article["nombre"],
-                    "categoria": article["categoria"],
-                    "cantidad": cantidad_total,
-                    "costo": costo_promedio,
-                    "bar_code": article["bar_code"],
-                }
-            )
-        return updated_articles
 
-    def get_index(self, e):
-        row_id = int(e.control.cells[0].content.value)
-        table = self.inventory_table_container.content.controls[0].content
+    def did_mount(self):
+        # La primera página se consulta ya montada la vista, sin bloquear el cambio de ruta
+        self.page.run_task(self.refresh_table)
 
-        # Deselect all rows
-        for row in table.rows:
-            if row != e.control:
-                row.selected = False
+    async def get_all_articles(self):
+        return await self.controller.obtener_articulos_con_existencias()
 
-        # Toggle the selection of the current row
-        e.control.selected = not e.control.selected
+    def tabla_articulos(self):
+        return self.inventory_table_container.content.controls[0].content
 
-        if e.control.selected:
-            self.selected_row = self.controller.obtener_articulo(row_id)
-        else:
-            self.selected_row = None
+    def busqueda_activa(self):
+        return bool(self.texto_busqueda) or self.orden != "id" or self.descendente or self.filtro_existencia != "todas"
 
-        self.button_generator.selected_row = self.selected_row
-        self.refresh_buttons()
+    async def on_search_change(self, e):
+        """Espera a que el usuario deje de escribir antes de consultar la base."""
+        self.texto_busqueda = self.search_field.value.strip()
+        self._busqueda_generacion += 1
+        generacion = self._busqueda_generacion
+        await asyncio.sleep(self.ESPERA_BUSQUEDA)
+        if generacion != self._busqueda_generacion:
+            return  # Llegó otra tecla mientras tanto
+        self.paginador.reiniciar()
+        await self.refresh_table()
+
+    async def on_orden_change(self, e):
+        self.orden = self.orden_dropdown.value
+        self.paginador.reiniciar()
+        await self.refresh_table()
+
+    async def on_direccion_click(self, e):
+        self.descendente = not self.descendente
+        self.direccion_button.icon = ft.Icons.ARROW_DOWNWARD if self.descendente else ft.Icons.ARROW_UPWARD
+        self.direccion_button.tooltip = "Descendente" if self.descendente else "Ascendente"
+        self.paginador.reiniciar()
+        await self.refresh_table()
+
+    async def on_existencia_change(self, e):
+        self.filtro_existencia = self.existencia_dropdown.value
+        self.paginador.reiniciar()
+        await self.refresh_table()
+
+    def toggle_escaner(self, e):
+        self.scanner_container.visible = not self.scanner_container.visible
+        self.escaner_button.selected = self.scanner_container.visible
+        self.scan_estado_text.value = ""
         self.update()
+        if self.scanner_container.visible:
+            self.scan_field.focus()
+
+    @medido
+    async def on_scan(self, e):
+        """Registra la entrada o salida del código leído y deja el campo listo para el siguiente."""
+        codigo = (self.scan_field.value or "").strip()
+        if not codigo:
+            return
+        try:
+            unidad = int(self.scan_cantidad_field.value or "1")
+        except ValueError:
+            unidad = 0
+        try:
+            articulo, registro = await self.controller.registrar_escaneo(
+                codigo, unidad, self.scan_tipo_selector.value == "entrada"
+            )
+        except ValueError as error:
+            self.scan_estado_text.value = str(error)
+            self.scan_estado_text.color = ft.Colors.RED_700
+        else:
+            tipo = "Entrada" if registro["entrada_salida"] else "Salida"
+            self.scan_estado_text.value = f"{tipo} de {unidad}: {articulo['nombre']}"
+            self.scan_estado_text.color = ft.Colors.GREEN_700
+            publicar_cambio(self.page, "movimientos", [articulo["id"]])
+            # Solo se actualiza la fila del artículo si está en la página visible
+            fila = await self.controller.obtener_articulo_con_existencias(articulo["id"])
+            if self.table_generator.update_row(self.tabla_articulos(), fila):
+                self.article_data = [fila if item["id"] == fila["id"] else item for item in self.article_data]
+        self.scan_field.value = ""
+        self.update()
+        self.scan_field.focus()
 
     def refresh_buttons(self):
         # Actualiza los botones con el estado actual de selected_row
@@ -157,30 +307,20 @@ class mainView(ft.Column):
     # def did_mount(self):
     #     self.refresh_table()  # Llamar a refresh_table cuando el control se monta
 
-    def refresh_table(self, category_id=None):
+    @medido
+    async def refresh_table(self, category_id=None):
         # Si category_id está presente, solo se muestran los artículos de esa categoría
-        if category_id:
-            articles = self.controller.obtener_articulos_por_categoria(category_id)
-        else:
-            articles = self.controller.obtener_todos_articulos()
-
-        updated_articles = []
-        for article in articles:
-            # Aquí accedemos a los atributos del objeto Articulo correctamente
-            cantidad_total = self.controller.calcular_cantidad_actual(article["id"])
-            costo_promedio = self.controller.calcular_costo_promedio_articulo(
-                article["id"]
-            )
-            updated_articles.append(
-                {
-                    "id": article["id"],
-                    "nombre": article["nombre"],
-                    "categoria": article["categoria"],
-                    "cantidad": cantidad_total,
-                    "costo": costo_promedio,
-                    "bar_code": article["bar_code"],
-                }
-            )
+        category_id = category_id or self.category_id or None
+        cantidad_minima, cantidad_maxima = self.FILTROS_EXISTENCIA[self.filtro_existencia]
+        # Solo se consulta y se dibuja la página visible
+        updated_articles = await self.paginador.cargar(
+            lambda limite, despues_de: self.controller.buscar_articulos(
+                self.texto_busqueda, category_id, cantidad_minima, cantidad_maxima,
+                self.orden, self.descendente, limite, despues_de),
+            lambda: self.controller.contar_articulos(
+                nombre_categoria=category_id, texto=self.texto_busqueda,
+                cantidad_minima=cantidad_minima, cantidad_maxima=cantidad_maxima),
+        )
 
         # Actualizamos la tabla de datos con los artículos de la categoría
         inventory_table = self.table_generator.create_table(
@@ -191,4 +331,5 @@ class mainView(ft.Column):
         )
         self.inventory_table_container.content.controls[0].content = inventory_table
         self.article_data = updated_articles
-        self.page.update()
+        self.clear_selection()
+        self.refresh_buttons()
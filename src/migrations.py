@@ -0,0 +1,369 @@
+"""Migraciones versionadas del esquema de inventario.db.
+
+La versión aplicada se guarda en ``PRAGMA user_version``. Cada migración se ejecuta una sola
+vez, en orden, al crear el ``DatabaseManager``; las bases nuevas las reciben todas sobre el
+esquema que ya generó ``create_all``, por eso deben poder aplicarse sobre ese esquema sin fallar.
+
+Uso por consola para revisar que las consultas frecuentes usan los índices:
+
+    python migrations.py inventario.db --explicar
+"""
+import argparse
+import sys
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def _columnas(engine, tabla: str) -> set:
+    with engine.connect() as conn:
+        return {fila[1] for fila in conn.execute(text(f"PRAGMA table_info({tabla})"))}
+
+
+def _poblar_saldos(db_manager):
+    """Construye los saldos materializados de bases creadas antes de la tabla ``saldos``."""
+    if "id" not in _columnas(db_manager.engine, "registros"):
+        return  # El cálculo ordena por registros.id; la migración 6 agrega la columna y los construye
+    db_manager.rebuild_balances(lotes=False)  # Los lotes necesitan articulos.metodo_costo (migración 7)
+
+
+def _crear_indices(db_manager):
+    """Índices para las búsquedas de registros por artículo/fecha y de artículos por categoría."""
+    with db_manager.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_registros_articulo_fecha ON registros (articulo_id, fecha_hora)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_articulos_categoria ON articulos (categoria)"
+        ))
+        conn.execute(text("ANALYZE"))
+
+
+def _crear_busqueda_articulos(db_manager):
+    """Índices para ordenar artículos y, si SQLite trae FTS5, el índice de texto de nombre y
+    código de barras, sincronizado con ``articulos`` mediante triggers."""
+    with db_manager.engine.begin() as conn:
+        for indice, columna in (("ix_articulos_nombre", "nombre"),
+                                ("ix_articulos_cantidad", "cantidad"),
+                                ("ix_articulos_costo", "costo")):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {indice} ON articulos ({columna})"))
+        conn.execute(text("ANALYZE"))
+
+    try:
+        with db_manager.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articulos_fts USING fts5("
+                "nombre, bar_code, content='articulos', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS articulos_fts_ai AFTER INSERT ON articulos BEGIN "
+                "INSERT INTO articulos_fts (rowid, nombre, bar_code) VALUES (new.id, new.nombre, new.bar_code); "
+                "END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS articulos_fts_ad AFTER DELETE ON articulos BEGIN "
+                "INSERT INTO articulos_fts (articulos_fts, rowid, nombre, bar_code) "
+                "VALUES ('delete', old.id, old.nombre, old.bar_code); "
+                "END"
+            ))
+            # Solo nombre y código: las cargas de movimientos actualizan cantidad y costo a menudo
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS articulos_fts_au AFTER UPDATE OF nombre, bar_code ON articulos BEGIN "
+                "INSERT INTO articulos_fts (articulos_fts, rowid, nombre, bar_code) "
+                "VALUES ('delete', old.id, old.nombre, old.bar_code); "
+                "INSERT INTO articulos_fts (rowid, nombre, bar_code) VALUES (new.id, new.nombre, new.bar_code); "
+                "END"
+            ))
+            conn.execute(text("INSERT INTO articulos_fts (articulos_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        # Sin FTS5 la búsqueda por texto usa LIKE sobre articulos
+        print(f"Búsqueda de texto completo no disponible: {e}")
+
+
+def _indexar_codigos_barras(db_manager):
+    """Índice único parcial de códigos de barras. Los códigos vacíos pasan a NULL, que el índice
+    no incluye; si la base ya tiene códigos repetidos se crea un índice común y se listan."""
+    with db_manager.engine.begin() as conn:
+        conn.execute(text("UPDATE articulos SET bar_code = NULL WHERE trim(bar_code) = ''"))
+        repetidos = conn.execute(text(
+            "SELECT bar_code FROM articulos WHERE bar_code IS NOT NULL GROUP BY bar_code HAVING COUNT(*) > 1"
+        )).scalars().all()
+        if repetidos:
+            print(f"Códigos de barras repetidos ({len(repetidos)}), el índice no será único: "
+                  + ", ".join(repetidos[:20]))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_articulos_bar_code ON articulos (bar_code)"))
+        else:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_articulos_bar_code ON articulos (bar_code) "
+                "WHERE bar_code IS NOT NULL"
+            ))
+
+
+def _reconstruir_tablas(db_manager, tablas, copiar, indices=None):
+    """Cambia el esquema de ``tablas`` con el procedimiento de SQLite para lo que ALTER TABLE no
+    permite: ``copiar`` recibe la conexión, crea cada ``<tabla>_nueva`` y copia los datos; luego se
+    borran las originales, se renombran las nuevas y se recrean sus índices y triggers (``indices``
+    reemplaza por nombre el SQL de los que cambian). Todo en una transacción, con las claves
+    foráneas desactivadas mientras dura y verificadas antes de confirmar."""
+    conexion = db_manager.engine.raw_connection()
+    try:
+        db = conexion.driver_connection
+        nivel_aislamiento = db.isolation_level
+        claves_foraneas = db.execute("PRAGMA foreign_keys").fetchone()[0]
+        db.isolation_level = None  # Transacción manual: PRAGMA foreign_keys no cambia dentro de una
+        db.execute("PRAGMA foreign_keys=OFF")
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            marcadores = ", ".join("?" for _ in tablas)
+            esquema = db.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                f"AND sql IS NOT NULL AND tbl_name IN ({marcadores})", tuple(tablas)
+            ).fetchall()
+            copiar(db)
+            for tabla in tablas:
+                db.execute(f"DROP TABLE {tabla}")
+                db.execute(f"ALTER TABLE {tabla}_nueva RENAME TO {tabla}")
+            for nombre, sql in esquema:
+                db.execute((indices or {}).get(nombre, sql))
+            errores = db.execute("PRAGMA foreign_key_check").fetchall()
+            if errores:
+                raise RuntimeError(f"Claves foráneas inválidas tras reconstruir {', '.join(tablas)}: {errores[:5]}")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.execute(f"PRAGMA foreign_keys={int(claves_foraneas)}")
+            db.isolation_level = nivel_aislamiento
+    finally:
+        conexion.close()
+    with db_manager.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def _categorias_con_id(db_manager):
+    """Clave entera para las categorías: ``articulos.categoria`` (el nombre) pasa a
+    ``articulos.categoria_id``, así renombrar una categoría es un UPDATE de una sola fila."""
+    if "categoria_id" in _columnas(db_manager.engine, "articulos"):
+        return  # Base nueva, creada ya con el esquema actual
+
+    def copiar(db):
+        db.execute(
+            "CREATE TABLE categorias_nueva (id INTEGER NOT NULL, nombre_categoria VARCHAR NOT NULL, "
+            "PRIMARY KEY (id), UNIQUE (nombre_categoria))"
+        )
+        db.execute(
+            "INSERT INTO categorias_nueva (nombre_categoria) SELECT nombre_categoria FROM categorias ORDER BY rowid"
+        )
+        # Categorías usadas por artículos pero ausentes de la tabla (bases sin claves foráneas activas)
+        db.execute(
+            "INSERT OR IGNORE INTO categorias_nueva (nombre_categoria) "
+            "SELECT DISTINCT categoria FROM articulos WHERE categoria IS NOT NULL"
+        )
+        db.execute(
+            "CREATE TABLE articulos_nueva (id INTEGER NOT NULL, nombre VARCHAR, categoria_id INTEGER, "
+            "cantidad INTEGER, costo FLOAT, bar_code VARCHAR, PRIMARY KEY (id), "
+            "FOREIGN KEY(categoria_id) REFERENCES categorias (id))"
+        )
+        db.execute(
+            "INSERT INTO articulos_nueva (id, nombre, categoria_id, cantidad, costo, bar_code) "
+            "SELECT a.id, a.nombre, c.id, a.cantidad, a.costo, a.bar_code "
+            "FROM articulos a LEFT JOIN categorias_nueva c ON c.nombre_categoria = a.categoria"
+        )
+
+    _reconstruir_tablas(db_manager, ("categorias", "articulos"), copiar, {
+        "ix_articulos_categoria": "CREATE INDEX ix_articulos_categoria ON articulos (categoria_id)",
+    })
+
+
+def _registros_con_id(db_manager):
+    """Clave entera autoincremental para registros. La clave era ``fecha_hora``, así que dos
+    movimientos del mismo instante (varias cajas, ráfagas del escáner) chocaban. Los ids se
+    asignan en orden cronológico y los saldos se recalculan con ese desempate."""
+    if "id" in _columnas(db_manager.engine, "registros"):
+        return  # Base nueva, creada ya con el esquema actual
+
+    def copiar(db):
+        db.execute(
+            "CREATE TABLE registros_nueva (id INTEGER NOT NULL, fecha_hora DATETIME NOT NULL, "
+            "descripcion VARCHAR, entrada_salida BOOLEAN, unidad INTEGER, costo FLOAT, articulo_id INTEGER, "
+            "PRIMARY KEY (id), FOREIGN KEY(articulo_id) REFERENCES articulos (id))"
+        )
+        db.execute(
+            "INSERT INTO registros_nueva (fecha_hora, descripcion, entrada_salida, unidad, costo, articulo_id) "
+            "SELECT fecha_hora, descripcion, entrada_salida, unidad, costo, articulo_id "
+            "FROM registros ORDER BY fecha_hora"
+        )
+        db.execute("CREATE INDEX ix_registros_fecha ON registros_nueva (fecha_hora)")
+
+    _reconstruir_tablas(db_manager, ("registros",), copiar)
+    db_manager.rebuild_balances(lotes=False)
+
+
+def _metodo_costo_articulos(db_manager):
+    """Método de costeo de cada artículo (``promedio``, ``fifo`` o ``lifo``). Los existentes quedan
+    con el promedio ponderado, que no usa lotes; la tabla ``lotes`` ya la creó ``create_all``."""
+    if "metodo_costo" in _columnas(db_manager.engine, "articulos"):
+        return  # Base nueva, creada ya con el esquema actual
+    with db_manager.engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE articulos ADD COLUMN metodo_costo VARCHAR NOT NULL DEFAULT 'promedio'"
+        ))
+
+
+def _invalidar_cierres(db_manager):
+    """Triggers que borran los cierres de un artículo desde la fecha de un movimiento que se
+    registra, borra o cambia; la tabla ``saldos_cierre`` ya la creó ``create_all``."""
+    invalidar = ("DELETE FROM saldos_cierre WHERE articulo_id = {fila}.articulo_id "
+                 "AND fecha >= {fila}.fecha_hora; ")
+    with db_manager.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS registros_cierres_ai AFTER INSERT ON registros BEGIN "
+            + invalidar.format(fila="new") + "END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS registros_cierres_ad AFTER DELETE ON registros BEGIN "
+            + invalidar.format(fila="old") + "END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS registros_cierres_au AFTER UPDATE ON registros BEGIN "
+            + invalidar.format(fila="old") + invalidar.format(fila="new") + "END"
+        ))
+
+
+def _registros_autoincrement(db_manager):
+    """Ids de registros que no se reutilizan. Sin AUTOINCREMENT, SQLite vuelve a dar el id más
+    alto después de borrarlo y un lote (que usa ese id de clave) podía quedar apuntando a otro
+    movimiento. Se conservan los ids y se reconstruyen los lotes."""
+    with db_manager.engine.connect() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'registros'")).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return  # Base nueva, creada ya con el esquema actual
+
+    def copiar(db):
+        db.execute(
+            "CREATE TABLE registros_nueva (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+            "fecha_hora DATETIME NOT NULL, descripcion VARCHAR, entrada_salida BOOLEAN, unidad INTEGER, "
+            "costo FLOAT, articulo_id INTEGER, FOREIGN KEY(articulo_id) REFERENCES articulos (id))"
+        )
+        db.execute(
+            "INSERT INTO registros_nueva (id, fecha_hora, descripcion, entrada_salida, unidad, costo, articulo_id) "
+            "SELECT id, fecha_hora, descripcion, entrada_salida, unidad, costo, articulo_id FROM registros"
+        )
+
+    _reconstruir_tablas(db_manager, ("registros",), copiar)
+    db_manager.rebuild_balances()
+
+
+def tiene_busqueda_texto(engine) -> bool:
+    """Indica si la base tiene el índice FTS5 de artículos."""
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articulos_fts'"
+        )).first() is not None
+
+
+# (versión, descripción, función). Nunca modificar ni reordenar las ya publicadas.
+MIGRACIONES = [
+    (1, "Saldos materializados por artículo", _poblar_saldos),
+    (2, "Índices de registros y artículos", _crear_indices),
+    (3, "Búsqueda y orden de artículos", _crear_busqueda_articulos),
+    (4, "Índice de códigos de barras", _indexar_codigos_barras),
+    (5, "Clave entera de categorías", _categorias_con_id),
+    (6, "Clave entera de registros", _registros_con_id),
+    (7, "Método de costeo y lotes por artículo", _metodo_costo_articulos),
+    (8, "Cierres periódicos de existencias", _invalidar_cierres),
+    (9, "Ids de registros sin reutilizar", _registros_autoincrement),
+]
+
+
+def version_actual(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def aplicar_migraciones(db_manager) -> list:
+    """Aplica en orden las migraciones pendientes y devuelve las versiones aplicadas."""
+    aplicadas = []
+    version = version_actual(db_manager.engine)
+    for numero, descripcion, migracion in MIGRACIONES:
+        if numero <= version:
+            continue
+        migracion(db_manager)
+        with db_manager.engine.begin() as conn:
+            conn.execute(text(f"PRAGMA user_version = {int(numero)}"))
+        print(f"Migración {numero} aplicada: {descripcion}")
+        aplicadas.append(numero)
+    return aplicadas
+
+
+# Consultas frecuentes y el índice que deben usar
+CONSULTAS_FRECUENTES = {
+    "registros_por_articulo": (
+        "SELECT * FROM registros WHERE articulo_id = 1",
+        "ix_registros_articulo_fecha",
+    ),
+    "registros_por_articulo_y_fecha": (
+        "SELECT * FROM registros WHERE articulo_id = 1 "
+        "AND fecha_hora BETWEEN '2025-01-01 00:00:00' AND '2025-01-31 23:59:59'",
+        "ix_registros_articulo_fecha",
+    ),
+    "registros_por_fecha": (
+        "SELECT * FROM registros "
+        "WHERE fecha_hora BETWEEN '2025-01-01 00:00:00' AND '2025-01-31 23:59:59'",
+        "ix_registros_fecha",
+    ),
+    "articulos_por_categoria": (
+        "SELECT * FROM articulos WHERE categoria_id = "
+        "(SELECT id FROM categorias WHERE nombre_categoria = 'Ropa')",
+        "ix_articulos_categoria",
+    ),
+    "articulo_por_codigo_barras": (
+        "SELECT id, nombre FROM articulos WHERE bar_code = '7591234567890'",
+        "_articulos_bar_code",
+    ),
+    "lotes_por_articulo": (
+        "SELECT * FROM lotes WHERE articulo_id = 1 ORDER BY fecha_hora, registro_id",
+        "ix_lotes_articulo_fecha",
+    ),
+    "cierre_por_articulo": (
+        "SELECT max(fecha) FROM saldos_cierre WHERE articulo_id = 1 AND fecha <= '2025-01-31 23:59:59.999999'",
+        "sqlite_autoindex_saldos_cierre_1",
+    ),
+}
+
+
+def explicar_consultas(engine) -> dict:
+    """Ejecuta EXPLAIN QUERY PLAN sobre las consultas frecuentes.
+
+    Devuelve, por consulta, el plan de SQLite y si usa el índice esperado.
+    """
+    resultado = {}
+    with engine.connect() as conn:
+        for nombre, (sql, indice) in CONSULTAS_FRECUENTES.items():
+            plan = [fila[-1] for fila in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            resultado[nombre] = {
+                'plan': plan,
+                'usa_indice': any(indice in paso for paso in plan),
+            }
+    return resultado
+
+
+if __name__ == "__main__":
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Aplica las migraciones de inventario.db")
+    parser.add_argument("db", nargs="?", default="inventario.db")
+    parser.add_argument("--explicar", action="store_true",
+                        help="muestra el plan de las consultas frecuentes y falla si alguna no usa su índice")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    print(f"Versión del esquema: {version_actual(db_manager.engine)}")
+    if args.explicar:
+        planes = explicar_consultas(db_manager.engine)
+        for nombre, info in planes.items():
+            estado = "OK" if info['usa_indice'] else "SIN ÍNDICE"
+            print(f"[{estado}] {nombre}: {' | '.join(info['plan'])}")
+        if not all(info['usa_indice'] for info in planes.values()):
+            sys.exit(1)
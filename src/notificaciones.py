@@ -0,0 +1,63 @@
+"""Avisos entre las sesiones abiertas cuando cambia el inventario.
+
+Con ``flet run --web`` cada navegador es una sesión con su propia página, pero todas comparten el
+proceso, el controlador y el PubSub de Flet. La sesión que modifica el inventario publica un aviso
+y las demás actualizan lo que están mostrando:
+
+    publicar_cambio(page, "movimientos", [articulo_id])
+
+Un aviso es un diccionario con ``tipo`` ("articulos", "movimientos" o "categorias") y
+``articulo_ids``; ``None`` indica que puede haber cambiado cualquier artículo (importaciones).
+"""
+import asyncio
+
+TEMA_INVENTARIO = "inventario"
+
+# Tiempo para juntar los avisos que llegan seguidos y actualizar la vista una sola vez
+ESPERA_AVISOS = 0.2
+
+
+def publicar_cambio(page, tipo: str, articulo_ids=None) -> dict:
+    """Avisa a las demás sesiones del cambio; la que lo hizo ya actualizó su vista."""
+    aviso = {'tipo': tipo, 'articulo_ids': list(articulo_ids) if articulo_ids is not None else None}
+    page.pubsub.send_others_on_topic(TEMA_INVENTARIO, aviso)
+    return aviso
+
+
+def ids_afectados(avisos):
+    """Une los ids de los avisos; devuelve None si alguno puede afectar a cualquier artículo."""
+    ids = set()
+    for aviso in avisos:
+        if aviso['articulo_ids'] is None:
+            return None
+        ids.update(aviso['articulo_ids'])
+    return ids
+
+
+class ReceptorCambios:
+    """Recibe los avisos de las demás sesiones y se los entrega a la vista visible.
+
+    Los avisos que llegan dentro de ``ESPERA_AVISOS`` se entregan juntos al método
+    ``al_cambiar_inventario(avisos)`` de la vista, si lo tiene, así una ráfaga de movimientos
+    en otras cajas se traduce en una sola actualización de la tabla.
+    """
+
+    def __init__(self, obtener_vista, espera: float = ESPERA_AVISOS):
+        self.obtener_vista = obtener_vista
+        self.espera = espera
+        self._pendientes = []
+
+    async def recibir(self, tema, aviso):
+        self._pendientes.append(aviso)
+        if len(self._pendientes) > 1:
+            return  # Ya hay una entrega programada que incluirá este aviso
+        await asyncio.sleep(self.espera)
+        avisos, self._pendientes = self._pendientes, []
+        al_cambiar = getattr(self.obtener_vista(), "al_cambiar_inventario", None)
+        if al_cambiar is None:
+            return
+        try:
+            await al_cambiar(avisos)
+        except Exception as error:
+            # PubSub descarta las excepciones del manejador: al menos queda en la consola
+            print(f"Error al aplicar cambios de otra sesión: {error}")
@@ -0,0 +1,73 @@
+import flet as ft
+from instrumentacion import registro
+
+# Mediciones que se muestran en el panel, de la más reciente a la más antigua
+FILAS_PANEL = 15
+
+
+class PanelInstrumentacion(ft.Container):
+    """Panel de desarrollo: consultas, tiempo de SQL y de Python de los últimos manejadores de la
+    sesión, y las rutas que más tiempo pasan en SQL. Solo se muestra con la instrumentación activa."""
+
+    def __init__(self, page: ft.Page):
+        self.sesion = getattr(page, 'session_id', None)
+        self.lista = ft.Column(spacing=4, scroll=ft.ScrollMode.AUTO, expand=True)
+        self.totales = ft.Column(spacing=2)
+        super().__init__(
+            width=340,
+            padding=10,
+            bgcolor='#F4F1EA',
+            border_radius=ft.border_radius.all(10),
+            content=ft.Column(
+                [
+                    ft.Row(
+                        [
+                            ft.Text("Consultas", size=16, weight=ft.FontWeight.BOLD),
+                            ft.TextButton("Limpiar", on_click=self.limpiar),
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
+                    self.lista,
+                    ft.Text("Más tiempo en SQL", size=12, weight=ft.FontWeight.BOLD),
+                    self.totales,
+                ],
+                expand=True,
+            ),
+        )
+        registro.suscribir(self.al_medir)
+
+    def crear_fila(self, resumen):
+        color = ft.Colors.RED_700 if resumen['posible_n_mas_1'] else ft.Colors.BLACK87
+        detalle = (f"{resumen['consultas']} consultas · {resumen['ms_sql']:.1f} ms SQL · "
+                   f"{resumen['ms_python']:.1f} ms Python · {resumen['filas']} filas")
+        if resumen['posible_n_mas_1']:
+            detalle += f" · posible N+1 (x{resumen['repeticion_max']})"
+        return ft.Column(
+            [
+                ft.Text(resumen['nombre'], size=12, weight=ft.FontWeight.BOLD, color=color),
+                ft.Text(detalle, size=11, color=color),
+            ],
+            spacing=0,
+        )
+
+    def crear_totales(self):
+        return [
+            ft.Text(f"{total['ruta'] or '-'} {total['nombre']}: {total['llamadas']} llamadas, "
+                    f"{total['ms_sql']:.0f} ms SQL, máx. {total['consultas_max']} consultas", size=11)
+            for total in registro.totales()[:5]
+        ]
+
+    def al_medir(self, sesion, resumen):
+        if sesion != self.sesion:
+            return  # Medición de otra sesión
+        self.lista.controls.insert(0, self.crear_fila(resumen))
+        del self.lista.controls[FILAS_PANEL:]
+        self.totales.controls = self.crear_totales()
+        if self.page is not None:
+            self.update()
+
+    def limpiar(self, e):
+        registro.limpiar()
+        self.lista.controls = []
+        self.totales.controls = []
+        self.update()
@@ -0,0 +1,57 @@
+import os
+from reportlab.pdfgen import canvas
+
+
+class GeneracionCancelada(Exception):
+    """Se lanza cuando se cancela la generación de un PDF en curso."""
+
+
+def escribir_reporte_detallado(ruta, fecha_inicio, fecha_fin, filas, total=None, al_progresar=None, cancelar=None):
+    """Dibuja el reporte detallado en un PDF a medida que llegan las filas.
+
+    ``filas`` puede ser un generador (ver InventoryController.iterar_reporte_detallado), así que
+    nunca se tiene el reporte completo en memoria; cada página se comprime al cerrarse.
+    ``al_progresar(hechas, total)`` se llama al terminar cada página y ``cancelar`` es un
+    ``threading.Event`` opcional que detiene el trabajo. El PDF se escribe primero en un archivo
+    temporal para no dejar un reporte a medias en ``ruta``. Devuelve la cantidad de artículos.
+    """
+    ruta_temporal = ruta + ".tmp"
+    c = canvas.Canvas(ruta_temporal, pageCompression=1)
+    hechas = 0
+    try:
+        y = 800
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(50, y, f"Reporte Detallado: {fecha_inicio.strftime('%Y-%m-%d')} al {fecha_fin.strftime('%Y-%m-%d')}")
+        y -= 30
+
+        for articulo in filas:
+            if cancelar is not None and cancelar.is_set():
+                raise GeneracionCancelada()
+
+            c.setFont("Helvetica-Bold", 10)
+            c.drawString(50, y, f"Artículo ID: {articulo['articulo_id']} - {articulo['nombre']} ({articulo['categoria']})")
+            y -= 20
+
+            c.setFont("Helvetica", 9)
+            c.drawString(60, y, f"Entradas: {articulo['entradas']}")
+            c.drawString(180, y, f"Salidas: {articulo['salidas']}")
+            c.drawString(300, y, f"% Salidas: {articulo['porcentaje_salida']}%")
+            c.drawString(440, y, f"Costo Promedio: {articulo['costo_promedio']:.2f}")
+            y -= 30
+            hechas += 1
+
+            if y < 50:
+                c.showPage()
+                y = 800
+                if al_progresar:
+                    al_progresar(hechas, total)
+
+        c.save()
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+    if al_progresar:
+        al_progresar(hechas, total)
+    return hechas
@@ -1,34 +1,42 @@
+import asyncio
 import datetime
 import flet as ft
 import pytz
-from controller import InventoryController
+from controller_async import obtener_controlador_async
 from table_generator import TableGenerator
 from button_generator import ButtonGenerator
+from notificaciones import ids_afectados, publicar_cambio
+from instrumentacion import medido
+from valoracion import METODO_POR_DEFECTO, METODOS_COSTO
 
 
 class ReportView(ft.Column):
 
-    def __init__(self, page: ft.Page, on_volver, articulo_id: int, *args, **kwargs):
+    def __init__(self, page: ft.Page, on_volver, articulo_id: int, controller=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.page = page
         self.selected_row = None
-        self.controller = InventoryController()
+        self.controller = controller or obtener_controlador_async()
         self.table_generator = TableGenerator(self.controller)
         self.on_volver = on_volver
         self.articulo_id = articulo_id
 
-        self.articulo_actual = self.controller.obtener_articulo(self.articulo_id)
-
-        self.report_data = self.get_report_data()
+        # El artículo y sus registros se cargan en did_mount
+        self.articulo_actual = None
+        self.report_data = []
+        # Último instante antes del primer día mostrado, o None para mostrar todo el historial
+        self.apertura = None
+        self.estado_apertura = None
         self.report_table = self.create_report_table()
         self.margin_main_rigth = self.page.width * 0.015
 
         self.button_generator = ButtonGenerator(
             page=self.page,
-            selected_row=self.articulo_actual, # Pasamos el artículo completo
+            selected_row=self.articulo_actual, # El artículo completo, al cargarlo
             toggle_sidebar_callback=self.go_back_to_main, # No se usa aquí, pero necesita un valor
             on_refresh_table=self.refresh_data, # Una función para refrescar la vista
-            origin="articulo" # ¡La clave para que muestre solo el botón de reporte!
+            origin="articulo", # ¡La clave para que muestre solo el botón de reporte!
+            controller=self.controller,
         )
 
         self.date_picker_control = ft.DatePicker(
@@ -42,6 +50,32 @@ class ReportView(ft.Column):
             on_click=lambda e: page.open(self.date_picker_control),
         )
 
+        # Muestra los movimientos desde un día, con los acumulados que traía el artículo a esa fecha
+        self.desde_picker = ft.DatePicker(
+            first_date=datetime.datetime(year=2010, month=10, day=1),
+            date_picker_mode=ft.DatePickerMode.DAY,
+            date_picker_entry_mode=ft.DatePickerEntryMode.CALENDAR,
+            on_change=self.cambiar_desde,
+        )
+        self.desde_button = ft.ElevatedButton(
+            "Desde el inicio",
+            icon=ft.Icons.CALENDAR_MONTH,
+            on_click=lambda e: page.open(self.desde_picker),
+        )
+        self.desde_clear_button = ft.IconButton(
+            icon=ft.Icons.CLOSE,
+            tooltip="Mostrar todo el historial",
+            visible=False,
+            on_click=self.quitar_desde,
+        )
+
+        self.cantidad_field = ft.TextField(
+            label="Cantidad",
+            keyboard_type=ft.KeyboardType.NUMBER,
+            data="cantidad",
+            on_change=self.on_cantidad_change,
+        )
+
         self.costo_field = ft.TextField(
             label="Costo",
             keyboard_type=ft.KeyboardType.NUMBER,
@@ -64,11 +98,7 @@ class ReportView(ft.Column):
             content=ft.Column(
                 controls=[
                     ft.TextField(label="Descripcion", data="descripcion"),
-                    ft.TextField(
-                        label="Cantidad",
-                        keyboard_type=ft.KeyboardType.NUMBER,
-                        data="cantidad",
-                    ),
+                    self.cantidad_field,
                     self.costo_field,
                     self.date_button,
                     self.entrada_salida_selector,
@@ -86,6 +116,16 @@ class ReportView(ft.Column):
 
         self.report_buttons = self.button_generator.generate_buttons()
 
+        # Método con el que se costean las salidas de este artículo
+        self.metodo_costo_selector = ft.Dropdown(
+            label="Costeo de salidas",
+            options=[ft.dropdown.Option(key=clave, text=nombre) for clave, nombre in METODOS_COSTO.items()],
+            value=METODO_POR_DEFECTO,
+            width=220,
+            dense=True,
+            on_change=self.cambiar_metodo_costo,
+        )
+
         self.controls = [
             ft.Container(
                 margin=ft.margin.only(top=5, right=15),
@@ -93,6 +133,9 @@ class ReportView(ft.Column):
                     alignment=ft.MainAxisAlignment.END,
                     spacing=10,
                     controls=[
+                        self.desde_button,
+                        self.desde_clear_button,
+                        self.metodo_costo_selector,
                         *self.report_buttons,
                         ft.ElevatedButton(
                             "Volver",
@@ -159,18 +202,65 @@ class ReportView(ft.Column):
         self.alignment = ft.MainAxisAlignment.CENTER
         self.horizontal_alignment = ft.CrossAxisAlignment.CENTER
 
-    def get_report_data(self):
+    def did_mount(self):
+        self.page.run_task(self.cargar_articulo)
+
+    @medido
+    async def cargar_articulo(self):
+        """Consulta a la vez el artículo y sus registros y dibuja el reporte."""
+        self.articulo_actual, _ = await asyncio.gather(
+            self.controller.obtener_articulo(self.articulo_id), self.refresh_data())
+        self.button_generator.selected_row = self.articulo_actual
+        if self.articulo_actual is not None:
+            self.metodo_costo_selector.value = self.articulo_actual.metodo_costo
+            self.metodo_costo_selector.update()
+
+    @medido
+    async def cambiar_metodo_costo(self, e):
+        """Guarda el método de costeo elegido; las próximas salidas se sugieren con ese método."""
+        metodo = self.metodo_costo_selector.value
+        if await self.controller.establecer_metodo_costo(self.articulo_id, metodo):
+            publicar_cambio(self.page, "articulos", [self.articulo_id])
+            self.page.open(ft.SnackBar(ft.Text(f"Salidas costeadas por {METODOS_COSTO[metodo]}."), open=True))
+
+    @medido
+    async def cambiar_desde(self, e):
+        dia = self.desde_picker.value.date()
+        self.apertura = datetime.datetime.combine(dia, datetime.time()) - datetime.timedelta(microseconds=1)
+        self.desde_button.text = f"Desde {dia:%d/%m/%Y}"
+        self.desde_clear_button.visible = True
+        await self.refresh_data()
+
+    @medido
+    async def quitar_desde(self, e):
+        self.apertura = None
+        self.desde_button.text = "Desde el inicio"
+        self.desde_clear_button.visible = False
+        await self.refresh_data()
+
+    async def get_report_data(self):
         """
-        Llama al controlador para obtener los registros del artículo específico.
+        Llama al controlador para obtener los registros del artículo específico: todos, o los
+        posteriores a ``apertura`` junto con el estado del artículo en ese momento, que sale del
+        último cierre (ver cierres.py) sin leer los movimientos anteriores.
         """
-        return self.controller.obtener_registros_por_articulo(self.articulo_id)
+        if self.apertura is None:
+            self.estado_apertura = None
+            return await self.controller.obtener_registros_por_articulo(self.articulo_id)
+        registros, estados = await asyncio.gather(
+            self.controller.obtener_registros_por_articulo(self.articulo_id, self.apertura),
+            self.controller.valorar_inventario([self.articulo_id], self.apertura))
+        estado = estados.get(self.articulo_id)
+        self.estado_apertura = (estado['cantidad'], estado['valor'], estado['costo_promedio']) if estado else None
+        return registros
 
     def create_report_table(self):
         table = self.table_generator.create_table(
             table_type="report",
             width=self.page.width * 0.95,
             data=self.report_data,
-            on_row_select=self.get_index
+            on_row_select=self.get_index,
+            estado_inicial=self.estado_apertura,
         )
         return table
 
@@ -178,7 +268,8 @@ class ReportView(ft.Column):
         self.on_volver(None)
         self.page.go("/")
 
-    def get_index(self, e):
+    @medido
+    async def get_index(self, e):
         row_id = e.control.data
 
         # Deselect all rows
@@ -190,7 +281,7 @@ class ReportView(ft.Column):
         e.control.selected = not e.control.selected
 
         if e.control.selected:
-            self.selected_row = self.controller.obtener_registro(row_id)
+            self.selected_row = await self.controller.obtener_registro(row_id)
         else:
             self.selected_row = None
 
@@ -200,7 +291,8 @@ class ReportView(ft.Column):
         self.page.close(self.model_dlg)
         self.page.update()
 
-    def save_new_register(self, e):
+    @medido
+    async def save_new_register(self, e):
         descripcion = self.model_dlg.content.controls[0].value
         cantidad = (int(self.model_dlg.content.controls[1].value)
                     if self.model_dlg.content.controls[1].value else 0)
@@ -213,6 +305,9 @@ class ReportView(ft.Column):
             entrada = True if entrada_value.lower() == "true" else False
         elif isinstance(entrada_value, bool):
             entrada = entrada_value
+        if not entrada and self.costo_field.disabled:
+            # Costo sugerido: la base lo resuelve sin redondear, con los lotes que consume la salida
+            costo = None
 
         fecha_hora = None
         if selected_date:
@@ -227,29 +322,41 @@ class ReportView(ft.Column):
             caracas_tz = pytz.timezone("America/Caracas")
             fecha_hora = datetime.datetime.now(caracas_tz)
 
-        self.controller.registrar_movimiento(self.articulo_id, descripcion,
-                                             entrada, cantidad, costo,
-                                             fecha_hora)
+        registro = await self.controller.registrar_movimiento(self.articulo_id, descripcion,
+                                                        entrada, cantidad, costo,
+                                                        fecha_hora)
         print(f"Registro guardado para el artículo ID: {self.articulo_id}")
-
-        self.report_data = self.get_report_data()
-        self.report_table = self.create_report_table()
-        self.controls[-1].controls[0].content.controls[
-            0].content = self.report_table
-        self.update()
+        publicar_cambio(self.page, "movimientos", [self.articulo_id])
+
+        if self.apertura is not None and registro["fecha_hora"] <= self.apertura:
+            # Anterior al primer día mostrado: cambia el estado de apertura
+            await self.refresh_data()
+        elif not self.report_data or registro["fecha_hora"] >= self.report_data[-1]["fecha_hora"]:
+            # El movimiento va al final: basta con agregar su fila a los acumulados actuales
+            self.table_generator.append_row(self.report_table, "report", registro, on_row_select=self.get_index)
+            self.report_data.append(registro)
+            self.report_table.update()
+        else:
+            # Un movimiento con fecha anterior cambia los acumulados de las filas siguientes
+            await self.refresh_data()
         self.close_popup(e)
 
-
-    def borrar_registro(self, e):
+    @medido
+    async def borrar_registro(self, e):
         print(self.selected_row)
         if self.selected_row:
-            deleted = self.controller.eliminar_registro(self.selected_row.fecha_hora)
+            registro_id = self.selected_row.id
+            deleted = await self.controller.eliminar_registro(registro_id)
             if deleted:
+                publicar_cambio(self.page, "movimientos", [self.articulo_id])
                 self.selected_row = None
-                self.report_data = self.get_report_data()
-                self.report_table = self.create_report_table()
-                self.controls[-1].controls[0].content.controls[0].content = self.report_table
-                self.update()
+                if self.report_data and self.report_data[-1]["id"] == registro_id:
+                    # Quitar la última fila no altera los acumulados de las demás
+                    self.table_generator.remove_row(self.report_table, registro_id)
+                    self.report_data.pop()
+                    self.report_table.update()
+                else:
+                    await self.refresh_data()
             else:
                 self.page.open(
                     ft.SnackBar(
@@ -263,8 +370,13 @@ class ReportView(ft.Column):
                     open=True,
                 ))
 
-    def set_costo_for_salida(self):
-        last_average_cost = self.controller.calcular_costo_promedio_articulo(self.articulo_id)
+    async def set_costo_for_salida(self):
+        """Sugiere el costo de la salida según el método de costeo del artículo y la cantidad escrita."""
+        try:
+            unidades = int(self.cantidad_field.value or 1)
+        except ValueError:
+            unidades = 1
+        last_average_cost = await self.controller.costo_salida(self.articulo_id, unidades)
         if last_average_cost >= 0: # Permitir costo promedio 0
             self.costo_field.value = f"{last_average_cost:.2f}"
             self.costo_field.disabled = True
@@ -274,27 +386,43 @@ class ReportView(ft.Column):
             self.costo_field.disabled = False # Dejar habilitado si no hay costo promedio
             self.costo_field.update()
 
-    def on_entrada_salida_change(self, e):
+    @medido
+    async def on_entrada_salida_change(self, e):
         selector_value = self.entrada_salida_selector.value
         if selector_value == "false":  # Salida selected (value is "False" string)
-            self.set_costo_for_salida()
+            await self.set_costo_for_salida()
         else:
             self.costo_field.value = ""
             self.costo_field.disabled = False
             self.costo_field.update()
         self.model_dlg.update()
 
-    def open_create_dialog(self, e):
+    @medido
+    async def on_cantidad_change(self, e):
+        # Con PEPS o UEPS el costo depende de cuántas unidades salen
+        if self.entrada_salida_selector.value in (False, "false"):
+            await self.set_costo_for_salida()
+
+    @medido
+    async def open_create_dialog(self, e):
         self.costo_field.disabled = False  # Aseguramos que esté habilitado por defecto al abrir
         self.costo_field.value = ""
         if not self.entrada_salida_selector.value:  # Si la salida está seleccionada por defecto
-            self.set_costo_for_salida()
+            await self.set_costo_for_salida()
         self.page.open(self.model_dlg)
         self.page.update()
 
-    def refresh_data(self):
+    @medido
+    async def al_cambiar_inventario(self, avisos):
+        """Vuelve a cargar el reporte si otra sesión cambió este artículo o sus movimientos."""
+        ids = ids_afectados(avisos)
+        if ids is None or self.articulo_id in ids:
+            await self.cargar_articulo()
+
+    @medido
+    async def refresh_data(self):
         """Refresca la tabla de registros."""
-        self.report_data = self.get_report_data()
+        self.report_data = await self.get_report_data()
         self.report_table = self.create_report_table()
         # Esta línea es un poco compleja, asegúrate de que la ruta al contenido de la tabla sea correcta
         self.controls[1].controls[0].content.controls[0].content = self.report_table
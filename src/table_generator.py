@@ -1,47 +1,24 @@
+import asyncio
 import flet as ft
+from instrumentacion import medido
+from notificaciones import ids_afectados
+from valoracion import ESTADO_INICIAL, ColumnasMovimientos, acumular, valorar
 
 
 class TableGenerator:
     def __init__(self, controller):
         self.controller = controller
-    def create_table(self, table_type, width, data, on_row_select=None):
-        self.valor_total_acumulado = 0
-        self.cantidad_total = 0
+    def create_table(self, table_type, width, data, on_row_select=None, estado_inicial=None):
+        """``estado_inicial`` es el ``(cantidad, valor, costo promedio)`` del artículo antes de la
+        primera fila del reporte, cuando no empieza en su primer movimiento."""
+        self.estado_inicial = estado_inicial or ESTADO_INICIAL
+        self.cantidad_total, self.valor_total_acumulado, self.costo_promedio = self.estado_inicial
+        self.estados_reporte = []  # acumulados después de cada fila del reporte
         columns = self.get_columns_definition(table_type)
-        rows = []
-        for item in data:
-            if table_type == 'report':
-
-                entrada_salida = item['entrada_salida']
-                cantidad = item['unidad']
-                costo_unitario = item['costo']
-                costo_total = cantidad * costo_unitario
-
-                # Actualización de cantidades acumuladas
-                if entrada_salida:
-                    self.cantidad_total += cantidad
-                    self.valor_total_acumulado += costo_total
-                else:
-                    self.cantidad_total -= cantidad
-                    self.valor_total_acumulado -= costo_total
-
-                # Cálculo del costo promedio ponderado
-                if self.cantidad_total != 0:
-                    costo_promedio = self.valor_total_acumulado / self.cantidad_total
-
-                valor_total = self.cantidad_total * costo_promedio
-                
-                cells = self._create_cells(table_type, item, self.cantidad_total, costo_total, costo_promedio, valor_total)
-            else:
-                cells = self._create_cells(table_type, item)
-            row = ft.DataRow(
-                cells=cells,
-                data= item["id"] if table_type == "main" else item["fecha_hora"],
-                on_select_changed=on_row_select,
-            )
-            if table_type == "report":
-                row.color = self.get_row_color(item)
-            rows.append(row)
+        if table_type == 'report':
+            rows = self.create_report_rows(data, on_row_select)
+        else:
+            rows = [self.create_row(table_type, item, on_row_select) for item in data]
         return ft.DataTable(
             columns=columns,
             rows=rows,
@@ -50,6 +27,85 @@ class TableGenerator:
             width=width,
         )
 
+    def create_report_rows(self, data, on_row_select=None):
+        """Crea las filas del reporte con los acumulados de todos los movimientos calculados de una vez."""
+        iniciales = {item['articulo_id']: self.estado_inicial for item in data[:1]}
+        valoracion = valorar(ColumnasMovimientos.desde_registros(data), iniciales=iniciales)
+        rows = []
+        for item, (cantidad_total, valor, costo_promedio, valor_total) in zip(data, valoracion.filas()):
+            self.estados_reporte.append((cantidad_total, valor, costo_promedio))
+            cells = self._create_cells('report', item, cantidad_total, item['unidad'] * item['costo'],
+                                       costo_promedio, valor_total)
+            rows.append(self._report_row(item, cells, on_row_select))
+        if self.estados_reporte:
+            self.cantidad_total, self.valor_total_acumulado, self.costo_promedio = self.estados_reporte[-1]
+        return rows
+
+    def _report_row(self, item, cells, on_row_select=None):
+        row = ft.DataRow(cells=cells, data=item["id"], on_select_changed=on_row_select)
+        row.color = self.get_row_color(item)
+        return row
+
+    def create_row(self, table_type, item, on_row_select=None):
+        """Crea una sola fila. En el reporte continúa los acumulados de la última fila creada."""
+        if table_type == 'report':
+            estado = (self.cantidad_total, self.valor_total_acumulado, self.costo_promedio)
+            self.cantidad_total, self.valor_total_acumulado, self.costo_promedio = acumular(
+                estado, item['entrada_salida'], item['unidad'], item['costo'])
+            self.estados_reporte.append((self.cantidad_total, self.valor_total_acumulado, self.costo_promedio))
+
+            valor_total = self.cantidad_total * self.costo_promedio
+            cells = self._create_cells(table_type, item, self.cantidad_total, item['unidad'] * item['costo'],
+                                       self.costo_promedio, valor_total)
+            return self._report_row(item, cells, on_row_select)
+        return ft.DataRow(
+            cells=self._create_cells(table_type, item),
+            data=item["id"],
+            on_select_changed=on_row_select,
+        )
+
+    def find_row(self, table, row_data):
+        for row in table.rows:
+            if row.data == row_data:
+                return row
+        return None
+
+    def append_row(self, table, table_type, item, on_row_select=None):
+        """Agrega una fila al final de una tabla ya dibujada."""
+        row = self.create_row(table_type, item, on_row_select)
+        table.rows.append(row)
+        return row
+
+    def update_row(self, table, item):
+        """Reemplaza las celdas de la fila de un artículo. Devuelve la fila o None si no está en la tabla."""
+        row = self.find_row(table, item["id"])
+        if row is not None:
+            row.cells = self._create_cells("main", item)
+            row.selected = False
+        return row
+
+    def restore_selection(self, table, selected_ids):
+        """Vuelve a marcar las filas de ``selected_ids``; devuelve los ids que siguen en la tabla."""
+        encontrados = set()
+        for row in table.rows:
+            row.selected = row.data in selected_ids
+            if row.selected:
+                encontrados.add(row.data)
+        return encontrados
+
+    def remove_row(self, table, row_data):
+        """Quita una fila de la tabla. Si es la última del reporte, restaura los acumulados anteriores."""
+        row = self.find_row(table, row_data)
+        if row is None:
+            return False
+        if self.estados_reporte and row is table.rows[-1]:
+            self.estados_reporte.pop()
+            self.cantidad_total, self.valor_total_acumulado, self.costo_promedio = (
+                self.estados_reporte[-1] if self.estados_reporte else self.estado_inicial
+            )
+        table.rows.remove(row)
+        return True
+
     def get_row_color(self, item):
         """
         Determina el color de fondo de la fila en función de la entrada/salida.
@@ -115,3 +171,227 @@ class TableGenerator:
                 ft.DataCell(ft.Text(f"{valor_total:.2f}")),  # Valor total calculado
             ]
         return []
+
+
+class Paginador:
+    """Estado y controles de una tabla paginada por id (sin OFFSET).
+
+    Guarda la clave de la última fila de cada página visitada para poder volver atrás, y llama
+    a ``on_change`` (una corrutina) cuando el usuario cambia de página o de tamaño de página.
+    ``clave(fila)`` da el cursor de una fila; por defecto su id.
+    """
+
+    TAMANOS = [25, 50, 100, 200]
+
+    def __init__(self, on_change, tamano=50, clave=None):
+        self.on_change = on_change
+        self.tamano = tamano
+        self.clave = clave or (lambda fila: fila["id"])
+        self.cursores = [None]  # cursor (despues_de) de cada página visitada
+        self.hay_siguiente = False
+        self.total = 0
+        self._ultima_clave = None
+
+        self.anterior_button = ft.IconButton(icon=ft.Icons.CHEVRON_LEFT, on_click=self.anterior, disabled=True)
+        self.siguiente_button = ft.IconButton(icon=ft.Icons.CHEVRON_RIGHT, on_click=self.siguiente, disabled=True)
+        self.pagina_text = ft.Text("", size=12)
+        self.tamano_dropdown = ft.Dropdown(
+            options=[ft.dropdown.Option(str(tamano)) for tamano in self.TAMANOS],
+            value=str(tamano),
+            width=90,
+            dense=True,
+            on_change=self.cambiar_tamano,
+        )
+
+    @property
+    def pagina(self):
+        return len(self.cursores)
+
+    @property
+    def total_paginas(self):
+        return max(1, -(-self.total // self.tamano))
+
+    async def cargar(self, obtener_pagina, contar):
+        """Obtiene las filas de la página actual.
+
+        ``obtener_pagina(limite, despues_de)`` es una corrutina que devuelve filas ordenadas por
+        la clave y ``contar()`` otra con el total de filas; ambas consultas corren a la vez.
+        Si la página quedó vacía (por ejemplo tras borrar) retrocede a la anterior.
+        """
+        filas, self.total = await asyncio.gather(
+            obtener_pagina(self.tamano + 1, self.cursores[-1]), contar())
+        while not filas and len(self.cursores) > 1:
+            self.cursores.pop()
+            filas = await obtener_pagina(self.tamano + 1, self.cursores[-1])
+        self.hay_siguiente = len(filas) > self.tamano
+        filas = filas[:self.tamano]
+        self.actualizar_controles(filas)
+        return filas
+
+    def actualizar_controles(self, filas):
+        self._ultima_clave = self.clave(filas[-1]) if filas else None
+        self._actualizar_estado()
+
+    def _actualizar_estado(self):
+        self.anterior_button.disabled = len(self.cursores) == 1
+        self.siguiente_button.disabled = not self.hay_siguiente
+        self.pagina_text.value = f"Página {self.pagina} de {self.total_paginas} ({self.total} artículos)"
+
+    def registrar_alta(self, fila, filas_visibles):
+        """Cuenta un artículo recién creado sin recargar la página.
+
+        Como los ids crecen, el artículo nuevo va al final: devuelve True si cabe en la
+        página actual (la última, con espacio libre); si no, solo se ajustan los contadores.
+        """
+        self.total += 1
+        cabe = not self.hay_siguiente and filas_visibles < self.tamano
+        if cabe:
+            self._ultima_clave = self.clave(fila)
+        else:
+            self.hay_siguiente = self.hay_siguiente or filas_visibles >= self.tamano
+        self._actualizar_estado()
+        return cabe
+
+    def registrar_baja(self, filas):
+        """Cuenta un artículo eliminado; ``filas`` son las que quedan visibles en la página."""
+        self.total = max(0, self.total - 1)
+        self._ultima_clave = self.clave(filas[-1]) if filas else None
+        self._actualizar_estado()
+
+    async def anterior(self, e):
+        if len(self.cursores) > 1:
+            self.cursores.pop()
+            await self.on_change()
+
+    async def siguiente(self, e):
+        if self.hay_siguiente and self._ultima_clave is not None:
+            self.cursores.append(self._ultima_clave)
+            await self.on_change()
+
+    async def cambiar_tamano(self, e):
+        self.tamano = int(self.tamano_dropdown.value)
+        self.cursores = [None]
+        await self.on_change()
+
+    def reiniciar(self):
+        self.cursores = [None]
+
+    def create_controls(self):
+        return ft.Row(
+            controls=[self.tamano_dropdown, self.anterior_button, self.pagina_text, self.siguiente_button],
+            alignment=ft.MainAxisAlignment.END,
+        )
+
+
+class TablaArticulos:
+    """Selección y cambios fila por fila de una tabla paginada de artículos; la comparten la vista
+    principal y la de artículos de una categoría.
+
+    La vista define ``tabla_articulos()`` (la DataTable visible), ``refresh_table()`` y
+    ``refresh_buttons()``, y los atributos ``controller``, ``table_generator``, ``paginador``,
+    ``button_generator``, ``article_data``, ``selected_ids`` y ``selected_row``.
+    ``categoria_tabla`` es la categoría a la que se limita la tabla, si hay una.
+    """
+
+    categoria_tabla = None
+
+    def busqueda_activa(self):
+        """Indica si hay filtros u otro orden, con los que una fila puede moverse o desaparecer."""
+        return False
+
+    @medido
+    async def get_index(self, e):
+        row_id = int(e.control.cells[0].content.value)
+
+        # Cada clic marca o desmarca su fila, para poder borrar varias a la vez
+        e.control.selected = not e.control.selected
+        if e.control.selected:
+            self.selected_ids.add(row_id)
+        else:
+            self.selected_ids.discard(row_id)
+
+        # Ver y Editar trabajan sobre un solo artículo
+        if len(self.selected_ids) == 1:
+            self.selected_row = await self.controller.obtener_articulo(next(iter(self.selected_ids)))
+        else:
+            self.selected_row = None
+
+        self.button_generator.selected_row = self.selected_row
+        self.button_generator.selected_ids = set(self.selected_ids)
+        self.refresh_buttons()
+        self.update()
+
+    def clear_selection(self):
+        for row in self.tabla_articulos().rows:
+            row.selected = False
+        self.selected_ids = set()
+        self.selected_row = None
+        self.button_generator.selected_ids = set()
+        self.button_generator.selected_row = None
+
+    @medido
+    async def apply_row_change(self, accion, articulo_id, fila):
+        """Actualiza solo la fila del artículo creado, editado o eliminado, sin volver a consultar la página."""
+        if self.busqueda_activa():
+            # Con filtros u otro orden la fila puede cambiar de lugar o dejar de aparecer
+            await self.refresh_table()
+            return
+        table = self.tabla_articulos()
+        if fila is not None and self.categoria_tabla and fila["categoria"] != self.categoria_tabla:
+            accion = "eliminar"  # Cambió de categoría: ya no pertenece a esta tabla
+
+        if accion == "actualizar":
+            if self.table_generator.update_row(table, fila):
+                self.article_data = [fila if item["id"] == articulo_id else item for item in self.article_data]
+        elif accion == "crear":
+            if self.paginador.registrar_alta(fila, len(table.rows)):
+                self.table_generator.append_row(table, "main", fila, on_row_select=self.get_index)
+                self.article_data = self.article_data + [fila]
+        elif self.table_generator.remove_row(table, articulo_id):
+            self.article_data = [item for item in self.article_data if item["id"] != articulo_id]
+            if not self.article_data:
+                await self.refresh_table()  # La página quedó vacía: se carga la anterior
+                return
+            self.paginador.registrar_baja(self.article_data)
+
+        self.button_generator.table_data = self.article_data
+        self.clear_selection()
+        self.refresh_buttons()
+
+    @medido
+    async def al_cambiar_inventario(self, avisos):
+        """Refleja en la página visible los cambios que hicieron otras sesiones, sin perder la selección.
+
+        Un movimiento solo cambia la cantidad y el costo de su artículo: se vuelven a consultar las
+        filas visibles afectadas. Los demás cambios, o una búsqueda con filtros, recargan la página.
+        """
+        avisos = [aviso for aviso in avisos if aviso["tipo"] != "categorias"]
+        if not avisos:
+            return
+        seleccion, fila_seleccionada = set(self.selected_ids), self.selected_row
+        ids = ids_afectados(avisos)
+        if ids is None or self.busqueda_activa() or any(aviso["tipo"] != "movimientos" for aviso in avisos):
+            await self.refresh_table()
+        else:
+            await self.actualizar_filas([item["id"] for item in self.article_data if item["id"] in ids])
+
+        self.selected_ids = self.table_generator.restore_selection(self.tabla_articulos(), seleccion)
+        # Si otra sesión quitó de la página una fila seleccionada, Ver y Editar quedan sin artículo
+        self.selected_row = fila_seleccionada if self.selected_ids == seleccion else None
+        self.button_generator.selected_row = self.selected_row
+        self.button_generator.selected_ids = set(self.selected_ids)
+        self.refresh_buttons()
+        self.update()
+
+    async def actualizar_filas(self, articulo_ids):
+        """Vuelve a consultar, con una sola consulta, y dibuja las filas visibles de ``articulo_ids``."""
+        filas = await self.controller.obtener_articulos_con_existencias(articulo_ids=articulo_ids)
+        if len(filas) < len(set(articulo_ids)):
+            await self.refresh_table()  # Alguno se eliminó mientras tanto
+            return
+        table = self.tabla_articulos()
+        for fila in filas:
+            self.table_generator.update_row(table, fila)
+        por_id = {fila["id"]: fila for fila in filas}
+        self.article_data = [por_id.get(item["id"], item) for item in self.article_data]
+        self.button_generator.table_data = self.article_data
@@ -0,0 +1,317 @@
+"""Valoración por costo promedio ponderado sobre los movimientos cargados en columnas.
+
+Los movimientos de uno o varios artículos se cargan en columnas (un arreglo por campo, ordenados
+por artículo, fecha e id) y los acumulados de cada movimiento salen de sumas acumuladas por
+artículo: cantidad, valor, costo promedio vigente y valor total. Es el mismo cálculo de los saldos
+materializados de database.py: las entradas suman unidad × costo al valor y las salidas lo restan
+a su costo; el costo promedio es valor / cantidad, o el último conocido cuando la cantidad es cero.
+
+Las columnas son arreglos de ``array``. Con NumPy (opcional) se leen sin copiarlas y las sumas son
+vectoriales; sin NumPy se recorren en un solo bucle, con el mismo resultado.
+
+Los artículos que se costean por PEPS (FIFO) o UEPS (LIFO) guardan además sus lotes abiertos: cada
+entrada abre un lote y cada salida toma unidades de los más antiguos o de los más recientes.
+``ColaLotes`` lleva esos lotes en un deque y ``tomar_de_lotes`` recorre los guardados en la base.
+
+    columnas = ColumnasMovimientos.desde_registros(registros)
+    valoracion = valorar(columnas)
+    for cantidad, valor, costo_promedio, valor_total in valoracion.filas():
+        ...
+"""
+from array import array
+from collections import deque
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el cálculo con array
+    np = None
+
+# Métodos de costeo de las salidas (clave guardada en articulos.metodo_costo -> nombre para mostrar)
+METODOS_COSTO = {
+    'promedio': "Promedio ponderado",
+    'fifo': "PEPS (FIFO)",
+    'lifo': "UEPS (LIFO)",
+}
+METODO_POR_DEFECTO = 'promedio'
+# Métodos que consumen lotes
+METODOS_LOTES = ('fifo', 'lifo')
+
+# Con menos movimientos el bucle es más rápido que preparar los arreglos de NumPy
+MINIMO_NUMPY = 200
+
+# Estado de un artículo antes de su primer movimiento: (cantidad, valor, costo promedio)
+ESTADO_INICIAL = (0, 0.0, 0.0)
+
+
+def acumular(estado, entrada, unidad, costo):
+    """Aplica un movimiento a ``estado`` y devuelve el nuevo ``(cantidad, valor, costo promedio)``."""
+    cantidad, valor, costo_promedio = estado
+    if entrada:
+        cantidad += unidad
+        valor += unidad * costo
+    else:
+        cantidad -= unidad
+        valor -= unidad * costo
+    if cantidad != 0:
+        costo_promedio = valor / cantidad
+    return cantidad, valor, costo_promedio
+
+
+class ColumnasMovimientos:
+    """Movimientos en columnas, ordenados por artículo y, dentro de cada uno, por fecha e id."""
+
+    __slots__ = ('articulo_id', 'entrada', 'unidad', 'costo')
+
+    def __init__(self):
+        self.articulo_id = array('q')
+        self.entrada = array('b')
+        self.unidad = array('q')
+        self.costo = array('d')
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Desde tuplas ``(articulo_id, entrada, unidad, costo)``, ya ordenadas."""
+        columnas = cls()
+        agregar_articulo = columnas.articulo_id.append
+        agregar_entrada = columnas.entrada.append
+        agregar_unidad = columnas.unidad.append
+        agregar_costo = columnas.costo.append
+        for articulo_id, entrada, unidad, costo in filas:
+            agregar_articulo(articulo_id or 0)
+            agregar_entrada(bool(entrada))
+            agregar_unidad(unidad or 0)
+            agregar_costo(costo or 0.0)
+        return columnas
+
+    @classmethod
+    def desde_registros(cls, registros):
+        """Desde los diccionarios de ``Registro.to_dict()``, ya ordenados."""
+        return cls.desde_filas((registro['articulo_id'], registro['entrada_salida'], registro['unidad'],
+                                registro['costo']) for registro in registros)
+
+    def __len__(self):
+        return len(self.articulo_id)
+
+
+class Valoracion:
+    """Acumulados después de cada movimiento, en el orden de las columnas."""
+
+    def __init__(self, articulo_id, cantidad, valor, costo_promedio, valor_total):
+        self.articulo_id = articulo_id
+        self.cantidad = cantidad
+        self.valor = valor
+        self.costo_promedio = costo_promedio
+        self.valor_total = valor_total
+
+    def __len__(self):
+        return len(self.cantidad)
+
+    @staticmethod
+    def _lista(columna):
+        return columna if isinstance(columna, list) else columna.tolist()
+
+    def filas(self):
+        """``(cantidad, valor, costo promedio, valor total)`` de cada movimiento, como números de Python."""
+        return zip(self._lista(self.cantidad), self._lista(self.valor),
+                   self._lista(self.costo_promedio), self._lista(self.valor_total))
+
+    def saldos(self) -> dict:
+        """``articulo_id -> {'cantidad', 'valor', 'costo_promedio'}`` tras el último movimiento de cada artículo."""
+        ids = self._lista(self.articulo_id)
+        # El último movimiento de cada artículo es el anterior al cambio de id
+        ultimos = [a != b for a, b in zip(ids, ids[1:])] + [True] if ids else []
+        return {
+            articulo_id: {'cantidad': cantidad, 'valor': valor, 'costo_promedio': costo_promedio}
+            for articulo_id, cantidad, valor, costo_promedio in zip(
+                compress(ids, ultimos), compress(self._lista(self.cantidad), ultimos),
+                compress(self._lista(self.valor), ultimos), compress(self._lista(self.costo_promedio), ultimos))
+        }
+
+
+def _suma_acumulada_por_articulo(valores, inicio):
+    """Suma acumulada que vuelve a empezar en cada artículo: al primer movimiento de cada uno se le
+    resta el total del artículo anterior, así la suma no arrastra el tamaño de todo el inventario."""
+    primeros = np.flatnonzero(inicio)
+    corregidos = valores.copy()
+    corregidos[primeros[1:]] -= np.add.reduceat(valores, primeros)[:-1]
+    return np.cumsum(corregidos)
+
+
+def _valorar_numpy(columnas, iniciales):
+    n = len(columnas)
+    ids = np.frombuffer(columnas.articulo_id, dtype=np.int64, count=n)
+    unidades = np.frombuffer(columnas.unidad, dtype=np.int64, count=n)
+    unidades = np.where(np.frombuffer(columnas.entrada, dtype=np.int8, count=n) != 0, unidades, -unidades)
+    valores = unidades * np.frombuffer(columnas.costo, dtype=np.float64, count=n)
+
+    # Primer movimiento de cada artículo
+    posiciones = np.arange(n)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = ids[1:] != ids[:-1]
+    costo_inicial = None
+    if iniciales:
+        # El estado inicial se suma al primer movimiento de cada artículo y las sumas lo arrastran
+        cantidad_inicial, valor_inicial, costo_inicial = (
+            np.array(columna) for columna in zip(*(iniciales.get(i, ESTADO_INICIAL) for i in ids[inicio].tolist())))
+        unidades[inicio] += cantidad_inicial.astype(np.int64)
+        valores[inicio] += valor_inicial
+    cantidad = _suma_acumulada_por_articulo(unidades, inicio)
+    valor = _suma_acumulada_por_articulo(valores, inicio)
+
+    # Donde la cantidad es cero se arrastra el costo promedio de la última fila con existencias
+    # del mismo artículo (o 0 si todavía no hubo ninguna)
+    con_existencias = cantidad != 0
+    costo_promedio = np.divide(valor, cantidad, out=np.zeros(n), where=con_existencias)
+    if costo_inicial is not None:
+        sin_existencias = inicio & ~con_existencias
+        costo_promedio[sin_existencias] = costo_inicial[~con_existencias[inicio]]
+    vigente = np.maximum.accumulate(np.where(con_existencias | inicio, posiciones, 0))
+    costo_promedio = costo_promedio[vigente]
+    return Valoracion(ids, cantidad, valor, costo_promedio, cantidad * costo_promedio)
+
+
+def _valorar_array(columnas, iniciales):
+    # Listas y no arreglos de array: agregar a una lista es más rápido y el resultado se lee igual
+    cantidades = []
+    valores = []
+    costos = []
+    agregar_cantidad = cantidades.append
+    agregar_valor = valores.append
+    agregar_costo = costos.append
+    anterior = None
+    cantidad, valor, costo_promedio = ESTADO_INICIAL
+    for articulo_id, entrada, unidad, costo in zip(columnas.articulo_id, columnas.entrada,
+                                                    columnas.unidad, columnas.costo):
+        if articulo_id != anterior:
+            anterior = articulo_id
+            cantidad, valor, costo_promedio = (iniciales.get(articulo_id, ESTADO_INICIAL) if iniciales
+                                               else ESTADO_INICIAL)
+        # Lo mismo que acumular(), sin crear una tupla por movimiento
+        if entrada:
+            cantidad += unidad
+            valor += unidad * costo
+        else:
+            cantidad -= unidad
+            valor -= unidad * costo
+        if cantidad != 0:
+            costo_promedio = valor / cantidad
+        agregar_cantidad(cantidad)
+        agregar_valor(valor)
+        agregar_costo(costo_promedio)
+    valor_total = [cantidad * costo_promedio for cantidad, costo_promedio in zip(cantidades, costos)]
+    return Valoracion(columnas.articulo_id.tolist(), cantidades, valores, costos, valor_total)
+
+
+def valorar(columnas: ColumnasMovimientos, usar_numpy=None, iniciales=None) -> Valoracion:
+    """Calcula los acumulados de todos los movimientos de ``columnas``.
+
+    ``iniciales`` es un diccionario opcional ``articulo_id -> (cantidad, valor, costo promedio)``
+    con el estado de cada artículo antes de su primer movimiento en ``columnas`` (por ejemplo, el de
+    un cierre); los artículos que no están empiezan de cero.
+
+    ``usar_numpy`` en None usa NumPy si está instalado y hay al menos ``MINIMO_NUMPY`` movimientos;
+    True o False fuerzan uno u otro cálculo.
+    """
+    if usar_numpy is None:
+        usar_numpy = np is not None and len(columnas) >= MINIMO_NUMPY
+    if usar_numpy and np is None:
+        raise RuntimeError("NumPy no está instalado.")
+    if usar_numpy and len(columnas):
+        return _valorar_numpy(columnas, iniciales)
+    return _valorar_array(columnas, iniciales)
+
+
+def costo_promedio_entradas(columnas: ColumnasMovimientos) -> float:
+    """Costo promedio ponderado de las entradas de ``columnas`` (sin tener en cuenta las salidas)."""
+    if np is not None and len(columnas) >= MINIMO_NUMPY:
+        n = len(columnas)
+        entradas = np.frombuffer(columnas.entrada, dtype=np.int8, count=n) != 0
+        unidades = np.frombuffer(columnas.unidad, dtype=np.int64, count=n)[entradas]
+        total_cantidad = int(unidades.sum())
+        total_valor = float(unidades @ np.frombuffer(columnas.costo, dtype=np.float64, count=n)[entradas])
+    else:
+        unidades = list(compress(columnas.unidad, columnas.entrada))
+        total_cantidad = sum(unidades)
+        total_valor = sum(map(float.__mul__, map(float, unidades), compress(columnas.costo, columnas.entrada)))
+    if total_cantidad > 0:
+        return total_valor / total_cantidad
+    return 0.0
+
+
+def tomar_de_lotes(lotes, unidad):
+    """Recorre ``lotes`` (listas ``[registro_id, fecha_hora, restante, costo]`` en el orden en que se
+    consumen) hasta cubrir ``unidad`` unidades, sin modificarlos.
+
+    Devuelve ``[(lote, unidades tomadas)]`` y las unidades que los lotes no alcanzaron a cubrir.
+    """
+    tomados = []
+    for lote in lotes:
+        if unidad <= 0:
+            break
+        tomadas = min(lote[2], unidad)
+        tomados.append((lote, tomadas))
+        unidad -= tomadas
+    return tomados, max(unidad, 0)
+
+
+def costo_unitario_salida(tomados, faltante, costo_faltante):
+    """Costo unitario de una salida: el de las unidades tomadas de cada lote y, para las que no
+    alcanzaron, ``costo_faltante`` (el costo promedio vigente)."""
+    unidades = sum(tomadas for _, tomadas in tomados) + faltante
+    if unidades <= 0:
+        return costo_faltante
+    return (sum(tomadas * lote[3] for lote, tomadas in tomados) + faltante * costo_faltante) / unidades
+
+
+class ColaLotes:
+    """Lotes abiertos de un artículo, del más antiguo al más reciente.
+
+    PEPS consume por la izquierda del deque y UEPS por la derecha, así cada lote se agrega y se
+    agota una sola vez y una salida cuesta O(1) amortizado, sin recorrer el historial. Las unidades
+    que salen sin lotes que las cubran no dejan lotes negativos.
+    """
+
+    def __init__(self, metodo, lotes=()):
+        if metodo not in METODOS_LOTES:
+            raise ValueError(f"Método de costeo sin lotes: {metodo}")
+        self.metodo = metodo
+        self.lotes = deque(list(lote) for lote in lotes)
+
+    def __len__(self):
+        return len(self.lotes)
+
+    def en_orden(self):
+        """Los lotes en el orden en que se consumen."""
+        return iter(self.lotes) if self.metodo == 'fifo' else reversed(self.lotes)
+
+    def entrar(self, registro_id, fecha_hora, unidad, costo):
+        if unidad > 0:
+            self.lotes.append([registro_id, fecha_hora, unidad, costo])
+
+    def costo_salida(self, unidad, costo_faltante=0.0):
+        """Costo unitario que tendría una salida de ``unidad`` unidades, sin consumir los lotes."""
+        return costo_unitario_salida(*tomar_de_lotes(self.en_orden(), unidad), costo_faltante)
+
+    def salir(self, unidad, costo_faltante=0.0):
+        """Consume ``unidad`` unidades y devuelve su costo unitario."""
+        tomados, faltante = tomar_de_lotes(self.en_orden(), unidad)
+        quitar = self.lotes.popleft if self.metodo == 'fifo' else self.lotes.pop
+        for lote, tomadas in tomados:
+            if tomadas == lote[2]:
+                quitar()
+            else:
+                lote[2] -= tomadas
+        return costo_unitario_salida(tomados, faltante, costo_faltante)
+
+    @classmethod
+    def desde_movimientos(cls, metodo, movimientos):
+        """Reconstruye los lotes abiertos a partir de ``(registro_id, fecha_hora, entrada, unidad, costo)``
+        en orden cronológico."""
+        cola = cls(metodo)
+        for registro_id, fecha_hora, entrada, unidad, costo in movimientos:
+            if entrada:
+                cola.entrar(registro_id, fecha_hora, unidad or 0, costo or 0.0)
+            else:
+                cola.salir(unidad or 0)
+        return cola
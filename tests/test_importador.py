@@ -0,0 +1,53 @@
+"""Importación de movimientos desde CSV."""
+import pytest
+
+from controller import InventoryController
+from importador import importar_movimientos
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return InventoryController(str(tmp_path / "inventario.db"))
+
+
+def _csv(tmp_path, contenido):
+    ruta = tmp_path / "movimientos.csv"
+    ruta.write_text(contenido, encoding="utf-8")
+    return str(ruta)
+
+
+def test_salida_sin_costo_toma_el_costo_promedio(controller, tmp_path):
+    articulo_id = controller.crear_articulo("Tornillo", "Ferretería", 10, 2.0, "7590001")["id"]
+
+    resumen = importar_movimientos(_csv(tmp_path, "bar_code,tipo,unidad\n7590001,salida,5\n"), controller)
+
+    assert resumen["importadas"] == 1 and resumen["rechazadas"] == 0
+    saldo = controller.db_manager.obtener_saldo(articulo_id)
+    assert saldo["cantidad"] == 5
+    assert saldo["costo_promedio"] == pytest.approx(2.0)
+    assert saldo["valor"] == pytest.approx(10.0)
+
+
+def test_salida_sin_costo_usa_el_metodo_de_costeo(controller, tmp_path):
+    articulo_id = controller.crear_articulo("Tuerca", "Ferretería", 10, 2.0, "7590002")["id"]
+    controller.db_manager.establecer_metodo_costo(articulo_id, "fifo")
+    controller.registrar_movimiento(articulo_id, "Compra", True, 10, 4.0)
+
+    importar_movimientos(_csv(tmp_path, "articulo_id,tipo,unidad,costo\n"
+                                        f"{articulo_id},salida,12,\n"
+                                        f"{articulo_id},entrada,2,\n"), controller)
+
+    salida, entrada = controller.obtener_registros_por_articulo(articulo_id)[-2:]
+    assert salida["costo"] == pytest.approx((10 * 2.0 + 2 * 4.0) / 12)
+    # La entrada sin costo toma el promedio vigente: las 8 unidades que quedan a 4.0
+    assert entrada["costo"] == pytest.approx(4.0)
+    assert [(lote["restante"], lote["costo"]) for lote in controller.db_manager.obtener_lotes(articulo_id)] == [
+        (8, 4.0), (2, 4.0)]
+
+
+def test_costo_negativo_se_rechaza(controller, tmp_path):
+    controller.crear_articulo("Arandela", "Ferretería", 10, 2.0, "7590003")
+
+    resumen = importar_movimientos(_csv(tmp_path, "bar_code,tipo,unidad,costo\n7590003,entrada,1,-3\n"), controller)
+
+    assert resumen["importadas"] == 0 and resumen["rechazadas"] == 1
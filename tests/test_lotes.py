@@ -0,0 +1,22 @@
+"""Lotes de costeo PEPS/UEPS después de borrar registros."""
+import pytest
+
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "inventario.db"))
+
+
+def test_entrada_despues_de_eliminar_todo_registro(db):
+    articulo_id = db.crear_articulo("Tornillo", "Ferretería", 10, 2.0, "7590001")["id"]
+    db.establecer_metodo_costo(articulo_id, "fifo")
+    assert len(db.obtener_lotes(articulo_id)) == 1
+
+    assert db.eliminar_todo_registro(articulo_id)
+    assert db.obtener_lotes(articulo_id) == []
+
+    registro = db.registrar_movimiento(articulo_id, "Reposición", True, 4, 3.0)
+    lotes = db.obtener_lotes(articulo_id)
+    assert [(l["registro_id"], l["restante"], l["costo"]) for l in lotes] == [(registro["id"], 4, 3.0)]
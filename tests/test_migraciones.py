@@ -0,0 +1,108 @@
+"""Una base con el esquema original (sin saldos, claves de texto en categorías y fecha como clave
+de registros) se lleva hasta la última migración sin perder datos."""
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+from migrations import MIGRACIONES, aplicar_migraciones
+
+ESQUEMA_ORIGINAL = """
+CREATE TABLE categorias (
+    nombre_categoria VARCHAR NOT NULL,
+    PRIMARY KEY (nombre_categoria)
+);
+CREATE TABLE articulos (
+    id INTEGER NOT NULL,
+    nombre VARCHAR,
+    categoria VARCHAR,
+    cantidad INTEGER,
+    costo FLOAT,
+    bar_code VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(categoria) REFERENCES categorias (nombre_categoria)
+);
+CREATE TABLE registros (
+    fecha_hora DATETIME NOT NULL,
+    descripcion VARCHAR,
+    entrada_salida BOOLEAN,
+    unidad INTEGER,
+    costo FLOAT,
+    articulo_id INTEGER,
+    PRIMARY KEY (fecha_hora),
+    FOREIGN KEY(articulo_id) REFERENCES articulos (id)
+);
+INSERT INTO categorias VALUES ('Ferretería'), ('Pintura');
+-- La cantidad y el costo de Tornillo no coinciden con su historial
+INSERT INTO articulos VALUES (1, 'Tornillo', 'Ferretería', 99, 9.9, '7590001'), (2, 'Brocha', 'Pintura', 3, 5.0, '');
+INSERT INTO registros VALUES
+    ('2024-01-05 10:00:00.000000', 'Creación inicial del artículo', 1, 10, 2.0, 1),
+    ('2024-01-05 11:00:00.000000', 'Creación inicial del artículo', 1, 3, 5.0, 2),
+    ('2024-01-06 09:30:00.000000', 'Compra', 1, 10, 4.0, 1),
+    ('2024-01-07 12:00:00.000000', 'Venta', 0, 5, 3.0, 1);
+"""
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    ruta = str(tmp_path / "original.db")
+    with sqlite3.connect(ruta) as conn:
+        conn.executescript(ESQUEMA_ORIGINAL)
+    conn.close()
+    return ruta
+
+
+def test_migra_la_base_original(ruta):
+    db = DatabaseManager(ruta)
+
+    with sqlite3.connect(ruta) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRACIONES[-1][0]
+        assert "AUTOINCREMENT" in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'registros'").fetchone()[0]
+        disparadores = {fila[0] for fila in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'registros'")}
+    conn.close()
+    assert disparadores == {'registros_cierres_ai', 'registros_cierres_ad', 'registros_cierres_au'}
+
+    # Los registros reciben ids en orden de fecha y conservan sus datos
+    registros = db.obtener_registros_por_articulo(1)
+    assert [(r['id'], r['descripcion'], r['unidad'], r['costo']) for r in registros] == [
+        (1, 'Creación inicial del artículo', 10, 2.0), (3, 'Compra', 10, 4.0), (4, 'Venta', 5, 3.0)]
+
+    # Saldos calculados desde el historial, y la copia en articulos al día con ellos
+    assert db.obtener_saldo(1)['cantidad'] == 15
+    assert db.obtener_saldo(1)['valor'] == pytest.approx(45.0)
+    assert db.buscar_articulos(orden='cantidad') == [
+        {'id': 2, 'nombre': 'Brocha', 'categoria': 'Pintura', 'cantidad': 3, 'costo': 5.0, 'bar_code': None},
+        {'id': 1, 'nombre': 'Tornillo', 'categoria': 'Ferretería', 'cantidad': 15, 'costo': 3.0,
+         'bar_code': '7590001'},
+    ]
+    assert db.contar_articulos(cantidad_minima=10) == 1
+    assert db.buscar_por_codigo_barras('7590001')['id'] == 1
+
+
+def test_no_reutiliza_ids_de_registros(ruta):
+    db = DatabaseManager(ruta)
+    assert db.eliminar_registro(4)
+
+    registro = db.registrar_movimiento(1, "Venta", False, 1, None)
+
+    assert registro['id'] == 5
+    assert db.obtener_saldo(1)['cantidad'] == 19
+
+
+def test_migrar_dos_veces_no_cambia_nada(ruta):
+    db = DatabaseManager(ruta)
+    db.registrar_movimiento(2, "Compra", True, 2, 6.0)
+    with sqlite3.connect(ruta) as conn:
+        antes = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+        conn.execute("PRAGMA user_version = 0")
+    conn.close()
+
+    aplicar_migraciones(db)
+
+    with sqlite3.connect(ruta) as conn:
+        assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == antes
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRACIONES[-1][0]
+    conn.close()
+    assert db.obtener_saldo(2)['cantidad'] == 5
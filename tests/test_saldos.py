@@ -0,0 +1,139 @@
+"""Los saldos materializados, su copia en articulos y los lotes coinciden con los que se
+recalculan desde el historial de registros."""
+import datetime
+import random
+
+import pytest
+from sqlalchemy import select
+
+from database import Articulo, DatabaseManager, SaldoArticulo
+
+INICIO = datetime.datetime(2024, 1, 1, 8)
+METODOS = ('promedio', 'fifo', 'lifo')
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "inventario.db"))
+
+
+def _crear_articulos(db, cantidad=6):
+    """Artículos con una entrada inicial, repartidos entre los tres métodos de costeo."""
+    ids = []
+    for i in range(cantidad):
+        articulo_id = db.crear_articulo(f"Artículo {i}", "General", 10, 2.0 + i, f"759{i:04d}", INICIO)["id"]
+        db.establecer_metodo_costo(articulo_id, METODOS[i % len(METODOS)])
+        ids.append(articulo_id)
+    return ids
+
+
+def _movimientos(ids, cantidad, semilla, desde=INICIO):
+    """Movimientos en orden cronológico, un tercio sin costo."""
+    azar = random.Random(semilla)
+    fecha = desde
+    for _ in range(cantidad):
+        fecha += datetime.timedelta(minutes=azar.randint(1, 240))
+        yield {
+            'articulo_id': azar.choice(ids),
+            'descripcion': "Prueba",
+            'entrada': azar.random() < 0.55,
+            'unidad': azar.randint(1, 6),
+            'costo': azar.choice([None, 1.5, 2.25, 3.0, 4.75]),
+            'fecha_hora': fecha,
+        }
+
+
+def _registrar(db, movimientos):
+    for m in movimientos:
+        db.registrar_movimiento(m['articulo_id'], m['descripcion'], m['entrada'], m['unidad'], m['costo'],
+                                m['fecha_hora'])
+
+
+def _saldos(db):
+    with db.Session() as session:
+        return {fila.articulo_id: fila for fila in session.execute(select(SaldoArticulo.__table__))}
+
+
+def _lotes(db, ids):
+    return {articulo_id: db.obtener_lotes(articulo_id) for articulo_id in ids}
+
+
+def _comparar_saldos(obtenidos, esperados):
+    assert obtenidos.keys() == esperados.keys()
+    for articulo_id, esperado in esperados.items():
+        obtenido = obtenidos[articulo_id]
+        assert obtenido.cantidad == esperado.cantidad, articulo_id
+        assert obtenido.valor == pytest.approx(esperado.valor, abs=1e-6), articulo_id
+        assert obtenido.costo_promedio == pytest.approx(esperado.costo_promedio, abs=1e-6), articulo_id
+        assert obtenido.ultima_fecha == esperado.ultima_fecha, articulo_id
+
+
+def verificar_consistencia(db):
+    """Saldos = _consulta_saldos, articulos.cantidad/costo = saldos, y rebuild_balances no cambia nada."""
+    saldos = _saldos(db)
+    with db.Session() as session:
+        _comparar_saldos(saldos, {fila.articulo_id: fila for fila in session.execute(db._consulta_saldos())})
+        copia = dict(
+            (fila.id, (fila.cantidad, fila.costo))
+            for fila in session.execute(select(Articulo.id, Articulo.cantidad, Articulo.costo)))
+    for articulo_id, (cantidad, costo) in copia.items():
+        saldo = saldos.get(articulo_id)
+        assert cantidad == (saldo.cantidad if saldo else 0), articulo_id
+        assert costo == pytest.approx(saldo.costo_promedio if saldo else 0.0, abs=1e-6), articulo_id
+
+    lotes = _lotes(db, copia)
+    db.rebuild_balances()
+    _comparar_saldos(_saldos(db), saldos)
+    assert _lotes(db, copia) == lotes
+
+
+def test_movimientos_de_a_uno(db):
+    ids = _crear_articulos(db)
+    _registrar(db, _movimientos(ids, 300, semilla=1))
+    verificar_consistencia(db)
+
+
+def test_movimientos_en_bloque(db):
+    ids = _crear_articulos(db)
+    assert db.registrar_movimientos_bulk(_movimientos(ids, 300, semilla=2), tamano_lote=16) == 300
+    verificar_consistencia(db)
+
+
+def test_bloque_igual_que_de_a_uno(tmp_path):
+    de_a_uno = DatabaseManager(str(tmp_path / "de_a_uno.db"))
+    en_bloque = DatabaseManager(str(tmp_path / "en_bloque.db"))
+    ids = _crear_articulos(de_a_uno)
+    assert _crear_articulos(en_bloque) == ids
+    movimientos = list(_movimientos(ids, 300, semilla=3))
+
+    _registrar(de_a_uno, movimientos)
+    en_bloque.registrar_movimientos_bulk(movimientos, tamano_lote=7)
+
+    for articulo_id in ids:
+        costos = [r['costo'] for r in de_a_uno.obtener_registros_por_articulo(articulo_id)]
+        assert [r['costo'] for r in en_bloque.obtener_registros_por_articulo(articulo_id)] == pytest.approx(costos)
+    _comparar_saldos(_saldos(en_bloque), _saldos(de_a_uno))
+    assert _lotes(en_bloque, ids) == _lotes(de_a_uno, ids)
+
+
+def test_movimientos_con_fecha_anterior(db):
+    ids = _crear_articulos(db)
+    _registrar(db, _movimientos(ids, 150, semilla=4, desde=INICIO + datetime.timedelta(days=60)))
+    # Movimientos intercalados entre los ya registrados, de a uno y en bloque
+    _registrar(db, _movimientos(ids, 40, semilla=5))
+    db.registrar_movimientos_bulk(_movimientos(ids, 40, semilla=6, desde=INICIO + datetime.timedelta(days=10)),
+                                  tamano_lote=8)
+    verificar_consistencia(db)
+
+
+def test_eliminaciones(db):
+    ids = _crear_articulos(db, cantidad=9)
+    db.registrar_movimientos_bulk(_movimientos(ids, 300, semilla=7), tamano_lote=32)
+    azar = random.Random(8)
+    registros = [r['id'] for articulo_id in ids[:3] for r in db.obtener_registros_por_articulo(articulo_id)]
+    for registro_id in azar.sample(registros, 25):
+        assert db.eliminar_registro(registro_id)
+    assert db.eliminar_todo_registro(ids[3])
+    assert db.eliminar_articulos([ids[4]]) == 1
+    _registrar(db, _movimientos([ids[3], ids[5]], 20, semilla=9, desde=INICIO + datetime.timedelta(days=400)))
+    verificar_consistencia(db)